@@ -5,23 +5,40 @@ The script will create a directory based on device model and date,
 and save encoded video and rate distortion results in the directory
 """
 
-import os
-import humanfriendly
-import json
 import sys
-import argparse
-import re
-import time
-import datetime
-import shutil
-
-from encapp_tool import __version__
-from encapp_tool.app_utils import (
+
+from encapp_tool.daemon import forward_to_daemon
+
+# hand the command over to a running encapp daemon (see encapp_daemon.py)
+# before paying for the imports below
+if __name__ == '__main__':
+    forward_to_daemon('run', sys.argv)
+
+import os  # noqa: E402
+import json  # noqa: E402
+import argparse  # noqa: E402
+import re  # noqa: E402
+import time  # noqa: E402
+import datetime  # noqa: E402
+import shutil  # noqa: E402
+import tempfile  # noqa: E402
+
+from encapp_tool import __version__  # noqa: E402
+from encapp_tool.app_utils import (  # noqa: E402
     APPNAME_MAIN, SCRIPT_DIR, ACTIVITY,
     install_app, uninstall_app, install_ok)
-from encapp_tool.adb_cmds import (
+from encapp_tool.adb_cmds import (  # noqa: E402
     run_cmd, ENCAPP_OUTPUT_FILE_NAME_RE, get_device_info,
-    remove_files_using_regex, get_app_pid)
+    remove_files_using_regex, get_app_pid, set_adb_backend)
+from encapp_tool.emulated_device import EmulatedDevice  # noqa: E402
+from encapp_tool import codec_caps, media_probe, preflight  # noqa: E402
+import encapp_tool.sweep as sweep_tools  # noqa: E402
+from encapp_tool.journal import RunJournal  # noqa: E402
+from encapp_tool.storage import DeviceStorage, estimate_output_size  # noqa: E402
+from encapp_tool.trace import TRACER, span  # noqa: E402
+# re-exported, used to live here
+from encapp_tool.units import (  # noqa: E402,F401
+    is_int, convert_to_bps, convert_to_frames)
 
 SCRIPT_ROOT_DIR = os.path.join(SCRIPT_DIR, '..')
 sys.path.append(SCRIPT_ROOT_DIR)
@@ -31,6 +48,8 @@ import proto.tests_pb2 as tests_definitions  # noqa: E402
 RD_RESULT_FILE_NAME = 'rd_results.json'
 
 DEBUG = False
+# seconds between checks for the app to exit
+WAIT_POLL_INTERVAL = 1
 
 FUNC_CHOICES = {
     'help': 'show help options',
@@ -62,6 +81,11 @@ extra_settings = {
     'out_resolution': None,
     'inp_framerate': None,
     'out_framerate': None,
+    'sweep': None,
+    'sweep_mode': 'product',
+    'resume': False,
+    'batch_size': None,
+    'preflight': 'off',
 }
 
 RAW_EXTENSION_LIST = ('.yuv', '.rgb', '.raw')
@@ -117,45 +141,52 @@ FFPROBE_FIELDS = {
     'r_frame_rate': 'framerate',
     'duration': 'duration',
 }
-R_FRAME_RATE_MAP = {
-    '30/1': 30,
-}
 
 
 def remove_encapp_gen_files(serial, debug=0):
     # remove any files that are generated in previous runs
     regex_str = ENCAPP_OUTPUT_FILE_NAME_RE
     location = '/sdcard/'
-    remove_files_using_regex(serial, regex_str, location, debug)
+    with span('cleanup', serial=serial):
+        remove_files_using_regex(serial, regex_str, location, debug)
 
 
 def wait_for_exit(serial, debug=0):
     pid = -1
     current = 1
-    while current != -1:
-        current = get_app_pid(serial, APPNAME_MAIN, debug)
-        if current > 0:
-            pid = current
-        time.sleep(1)
+    with span('wait_for_exit', serial=serial):
+        while current != -1:
+            current = get_app_pid(serial, APPNAME_MAIN, debug)
+            if current > 0:
+                pid = current
+            time.sleep(WAIT_POLL_INTERVAL)
     if pid != -1:
         print(f'Exit from {pid}')
     else:
         print(f'{APPNAME_MAIN} was not active')
 
 
-def collect_result(workdir, test_name, serial):
-    print(f'Collect_result: {test_name}')
-    run_cmd(f'adb -s {serial} shell am start -W -e test '
-            f'/sdcard/{test_name} {ACTIVITY}')
-    wait_for_exit(serial)
+def start_test(test_name, serial):
+    with span('am_start', serial=serial, run=test_name):
+        run_cmd(f'adb -s {serial} shell am start -W -e test '
+                f'/sdcard/{test_name} {ACTIVITY}')
+
+
+def list_output_files(serial):
     adb_cmd = 'adb -s ' + serial + ' shell ls /sdcard/'
-    ret, stdout, stderr = run_cmd(adb_cmd, True)
-    output_files = re.findall(ENCAPP_OUTPUT_FILE_NAME_RE, stdout,
-                              re.MULTILINE)
+    with span('list_outputs', serial=serial):
+        ret, stdout, stderr = run_cmd(adb_cmd, True)
+    return re.findall(ENCAPP_OUTPUT_FILE_NAME_RE, stdout, re.MULTILINE)
+
+
+def get_output_dir(workdir, test_name):
     base_file_name = os.path.basename(test_name).rsplit('.run.bin', 1)[0]
     sub_dir = '_'.join([base_file_name, 'files'])
-    output_dir = f'{workdir}/{sub_dir}/'
-    run_cmd(f'mkdir {output_dir}')
+    return f'{workdir}/{sub_dir}/'
+
+
+def pull_output_files(output_dir, output_files, serial, journal=None):
+    run_cmd(f'mkdir -p {output_dir}')
     result_json = []
     for file in output_files:
         if file == '':
@@ -164,22 +195,102 @@ def collect_result(workdir, test_name, serial):
         # pull the output file
         print(f'pull {file} to {output_dir}')
 
+        path, tmpname = os.path.split(file)
         adb_cmd = f'adb -s {serial} pull /sdcard/{file} {output_dir}'
-        run_cmd(adb_cmd)
+        with span('pull', serial=serial, file=file) as record:
+            run_cmd(adb_cmd)
+            if os.path.exists(f'{output_dir}/{tmpname}'):
+                record['bytes'] = os.path.getsize(f'{output_dir}/{tmpname}')
 
         # remove the json file on the device too
         adb_cmd = f'adb -s {serial} shell rm /sdcard/{file}'
-        run_cmd(adb_cmd)
+        with span('cleanup', serial=serial, file=file):
+            run_cmd(adb_cmd)
+        if journal is not None:
+            journal.record_file(f'{output_dir}/{tmpname}')
         if file.endswith('.json'):
-            path, tmpname = os.path.split(file)
             result_json.append(f'{output_dir}/{tmpname}')
+    return result_json
+
+
+def record_tests(journal, keys, result_json):
+    # the app rewrites the tests it runs (defaults, codec, input), so the
+    # results of a .run.bin cannot be told apart by test: its tests (host
+    # keys) complete together when it gave at least one result per test
+    if len(result_json) < max(1, len(keys)):
+        return False
+    if journal is not None:
+        for key in keys:
+            journal.record_test(key, result_json)
+    return True
+
+
+def collect_result(workdir, test_name, serial, journal=None, keys=()):
+    print(f'Collect_result: {test_name}')
+    start_test(test_name, serial)
+    wait_for_exit(serial)
+    output_files = list_output_files(serial)
+    output_dir = get_output_dir(workdir, test_name)
+    result_json = pull_output_files(output_dir, output_files, serial,
+                                    journal)
+    ok = record_tests(journal, keys, result_json)
 
     adb_cmd = f'adb -s {serial} shell rm /sdcard/{test_name}'
-    run_cmd(adb_cmd)
+    with span('cleanup', serial=serial, file=test_name):
+        run_cmd(adb_cmd)
+    print(f'results collect: {result_json}')
+    if not ok:
+        abort_test(workdir, f'Missing results from {test_name}',
+                   result_json)
+    return result_json
+
+
+def collect_batch_results(workdir, output_dir, test_names, serial,
+                          journal=None, storage=None, estimates=None,
+                          keep=(), batch_keys=None):
+    # run a sequence of .run.bin batches already pushed to the device.
+    # The outputs of a batch are pulled (and removed from the device)
+    # while the next batch runs, so the device only holds about two
+    # batches of outputs and results reach the host continuously.
+    result_json = []
+    failed = []
+    pending = None
+    for index, test_name in enumerate(test_names):
+        if (storage is not None and
+                not storage.reserve(estimates[index], keep)):
+            print(f'Not enough device storage to run {test_name}, stopping')
+            failed += test_names[index:]
+            break
+        print(f'Collect_result: {test_name}')
+        start_test(test_name, serial)
+        if pending is not None:
+            failed += collect_batch(output_dir, pending, serial, journal,
+                                    result_json)
+        wait_for_exit(serial)
+        keys = batch_keys[index] if batch_keys is not None else ()
+        pending = (test_name, list_output_files(serial), keys)
+    if pending is not None:
+        failed += collect_batch(output_dir, pending, serial, journal,
+                                result_json)
     print(f'results collect: {result_json}')
+    if failed:
+        abort_test(workdir, f'Missing results from {", ".join(failed)}',
+                   result_json)
     return result_json
 
 
+def collect_batch(output_dir, batch, serial, journal, result_json):
+    # pull the outputs of a batch (adding its results to result_json),
+    # returns the batch name if it is missing results
+    test_name, output_files, keys = batch
+    results = pull_output_files(output_dir, output_files, serial, journal)
+    result_json += results
+    ok = record_tests(journal, keys, results)
+    with span('cleanup', serial=serial, file=test_name):
+        run_cmd(f'adb -s {serial} shell rm /sdcard/{test_name}')
+    return [] if ok else [test_name]
+
+
 def verify_video_size(videofile, resolution):
     if not os.path.exists(videofile):
         return False
@@ -222,6 +333,38 @@ def add_files(test, files_to_push):
     return files_to_push
 
 
+def estimate_test_output_size(test, files_to_push):
+    # rough device storage needed by the outputs of a test (and its
+    # parallel tests): bitrate x duration
+    fps = test.input.framerate if test.input.framerate > 0 else 30
+    duration = 0
+    input_size = 0
+    if test.input.playout_frames > 0:
+        duration = test.input.playout_frames / fps
+    elif test.input.stoptime_sec > 0:
+        duration = test.input.stoptime_sec
+    else:
+        for filepath in files_to_push:
+            if (f'/sdcard/{os.path.basename(filepath)}' !=
+                    test.input.filepath or not os.path.exists(filepath)):
+                continue
+            if video_is_raw(filepath) and 'x' in test.input.resolution:
+                width, height = test.input.resolution.split('x')
+                frames = (os.path.getsize(filepath) /
+                          (int(width) * int(height) * 1.5))
+                duration = frames / fps
+            else:
+                # transcoding: assume an output as large as the input
+                input_size = os.path.getsize(filepath)
+    bitrate = 0
+    if len(test.configure.bitrate) > 0:
+        bitrate = convert_to_bps(test.configure.bitrate)
+    size = estimate_output_size(bitrate, duration) + input_size
+    for para in test.parallel.test:
+        size += estimate_test_output_size(para, files_to_push)
+    return size
+
+
 def run_codec_tests_file(test_def, model, serial, workdir, settings):
     print(f'run test: {test_def}')
     tests = tests_definitions.Tests()
@@ -230,17 +373,57 @@ def run_codec_tests_file(test_def, model, serial, workdir, settings):
     return run_codec_tests(tests, model, serial, workdir, settings)
 
 
-def abort_test(workdir, message):
+class RunFailed(Exception):
+    # a run that failed, with the result files it collected before that
+    # (main() turns it into exit code 1)
+    def __init__(self, message, results=()):
+        super().__init__(message)
+        self.results = list(results)
+
+
+def abort_test(workdir, message, results=()):
     print('\n*** Test failed ***')
     print(message)
-    shutil.rmtree(workdir)
-    exit(0)
+    if RunJournal(workdir).exists():
+        # keep what earlier (resumable) runs collected
+        print(f'Keeping results in {workdir}')
+    elif os.path.exists(workdir):
+        shutil.rmtree(workdir)
+    raise RunFailed(message, results)
+
+
+def parse_bitrate_values(bitrate):
+    # either a single value, a list (a,b,c) or a range (start-stop-step)
+    split = bitrate.split('-')
+    if len(split) == 3:
+        fval = convert_to_bps(split[0])
+        tval = convert_to_bps(split[1])
+        sval = convert_to_bps(split[2])
+        return [str(val) for val in range(fval, tval, sval)]
+    split = bitrate.split(',')
+    return [str(convert_to_bps(val)) for val in split]
+
+
+def get_sweep(settings):
+    sweep = {}
+    if settings['bitrate'] is not None and len(settings['bitrate']) > 0:
+        sweep['bitrate'] = parse_bitrate_values(settings['bitrate'])
+    for item in settings['sweep'] or []:
+        assert '=' in item, f'error: invalid sweep "{item}" (field=v1,v2..)'
+        name, values = item.split('=', 1)
+        sweep_tools.resolve_field(name)
+        if sweep_tools.SWEEP_FIELDS.get(name, name) == 'configure.bitrate':
+            sweep[name] = parse_bitrate_values(values)
+        else:
+            sweep[name] = values.split(',')
+    return sweep
 
 
 def run_codec_tests(tests, model, serial, workdir, settings):
     test_def = settings['configfile']  # todo: check
     print(f'Run test: {test_def}')
-    fresh = tests_definitions.Tests()
+    if test_def is not None:
+        TRACER.set_context(test=os.path.basename(test_def))
     files_to_push = []
     for test in tests.test:
         if settings['encoder'] is not None and len(settings['encoder']) > 0:
@@ -259,8 +442,10 @@ def run_codec_tests(tests, model, serial, workdir, settings):
         videofile = settings['videofile']
         if videofile is not None and len(videofile) > 0:
             files_to_push.append(videofile)
-            # verify video and resolution
-            if not verify_video_size(videofile, test.input.resolution):
+            # verify video and resolution (the preflight checks every
+            # expanded test instead)
+            if (settings['preflight'] == 'off' and
+                    not verify_video_size(videofile, test.input.resolution)):
                 abort_test(workdir, 'Video size is not matching the raw '
                            'file size')
         else:
@@ -270,50 +455,105 @@ def run_codec_tests(tests, model, serial, workdir, settings):
         update_file_paths(test, videofile)
 
         print(f'files to push: {files_to_push}')
-        if settings['bitrate'] is not None and len(settings['bitrate']) > 0:
-            # defult is serial calls
-            split = settings['bitrate'].split('-')
-            if len(split) != 3:
-                split = settings['bitrate'].split(',')
-                if len(split) != 3:
-                    # Single bitrate
-                    test.configure.bitrate = str(
-                        convert_to_bps(settings['bitrate']))
-                    fresh.test.extend([test])
-                else:
-                    for bitrate in split:
-                        ntest = tests_definitions.Test()
-                        ntest.CopyFrom(test)
-                        ntest.configure.bitrate = str(convert_to_bps(bitrate))
-                        fresh.test.extend([ntest])
-            else:
-                fval = convert_to_bps(split[0])
-                tval = convert_to_bps(split[1])
-                sval = convert_to_bps(split[2])
-                for bitrate in range(fval, tval, sval):
-                    ntest = tests_definitions.Test()
-                    ntest.CopyFrom(test)
-                    ntest.configure.bitrate = str(bitrate)
-                    fresh.test.extend([ntest])
-        else:
-            fresh.test.extend([test])
+
+    sweep = get_sweep(settings)
+    journal = RunJournal(workdir)
+    done = set()
+    if settings['resume']:
+        # the tests of earlier runs in the output dir whose results are
+        # still there
+        done = sweep_tools.completed_test_keys(workdir)
+    with span('expand_tests') as record:
+        fresh = sweep_tools.build_tests(tests, sweep, settings['sweep_mode'],
+                                        done)
+        record['tests'] = len(fresh.test)
+    if settings['preflight'] != 'off' and len(fresh.test) > 0:
+        # drop the tests the device or the sources rule out before
+        # pushing anything
+        fresh = preflight_tests(fresh, files_to_push, serial, model,
+                                settings['preflight'], workdir)
+        if len(fresh.test) == 0:
+            abort_test(workdir, 'No test passed the preflight checks')
+    if len(done) > 0:
+        print(f'{len(done)} tests already completed in {workdir}')
+        if len(fresh.test) == 0:
+            print('Nothing left to run')
+            return []
+    # only push the sources still in use
+    needed = []
+    for test in fresh.test:
+        needed = add_files(test, needed)
+    files_to_push = [filepath for filepath in files_to_push
+                     if f'/sdcard/{os.path.basename(filepath)}' in needed]
 
     print(fresh)
     if test_def is None:
         abort_test(workdir, 'ERROR: no test file name')
 
     test_file = os.path.basename(test_def)
-    testname = f"{test_file[0:test_file.rindex('.')]}.run.bin"
-    output = f'{workdir}/{testname}'
+    test_stem = test_file[0:test_file.rindex('.')]
+    testname = f'{test_stem}.run.bin'
     os.system('mkdir -p ' + workdir)
-    with open(output, 'wb') as binfile:
-        binfile.write(fresh.SerializeToString())
-        files_to_push.append(output)
+    estimates = [estimate_test_output_size(test, files_to_push)
+                 for test in fresh.test]
+    batch_size = settings['batch_size']
+    if batch_size is not None and 0 < batch_size < len(fresh.test):
+        batch_names = []
+        batch_estimates = []
+        batch_keys = []
+        for index in range(0, len(fresh.test), batch_size):
+            batch = tests_definitions.Tests()
+            batch.test.extend(fresh.test[index:index + batch_size])
+            batch_estimates.append(sum(estimates[index:index + batch_size]))
+            batch_keys.append([sweep_tools.test_key(test)
+                               for test in batch.test])
+            batch_name = f'{test_stem}_{index // batch_size:04d}.run.bin'
+            output = f'{workdir}/{batch_name}'
+            with open(output, 'wb') as binfile:
+                binfile.write(batch.SerializeToString())
+            files_to_push.append(output)
+            batch_names.append(batch_name)
+    else:
+        batch_names = None
+        output = f'{workdir}/{testname}'
+        with open(output, 'wb') as binfile:
+            binfile.write(fresh.SerializeToString())
+            files_to_push.append(output)
+
+    # make sure the sources and the outputs fit on the device
+    storage = DeviceStorage(serial)
+    storage.refresh()
+    keep = [os.path.basename(filepath) for filepath in files_to_push]
+    push_size = 0
+    for filepath in files_to_push:
+        if (os.path.exists(filepath) and not storage.is_pushed(
+                os.path.basename(filepath), os.path.getsize(filepath),
+                os.path.getmtime(filepath))):
+            push_size += os.path.getsize(filepath)
+    if batch_names is not None:
+        # outputs of two batches are on the device at the same time
+        output_size = 2 * max(batch_estimates)
+    else:
+        output_size = sum(estimates)
+    if not storage.reserve(push_size + output_size, keep):
+        abort_test(workdir, 'Not enough storage on the device')
 
     ok = True
     for filepath in files_to_push:
         if os.path.exists(filepath):
-            run_cmd(f'adb -s {serial} push {filepath} /sdcard/')
+            name = os.path.basename(filepath)
+            size = os.path.getsize(filepath)
+            mtime = os.path.getmtime(filepath)
+            if filepath.endswith('.run.bin'):
+                with span('push', serial=serial, file=name, bytes=size):
+                    run_cmd(f'adb -s {serial} push {filepath} /sdcard/')
+            elif storage.is_pushed(name, size, mtime):
+                print(f'{name} already on the device')
+                storage.touch(name)
+            else:
+                with span('push', serial=serial, file=name, bytes=size):
+                    run_cmd(f'adb -s {serial} push {filepath} /sdcard/')
+                storage.record_push(name, size, mtime)
         else:
             ok = False
             print(f'File: "{filepath}" does not exist, check path')
@@ -321,21 +561,85 @@ def run_codec_tests(tests, model, serial, workdir, settings):
     if not ok:
         abort_test(workdir, 'Check file paths and try again')
 
-    return collect_result(workdir, testname, serial)
+    if batch_names is not None:
+        print(f'Running {len(fresh.test)} tests in {len(batch_names)} '
+              f'batches of {batch_size}')
+        return collect_batch_results(workdir,
+                                     get_output_dir(workdir, testname),
+                                     batch_names, serial, journal,
+                                     storage, batch_estimates, keep,
+                                     batch_keys)
+    return collect_result(workdir, testname, serial, journal,
+                          [sweep_tools.test_key(test) for test in fresh.test])
 
 
-def list_codecs(serial, model, debug=0):
+def fetch_codecs(serial, model, filename, debug=0):
+    # let the app write codecs.txt, and cache the capabilities it lists
     adb_cmd = f'adb -s {serial} shell am start ' \
               f'-e ui_hold_sec 3 ' \
               f'-e list_codecs a {ACTIVITY}'
 
     run_cmd(adb_cmd, debug)
     wait_for_exit(serial, debug)
-    filename = f'codecs_{model}.txt'
     adb_cmd = f'adb -s {serial} pull /sdcard/codecs.txt {filename}'
     ret, stdout, stderr = run_cmd(adb_cmd, debug)
     assert ret, 'error getting codec list: "%s"' % stdout
 
+    with open(filename, 'r') as codec_file:
+        text = codec_file.read()
+    return codec_caps.store_capabilities(serial, model, text, debug)
+
+
+def get_codec_capabilities(serial, model, debug=0):
+    codecs = codec_caps.load_capabilities(serial, model, debug)
+    if codecs is None:
+        print('Reading the codec capabilities of the device')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            codecs = fetch_codecs(serial, model,
+                                  os.path.join(tmpdir, 'codecs.txt'), debug)
+    return codecs
+
+
+def get_media_info(files_to_push):
+    # source metadata by device path, for the preflight checks
+    media = {}
+    for filepath in files_to_push:
+        if not os.path.exists(filepath):
+            continue
+        info = {'raw': video_is_raw(filepath),
+                'size': os.path.getsize(filepath)}
+        if not info['raw']:
+            try:
+                info.update(get_video_info(filepath))
+            except AssertionError:
+                print(f'Failed to probe {filepath}, not checking it')
+        media[f'/sdcard/{os.path.basename(filepath)}'] = info
+    return media
+
+
+def preflight_tests(tests, files_to_push, serial, model, mode, workdir):
+    with span('preflight') as record:
+        codecs = get_codec_capabilities(serial, model)
+        media = get_media_info(files_to_push)
+        valid, rejected = preflight.check_tests(tests, media, codecs)
+        record['rejected'] = len(rejected)
+    for test_id, problems in rejected:
+        print(f'Warning, {test_id} failed the preflight checks: '
+              f'{"; ".join(problems)}')
+    if mode == 'abort' and rejected:
+        abort_test(workdir, f'{len(rejected)} of {len(tests.test)} tests '
+                   'failed the preflight checks')
+    if rejected:
+        skipped = ', '.join(test_id for test_id, problems in rejected)
+        print(f'Warning, skipping {len(rejected)} of {len(tests.test)} '
+              f'tests: {skipped}')
+    return valid
+
+
+def list_codecs(serial, model, debug=0):
+    filename = f'codecs_{model}.txt'
+    fetch_codecs(serial, model, filename, debug)
+
     with open(filename, 'r') as codec_file:
         lines = codec_file.readlines()
         for line in lines:
@@ -352,48 +656,14 @@ def read_json_file(configfile, debug):
     return input_config
 
 
-def is_int(s):
-    if isinstance(s, int):
-        return True
-    return (s[1:].isdigit() if s[0] in ('-', '+') else s.isdigit())
-
-
-def convert_to_bps(value):
-    if isinstance(value, str):
-        mul = 1
-        index = value.rfind('k')
-        if index == -1:
-            index = value.rfind('M')
-            if index > 0:
-                mul = 1000000
-        elif index > 0:
-            mul = 1000
-        return int(value[0:index]) * mul
-    else:
-        return int(value)
-
-
-# convert a value (in either time or frame units) into frame units
-def convert_to_frames(value, fps=30):
-    if is_int(value):
-        # value is already fps
-        return int(value)
-    # check if it can be parsed as a duration (time)
-    try:
-        sec = humanfriendly.parse_timespan(value)
-    except humanfriendly.InvalidTimespan:
-        print('error: invalid frame value "%s"' % value)
-        sys.exit(-1)
-    return int(sec * fps)
-
-
 def convert_test(path):
     output = f"{path[0:path.rindex('.')]}.bin"
     root = f"{SCRIPT_DIR[0:SCRIPT_DIR.rindex('/')]}"
     cmd = (f'protoc -I / --encode="Tests" {root}/proto/tests.proto '
            f'< {path} > {output}')
     print(f'cmd: {cmd}')
-    run_cmd(cmd)
+    with span('protoc', file=os.path.basename(path)):
+        run_cmd(cmd)
     return output
 
 
@@ -468,6 +738,46 @@ def get_options(argv):
         help='input video bitrate, either as a single number, '
         '"100 kbps" or a lst 100kbps,200kbps or a range '
         '100k-1M-100k (start-stop-step)',)
+    parser.add_argument(
+        '--sweep', type=str, action='append', dest='sweep',
+        default=None, metavar='field=values',
+        help='sweep a Configure/Input field over a list of values, '
+        'e.g. resolution=1280x720,640x360 or input.framerate=15,30. '
+        'Short names: %s. Can be used multiple times. Points already '
+        'completed in the output dir are only skipped with --resume' %
+        ', '.join(sweep_tools.SWEEP_FIELDS.keys()),)
+    parser.add_argument(
+        '--sweep_mode', type=str, dest='sweep_mode',
+        default='product', choices=sweep_tools.SWEEP_MODES,
+        help='combine sweeps as a cartesian product or zip them',)
+    parser.add_argument(
+        '--resume', action='store_true', dest='resume', default=False,
+        help='resume an interrupted run (or extend a sweep) in the output '
+        'dir, skipping the tests its run journal records as completed',)
+    parser.add_argument(
+        '--batch_size', type=int, dest='batch_size', default=None,
+        metavar='K',
+        help='run the expanded tests in batches of K, pulling the results '
+        'of a batch while the next one runs',)
+    parser.add_argument(
+        '--trace', type=str, dest='trace', default=None,
+        metavar='trace.jsonl',
+        help='write timing spans of every phase as json lines',)
+    parser.add_argument(
+        '--chrome_trace', type=str, dest='chrome_trace', default=None,
+        metavar='trace.json',
+        help='write timing spans in Chrome trace-event format',)
+    parser.add_argument(
+        '--preflight', type=str, dest='preflight', default='off',
+        choices=preflight.PREFLIGHT_MODES,
+        help='check the expanded tests against the codec capabilities of '
+        'the device and the sources before pushing, and skip (prune) the '
+        'ones that cannot run, or abort the run (default: off)',)
+    parser.add_argument(
+        '--emulate', type=str, dest='emulate', default=None,
+        metavar='dir',
+        help='run against an emulated device using dir as its storage, '
+        'producing synthetic results (for host-side testing)',)
     parser.add_argument(
         'configfile', type=str, nargs='?',
         default=default_values['configfile'],
@@ -503,27 +813,21 @@ def video_is_raw(videofile):
     return extension in RAW_EXTENSION_LIST
 
 
-def parse_ffprobe_output(stdout):
+def parse_video_stream(stream):
+    # pick the interesting fields of an ffprobe stream
     videofile_config = {}
-    for line in stdout.split('\n'):
-        if not line:
-            # ignore empty lines
+    for key, name in FFPROBE_FIELDS.items():
+        if key not in stream:
             continue
-        if line in ('[STREAM]', '[/STREAM]'):
-            # ignore start/end of stream
-            continue
-        key, value = line.split('=')
-        # store interesting fields
-        if key in FFPROBE_FIELDS.keys():
-            # process some values
-            if key == 'r_frame_rate':
-                value = R_FRAME_RATE_MAP[value]
-            elif key == 'width' or key == 'height':
-                value = int(value)
-            elif key == 'duration':
-                value = float(value)
-            key = FFPROBE_FIELDS[key]
-            videofile_config[key] = value
+        value = stream[key]
+        # process some values
+        if key == 'r_frame_rate':
+            value = media_probe.parse_rate(value)
+        elif key == 'width' or key == 'height':
+            value = int(value)
+        elif key == 'duration':
+            value = float(value)
+        videofile_config[name] = value
     return videofile_config
 
 
@@ -536,11 +840,10 @@ def get_video_info(videofile, debug=0):
         'input video file (%s) is not readable' % videofile)
     if video_is_raw(videofile):
         return {}
-    # check using ffprobe
-    cmd = f'ffprobe -v quiet -select_streams v -show_streams {videofile}'
-    ret, stdout, stderr = run_cmd(cmd, debug)
-    assert ret, f'error: failed to analyze file {videofile}'
-    videofile_config = parse_ffprobe_output(stdout)
+    # check using ffprobe (cached)
+    stream = media_probe.video_stream(videofile, debug)
+    assert stream is not None, f'error: failed to analyze file {videofile}'
+    videofile_config = parse_video_stream(stream)
     videofile_config['filepath'] = videofile
     return videofile_config
 
@@ -561,6 +864,25 @@ def main(argv):
         print('version: %s' % __version__)
         sys.exit(0)
 
+    if options.trace is not None or options.chrome_trace is not None:
+        TRACER.enable(options.trace)
+    if options.emulate is not None:
+        device = EmulatedDevice(options.emulate, tests_definitions.Tests)
+        if options.serial is not None:
+            # pretend to be the requested device
+            device.serial = options.serial
+        set_adb_backend(device)
+    try:
+        run_func(options)
+    except RunFailed:
+        sys.exit(1)
+    finally:
+        if options.chrome_trace is not None:
+            TRACER.write_chrome_trace(options.chrome_trace)
+        TRACER.close()
+
+
+def run_func(options):
     videofile_config = {}
     if (options.videofile is not None and
             options.videofile != 'camera'):
@@ -568,6 +890,7 @@ def main(argv):
 
     # get model and serial number
     model, serial = get_device_info(options.serial, options.debug)
+    TRACER.set_context(serial=serial)
     remove_encapp_gen_files(serial, options.debug)
 
     # TODO(chema): fix this
@@ -600,6 +923,8 @@ def main(argv):
         # ensure there is an input configuration
         assert options.configfile is not None, (
             'error: need a valid input configuration file')
+        assert not options.resume or options.output is not None, (
+            'error: --resume needs the output dir of the run to resume')
 
         settings = extra_settings
         settings['configfile'] = options.configfile
@@ -608,6 +933,11 @@ def main(argv):
         settings['encoder'] = options.codec
         settings['output'] = options.output
         settings['bitrate'] = options.bitrate
+        settings['sweep'] = options.sweep
+        settings['sweep_mode'] = options.sweep_mode
+        settings['resume'] = options.resume
+        settings['batch_size'] = options.batch_size
+        settings['preflight'] = options.preflight
         settings['desc'] = options.desc
 
         result = codec_test(settings, model, serial)
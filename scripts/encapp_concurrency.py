@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+"""Concurrency analysis of parallel encapp results
+
+Results overlapping in time are one run (e.g. the tests of a parallel
+test, one result per stream). For every stream and run: throughput,
+latency, overlap with the other streams, busy time and the contention
+factor, the median latency while other streams are active relative to a
+solo baseline. Give the results of runs with a single stream (with the
+same codec, height and fps) as the solo baselines, or the frames a
+stream encoded alone are used. The run rows ("all") give the aggregate
+throughput and the encoder utilization (time with frames in flight).
+
+The timeline (throughput, frames in flight and busy time per stream and
+time bin) is written to <output>.timeline.csv and plotted to
+<output>.run<run>.concurrency.png with --plot.
+"""
+
+import argparse
+import json
+import sys
+
+from encapp_tool import concurrency, frame_metrics
+
+
+def read_stream(path):
+    with open(path) as fd:
+        result = json.load(fd)
+    settings = result.get('settings', {})
+    starttime, stoptime = frame_metrics.frame_times(result.get('frames', []))
+    return {'stream': path, 'description': result.get('description', ''),
+            'codec': settings.get('codec', ''),
+            'height': settings.get('height', ''),
+            'fps': settings.get('fps', ''),
+            'starttime': starttime, 'stoptime': stoptime}
+
+
+def plot_timeline(timeline, name):
+    import matplotlib.pyplot as plt
+
+    for run, data in timeline.groupby('run'):
+        fig, axs = plt.subplots(nrows=3, sharex=True, figsize=(12, 9),
+                                dpi=100)
+        for stream, frames in data.groupby('stream', sort=False):
+            style = 'k--' if stream == 'all' else '-'
+            axs[0].plot(frames['time_sec'], frames['fps'], style,
+                        label=stream)
+            axs[1].plot(frames['time_sec'], frames['inflight'], style)
+        total = data.loc[data['stream'] == 'all']
+        axs[2].step(total['time_sec'], total['active_streams'], where='post',
+                    label='active streams')
+        util = axs[2].twinx()
+        util.plot(total['time_sec'], total['busy_perc'], 'r',
+                  label='encoder utilization')
+        axs[0].set_ylabel('Throughput (fps)')
+        axs[1].set_ylabel('Frames in flight')
+        axs[2].set_ylabel('Active streams')
+        util.set_ylabel('Utilization (%)')
+        util.set_ylim(0, 105)
+        axs[2].set_xlabel('Time (sec)')
+        axs[0].legend(loc='best', fancybox=True, framealpha=0.5, fontsize=7)
+        axs[0].set_title(f'Run {run}')
+        plt.savefig(f'{name}.run{run}.concurrency.png', format='png')
+        plt.close(fig)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('results', nargs='+', help='Result json files')
+    parser.add_argument('-o', '--output', default='concurrency',
+                        help='Output name (<output>.csv and '
+                        '<output>.timeline.csv)')
+    parser.add_argument('--bin', type=float, default=1.0,
+                        help='Timeline bin length in seconds')
+    parser.add_argument('--plot', action='store_true',
+                        help='Plot the timeline of every run')
+    options = parser.parse_args(argv[1:])
+
+    streams = [read_stream(path) for path in options.results]
+    table = concurrency.concurrency_table(streams)
+    assert len(table) > 0, 'No frames in the results'
+    # descriptions are easier to read in the table than paths
+    descriptions = {stream['stream']: stream['description']
+                    for stream in streams}
+    table.insert(2, 'description', table['stream'].map(descriptions))
+    table.to_csv(f'{options.output}.csv', index=False, float_format='%.3f')
+    print(table.to_string(index=False, float_format='%.2f'))
+
+    timeline = concurrency.timeline(streams, options.bin)
+    timeline.to_csv(f'{options.output}.timeline.csv', index=False,
+                    float_format='%.3f')
+    if options.plot:
+        plot_timeline(timeline, options.output)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+"""Python script to run the encapp tools in one long-lived process.
+
+Each invocation of encapp.py, encapp_search.py, encapp_quality.py or
+encapp_verify.py pays for its imports and starts with cold caches. With a
+daemon running and ENCAPP_DAEMON set to its socket, these scripts hand the
+command over to the daemon and only relay its output and exit code:
+
+    $ encapp_daemon.py &
+    $ export ENCAPP_DAEMON=~/.cache/encapp/daemon.sock
+    $ encapp_search.py -s 1280x720
+
+Without a reachable daemon the scripts run as usual.
+"""
+
+import argparse
+import os
+import sys
+
+from encapp_tool.app_utils import CACHE_DIR
+from encapp_tool.daemon import DAEMON_ENV, EncappDaemon, request_daemon
+
+DEFAULT_SOCKET = os.path.join(CACHE_DIR, 'daemon.sock')
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', nargs='?', default='serve',
+                        choices=['serve', 'status', 'stop'],
+                        help='Run the daemon (default), or query/stop it')
+    parser.add_argument('--socket', default=os.environ.get(DAEMON_ENV,
+                                                           DEFAULT_SOCKET),
+                        help=f'Daemon socket (default ${DAEMON_ENV} or '
+                             f'{DEFAULT_SOCKET})')
+    parser.add_argument('--no_preload', action='store_true',
+                        help='Import the tools on first use')
+    options = parser.parse_args(argv[1:])
+
+    if options.command == 'status':
+        reply = request_daemon(options.socket, 'ping')
+        if reply is None:
+            print(f'no daemon at {options.socket}')
+            sys.exit(1)
+        print(f'pid: {reply["pid"]} uptime: {reply["uptime"]:.0f} s '
+              f'requests: {reply["requests"]}')
+    elif options.command == 'stop':
+        if request_daemon(options.socket, 'shutdown') is None:
+            print(f'no daemon at {options.socket}')
+            sys.exit(1)
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(options.socket)),
+                    exist_ok=True)
+        daemon = EncappDaemon(options.socket)
+        if not options.no_preload:
+            daemon.preload()
+        print(f'export {DAEMON_ENV}={options.socket}', flush=True)
+        try:
+            daemon.serve_forever()
+        except RuntimeError as ex:
+            print(f'error: {ex}', file=sys.stderr)
+            sys.exit(1)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+"""Latency percentile and jitter report of encapp results
+
+One row per result (stream, a parallel test gives one result per
+stream) and one for all of them: frame latency (stop - start)
+percentiles, frames later than the deadline (default the frame interval
+1000 / fps) and the longest run of late frames, pacing jitter (the
+deviation of the time between frame outputs from the frame interval)
+and the inflight frame counts.
+"""
+
+import argparse
+import json
+import math
+import sys
+
+import pandas as pd
+
+from encapp_tool import frame_metrics
+from encapp_tool.latency import DEFAULT_RELATIVE_ACCURACY, StreamLatency
+
+
+def stream_latency(result, deadline_ms=None,
+                   relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+    fps = float(result.get('settings', {}).get('fps', 0) or 0)
+    interval_ms = 1000.0 / fps if fps > 0 else math.nan
+    stats = StreamLatency(
+        deadline_ms if deadline_ms is not None else interval_ms,
+        interval_ms, relative_accuracy)
+    starttime, stoptime = frame_metrics.frame_times(result.get('frames', []))
+    stats.add(starttime, stoptime,
+              frame_metrics.inflight(starttime, stoptime))
+    return stats
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('results', nargs='+', help='Result json files')
+    parser.add_argument('--deadline_ms', type=float, default=None,
+                        help='Latency deadline (default 1000 / fps)')
+    parser.add_argument('--accuracy', type=float,
+                        default=DEFAULT_RELATIVE_ACCURACY,
+                        help='Relative accuracy of the percentiles')
+    parser.add_argument('-o', '--output', help='csv output (default stdout)')
+    options = parser.parse_args(argv[1:])
+
+    rows = []
+    total = StreamLatency(
+        options.deadline_ms if options.deadline_ms is not None else math.nan,
+        relative_accuracy=options.accuracy)
+    for path in options.results:
+        with open(path) as fd:
+            result = json.load(fd)
+        stats = stream_latency(result, options.deadline_ms, options.accuracy)
+        settings = result.get('settings', {})
+        row = {'source': path, 'description': result.get('description', ''),
+               'codec': settings.get('codec', ''),
+               'height': settings.get('height', ''),
+               'fps': settings.get('fps', '')}
+        row.update(stats.summary())
+        rows.append(row)
+        total.merge(stats)
+    if len(rows) > 1:
+        row = {'source': 'all', 'description': '', 'codec': '',
+               'height': '', 'fps': ''}
+        row.update(total.summary())
+        rows.append(row)
+
+    table = pd.DataFrame(rows)
+    # streams without frames at some inflight count
+    inflight = sorted((column for column in table.columns
+                       if column.startswith('inflight_')),
+                      key=lambda column: int(column.split('_')[1]))
+    table[inflight] = table[inflight].fillna(0).astype(int)
+    table = table[[column for column in table.columns
+                   if column not in inflight] + inflight]
+    table.to_csv(options.output or sys.stdout, index=False,
+                 float_format='%.3f')
+
+
+if __name__ == '__main__':
+    main(sys.argv)
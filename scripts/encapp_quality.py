@@ -5,16 +5,25 @@ The script will create a directory based on device model and date,
 and save encoded video and rate distortion results in the directory
 """
 
-import os
-import json
 import sys
-import argparse
-from argparse import RawTextHelpFormatter
-import re
 
-from os.path import exists
-from encapp_tool.adb_cmds import run_cmd
-from encapp import convert_to_bps
+from encapp_tool.daemon import forward_to_daemon
+
+# hand the command over to a running encapp daemon (see encapp_daemon.py)
+# before paying for the imports below
+if __name__ == '__main__':
+    forward_to_daemon('quality', sys.argv)
+
+import os  # noqa: E402
+import json  # noqa: E402
+import argparse  # noqa: E402
+from argparse import RawTextHelpFormatter  # noqa: E402
+import re  # noqa: E402
+
+from os.path import exists  # noqa: E402
+from encapp_tool import media_probe, quality, quality_table  # noqa: E402
+from encapp_tool.adb_cmds import run_cmd  # noqa: E402
+from encapp_tool.units import convert_to_bps  # noqa: E402
 
 PSNR_RE = 'average:([0-9.]*)'
 SSIM_RE = 'SSIM Y:([0-9.]*)'
@@ -68,20 +77,28 @@ def parse_quality(vmaf_file, ssim_file, psnr_file):
 
 
 def get_media_props(mediapath):
-    status, std_out, std_err = run_cmd(f'ffprobe {mediapath}')
-    resolution = None
-    if status:
-        print(f'std_out = {std_out}, err = {std_err}')
-
-    m = re.search('([0-9]{2,4})x([0-9]{2,4})', std_err)
-    if m:
-        resolution = m.group(0)
-    return resolution
-
-
-def run_quality(test_file, optionals):
-    """Compare the output found in test_file with the source/reference
-       found in options.media directory or overriden
+    # resolution (WxH) of the first video stream
+    return media_probe.get_resolution(mediapath)
+
+
+def get_force_scale(optionals):
+    # range conversion applied to the distorted media before comparing
+    force_scale = ''
+    if optionals['fr_fr']:
+        force_scale = 'scale=in_range=full:out_range=full'
+    if optionals['fr_lr']:
+        force_scale = 'scale=in_range=full:out_range=limited'
+    if optionals['lr_lr']:
+        force_scale = 'scale=in_range=limited:out_range=limited'
+    if optionals['lr_fr']:
+        force_scale = 'scale=in_range=limited:out_range=full'
+    return force_scale
+
+
+def get_quality_job(test_file, optionals):
+    """Collect what is needed to compare the output found in test_file
+       with the source/reference found in options.media directory or
+       overriden
     """
     with open(test_file, 'r') as input_file:
         test = json.load(input_file)
@@ -97,168 +114,275 @@ def run_quality(test_file, optionals):
     directory, _ = os.path.split(test_file)
     encodedfile = directory + '/' + test.get('encodedfile')
 
-    vmaf_file = f'{encodedfile}.vmaf'
-    ssim_file = f'{encodedfile}.ssim'
-    psnr_file = f'{encodedfile}.psnr'
-
     settings = test.get('settings')
-    fps = settings.get('fps')
-    if (
-        exists(vmaf_file)
-        and exists(ssim_file)
-        and exists(psnr_file)
+    job = {
+        'test_file': test_file,
+        'settings': settings,
+        'encodedfile': encodedfile,
+        'vmaf_file': f'{encodedfile}.vmaf',
+        'ssim_file': f'{encodedfile}.ssim',
+        'psnr_file': f'{encodedfile}.psnr',
+        'fps': settings.get('fps'),
+        'reference': source,
+    }
+    job['done'] = (
+        exists(job['vmaf_file'])
+        and exists(job['ssim_file'])
+        and exists(job['psnr_file'])
         and not optionals['recalc']
-    ):
+    )
+    if job['done']:
+        return job
+
+    input_media_format = test.get('decoder_media_format')
+    raw = True
+    pix_fmt = optionals['pix_fmt']
+
+    if isinstance(input_media_format, str):
+        # surface mode
+        raw = False
+    else:
+        input_media_format = test.get('encoder_media_format')
+    if len(pix_fmt) == 0:
+        # See if source contains a clue
+        pix_fmt = 'yuv420p'
+        if source.find('nv12') > -1:
+            pix_fmt = 'nv12'
+
+    output_media_format = test.get('encoder_media_format')
+    output_width = output_media_format.get('width')
+    output_height = output_media_format.get('height')
+
+    output_res = f'{output_width}x{output_height}'
+    media_res = get_media_props(encodedfile)
+    if output_res != media_res:
+        print('Warning. Discrepancy in resolutions for output')
+        print(f'Json {output_res}, media {media_res}')
+        output_res = media_res
+
+    if len(optionals['reference_resolution']) > 0:
+        input_res = optionals['reference_resolution']
+    else:
+        try:
+            input_width = int(input_media_format.get('width'))
+            input_height = int(input_media_format.get('height'))
+            # If we did not get aything here use the encoded size
+        except BaseException:
+            print('Warning. Input size if wrong.')
+            print(f"Json {input_media_format.get('width')}x"
+                  f"{input_media_format.get('height')}")
+            input_res = output_res
+        else:
+            input_res = f'{input_width}x{input_height}'
+
+    if not os.path.exists(source):
+        print(f'Reference {source} is unavailable')
+        exit(-1)
+
+    job.update({
+        'raw': raw,
+        'pix_fmt': pix_fmt,
+        'input_res': input_res,
+        'output_res': output_res,
+    })
+    return job
+
+
+def get_reference_part(job):
+    fps = job['fps']
+    if job['raw']:
+        return (
+            f"-f rawvideo -pix_fmt {job['pix_fmt']} -s {job['input_res']} "
+            f"-r {fps} -i {job['reference']} "
+        )
+    return f"-r {fps} -i {job['reference']} "
+
+
+def calc_quality(job, optionals):
+    """Run vmaf, ssim and psnr (one ffmpeg run each) on a single
+       distorted file
+    """
+    encodedfile = job['encodedfile']
+    vmaf_file = job['vmaf_file']
+    ssim_file = job['ssim_file']
+    psnr_file = job['psnr_file']
+    input_res = job['input_res']
+    output_res = job['output_res']
+    pix_fmt = job['pix_fmt']
+    fps = job['fps']
+    distorted = encodedfile
+
+    force_scale = get_force_scale(optionals)
+    if force_scale:
+        force_scale = f'{force_scale}[o];[o]'
+
+    if input_res != output_res:
+        distorted = f'{encodedfile}.yuv'
+
+        # Scale
+        shell_cmd = (
+            f'{FFMPEG_SILENT} -i {encodedfile} -f rawvideo '
+            f'-pix_fmt {pix_fmt} -s {input_res} {distorted}'
+        )
+
+        run_cmd(shell_cmd)
+    ref_part = get_reference_part(job)
+
+    print(f'input res = {input_res} vs {output_res}')
+    if input_res != output_res:
+        dist_part = (
+            f'-f rawvideo -pix_fmt {pix_fmt} '
+            f'-s {input_res} -r {fps} -i {distorted}'
+        )
+    else:
+        dist_part = f'-r {fps} -i {distorted} '
+
+    # Do calculations
+    if optionals['recalc'] or not exists(vmaf_file):
+        # important: vmaf must be called with videos in the right order
+        # <distorted_video> <reference_video>
+        # https://jina-liu.medium.com/a-practical-guide-for-vmaf-481b4d420d9c
+        shell_cmd = (
+            f'{FFMPEG_SILENT} {dist_part} {ref_part} '
+            '-filter_complex '
+            f'"{force_scale}libvmaf=log_path={vmaf_file}:'
+            'n_threads=16:log_fmt=json" -report -f null - 2>&1 '
+        )
+        run_cmd(shell_cmd)
+    else:
+        print(f'vmaf already calculated for media, {vmaf_file}')
+
+    if optionals['recalc'] or not exists(ssim_file):
+        shell_cmd = (
+            f'ffmpeg {dist_part} {ref_part} '
+            '-filter_complex '
+            f'"{force_scale}ssim=stats_file={ssim_file}.all" '
+            f'-f null - 2>&1 | grep SSIM > {ssim_file}'
+        )
+        run_cmd(shell_cmd)
+    else:
+        print(f'ssim already calculated for media, {ssim_file}')
+
+    if optionals['recalc'] or not exists(psnr_file):
+        shell_cmd = (
+            f'ffmpeg {dist_part} {ref_part} '
+            '-filter_complex '
+            f'"{force_scale}psnr=stats_file={psnr_file}.all" '
+            f'-f null - 2>&1 | grep PSNR > {psnr_file}'
+        )
+        run_cmd(shell_cmd)
+    else:
+        print(f'psnr already calculated for media, {psnr_file}')
+
+    if distorted != encodedfile:
+        os.remove(distorted)
+
+
+def shared_reference_key(job):
+    # jobs that can read the same reference stream
+    return (job['reference'], job['input_res'], job['raw'], job['pix_fmt'],
+            job['fps'])
+
+
+def calc_shared_quality(jobs, optionals):
+    """Run vmaf, ssim and psnr on several distorted files in one ffmpeg
+       graph, reading and decoding their common reference only once
+
+    All jobs must have the same shared_reference_key().
+    """
+    force_scale = get_force_scale(optionals)
+    dist_parts = []
+    prefilters = []
+    for job in jobs:
+        dist_parts.append(f"-r {job['fps']} -i {job['encodedfile']} ")
+        chain = []
+        if job['input_res'] != job['output_res']:
+            # scaled in the graph instead of through a temporary yuv file
+            width, height = job['input_res'].split('x')
+            chain.append(f"scale={width}:{height},format={job['pix_fmt']}")
+        if force_scale:
+            chain.append(force_scale)
+        prefilters.append(','.join(chain))
+    filter_complex, labels = quality.shared_reference_filter(
+        [(job['vmaf_file'], f"{job['ssim_file']}.all",
+          f"{job['psnr_file']}.all") for job in jobs],
+        prefilters)
+    maps = ' '.join(f'-map "{label}"' for label in labels)
+    print(f"shared reference {jobs[0]['reference']} for {len(jobs)} files")
+    shell_cmd = (
+        f"{FFMPEG_SILENT} {''.join(dist_parts)} {get_reference_part(jobs[0])} "
+        f'-filter_complex "{filter_complex}" {maps} -f null - 2>&1 '
+    )
+    run_cmd(shell_cmd)
+    for job in jobs:
+        quality.write_summaries(job['ssim_file'], job['psnr_file'])
+
+
+def run_shared_quality(jobs, optionals, group_size):
+    """Calculate the jobs that are not done, comparing up to group_size
+       distorted files to each reference read
+    """
+    groups = {}
+    for job in jobs:
+        if not job['done']:
+            groups.setdefault(shared_reference_key(job), []).append(job)
+    for group in groups.values():
+        for start in range(0, len(group), group_size):
+            chunk = group[start:start + group_size]
+            if len(chunk) == 1:
+                calc_quality(chunk[0], optionals)
+            else:
+                calc_shared_quality(chunk, optionals)
+
+
+def quality_row(job):
+    """Get the csv row (by column) of a calculated job, None if it has
+       no vmaf
+    """
+    vmaf_file = job['vmaf_file']
+    if not exists(vmaf_file):
+        return None
+    encodedfile = job['encodedfile']
+    settings = job['settings']
+    vmaf, ssim, psnr = parse_quality(vmaf_file, job['ssim_file'],
+                                     job['psnr_file'])
+
+    return {
+        'media': encodedfile,
+        'codec': settings.get('codec'),
+        'gop': settings.get('gop'),
+        'fps': settings.get('fps'),
+        'width': settings.get('width'),
+        'height': settings.get('height'),
+        'bitrate': convert_to_bps(settings.get('bitrate')),
+        'real_bitrate': settings.get('meanbitrate'),
+        'size': os.stat(encodedfile).st_size,
+        'vmaf': vmaf,
+        'ssim': ssim,
+        'psnr': psnr,
+        'file': job['test_file'],
+    }
+
+
+def run_quality_job(test_file, optionals):
+    """Compare the output found in test_file with the source/reference
+       found in options.media directory or overriden, unless already done
+    """
+    job = get_quality_job(test_file, optionals)
+    if job['done']:
         print(
             'All quality indicators already calculated for media, '
-            f'{vmaf_file}')
+            f"{job['vmaf_file']}")
     else:
-        input_media_format = test.get('decoder_media_format')
-        raw = True
-        pix_fmt = optionals['pix_fmt']
+        calc_quality(job, optionals)
+    return job
 
-        if isinstance(input_media_format, str):
-            # surface mode
-            raw = False
-        else:
-            input_media_format = test.get('encoder_media_format')
-        if len(pix_fmt) == 0:
-            # See if source contains a clue
-            pix_fmt = 'yuv420p'
-            if source.find('nv12') > -1:
-                pix_fmt = 'nv12'
-
-        output_media_format = test.get('encoder_media_format')
-        output_width = output_media_format.get('width')
-        output_height = output_media_format.get('height')
-
-        output_res = f'{output_width}x{output_height}'
-        media_res = get_media_props(encodedfile)
-        if output_res != media_res:
-            print('Warning. Discrepancy in resolutions for output')
-            print(f'Json {output_res}, media {media_res}')
-            output_res = media_res
-
-        if len(optionals['reference_resolution']) > 0:
-            input_res = optionals['reference_resolution']
-        else:
-            try:
-                input_width = int(input_media_format.get('width'))
-                input_height = int(input_media_format.get('height'))
-                # If we did not get aything here use the encoded size
-            except BaseException:
-                print('Warning. Input size if wrong.')
-                print(f"Json {input_media_format.get('width')}x"
-                      f"{input_media_format.get('height')}")
-                input_res = output_res
-            else:
-                input_res = f'{input_width}x{input_height}'
-
-        reference = source
-        if not os.path.exists(reference):
-            print(f'Reference {reference} is unavailable')
-            exit(-1)
-        distorted = encodedfile
-        if not os.path.exists(source):
-            print(f'Source {source} is unavailable')
-            exit(-1)
-
-        shell_cmd = ''
-
-        force_scale = ''
-        if optionals['fr_fr']:
-            force_scale = 'scale=in_range=full:out_range=full[o];[o]'
-        if optionals['fr_lr']:
-            force_scale = 'scale=in_range=full:out_range=limited[o];[o]'
-        if optionals['lr_lr']:
-            force_scale = 'scale=in_range=limited:out_range=limited[o];[o]'
-        if optionals['lr_fr']:
-            force_scale = 'scale=in_range=limited:out_range=full[o];[o]'
-
-        if input_res != output_res:
-            distorted = f'{encodedfile}.yuv'
-
-            # Scale
-            shell_cmd = (
-                f'{FFMPEG_SILENT} -i {encodedfile} -f rawvideo '
-                f'-pix_fmt {pix_fmt} -s {input_res} {distorted}'
-            )
-
-            run_cmd(shell_cmd)
-        if raw:
-            ref_part = (
-                f'-f rawvideo -pix_fmt {pix_fmt} -s {input_res} '
-                f'-r {fps} -i {reference} '
-            )
-        else:
-            ref_part = f'-r {fps} -i {reference} '
-
-        print(f'input res = {input_res} vs {output_res}')
-        if input_res != output_res:
-            dist_part = (
-                f'-f rawvideo -pix_fmt {pix_fmt} '
-                f'-s {input_res} -r {fps} -i {distorted}'
-            )
-        else:
-            dist_part = f'-r {fps} -i {distorted} '
-
-        # Do calculations
-        if optionals['recalc'] or not exists(vmaf_file):
-            # important: vmaf must be called with videos in the right order
-            # <distorted_video> <reference_video>
-            # https://jina-liu.medium.com/a-practical-guide-for-vmaf-481b4d420d9c
-            shell_cmd = (
-                f'{FFMPEG_SILENT} {dist_part} {ref_part} '
-                '-filter_complex '
-                f'"{force_scale}libvmaf=log_path={vmaf_file}:'
-                'n_threads=16:log_fmt=json" -report -f null - 2>&1 '
-            )
-            run_cmd(shell_cmd)
-        else:
-            print(f'vmaf already calculated for media, {vmaf_file}')
-
-        if optionals['recalc'] or not exists(ssim_file):
-            shell_cmd = (
-                f'ffmpeg {dist_part} {ref_part} '
-                '-filter_complex '
-                f'"{force_scale}ssim=stats_file={ssim_file}.all" '
-                f'-f null - 2>&1 | grep SSIM > {ssim_file}'
-            )
-            run_cmd(shell_cmd)
-        else:
-            print(f'ssim already calculated for media, {ssim_file}')
-
-        if optionals['recalc'] or not exists(psnr_file):
-            shell_cmd = (
-                f'ffmpeg {dist_part} {ref_part} '
-                '-filter_complex '
-                f'"{force_scale}psnr=stats_file={psnr_file}.all" '
-                f'-f null - 2>&1 | grep PSNR > {psnr_file}'
-            )
-            run_cmd(shell_cmd)
-        else:
-            print(f'psnr already calculated for media, {psnr_file}')
-
-        if distorted != encodedfile:
-            os.remove(distorted)
-
-    if exists(vmaf_file):
-        vmaf, ssim, psnr = parse_quality(vmaf_file, ssim_file, psnr_file)
-
-        # media,codec,gop,fps,width,height,bitrate,real_bitrate,size,vmaf,
-        # ssim,psnr,file
-        file_size = os.stat(encodedfile).st_size
-        data = (
-            f"{encodedfile}, {settings.get('codec')}, "
-            f"{settings.get('gop')}, "
-            f"{settings.get('fps')}, {settings.get('width')}, "
-            f"{settings.get('height')}, "
-            f"{convert_to_bps(settings.get('bitrate'))}, "
-            f"{settings.get('meanbitrate')}, "
-            f'{file_size}, {vmaf}, {ssim}, {psnr}, {test_file}\n'
-        )
-        return data
-    return None
+
+def run_quality(test_file, optionals):
+    """Compare the output found in test_file with the source/reference
+       and get its csv row (see quality_row())
+    """
+    return quality_row(run_quality_job(test_file, optionals))
 
 
 def get_options(argv):
@@ -293,8 +417,22 @@ def get_options(argv):
     )
     parser.add_argument(
         '--header',
-        help='print header to output',
+        help='ignored, the csv output always has a header',
         action='store_true')
+    parser.add_argument(
+        '--db',
+        help=(
+            'quality table the results are stored in (and the csv output '
+            'exported from), default: the csv output with a .sqlite suffix'
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        '--merge',
+        nargs='+',
+        default=[],
+        help='quality tables (e.g. of other hosts) to merge into the table',
+    )
     parser.add_argument(
         '--fr_fr',
         help=('force full range to full range on distorted file'),
@@ -318,8 +456,17 @@ def get_options(argv):
     parser.add_argument(
         '--recalc', help='recalculate regardless of status', action='store_true'
     )
+    parser.add_argument(
+        '--shared_ref',
+        type=int,
+        help=(
+            'compare up to N encodings of the same reference (and input '
+            'resolution) in one ffmpeg run, reading the reference once'
+        ),
+        default=0,
+    )
 
-    options = parser.parse_args()
+    options = parser.parse_args(argv[1:])
 
     if len(argv) == 1:
         parser.print_help()
@@ -329,33 +476,51 @@ def get_options(argv):
 
 
 def main(argv):
-    """Calculate video quality properties (vmaf/ssim/psnr) and write
-       a csv with relevant data
+    """Calculate video quality properties (vmaf/ssim/psnr), store them in
+       the quality table and export it as a csv with relevant data
     """
     options = get_options(argv)
 
-    with open(options.output, 'a') as output:
-        if options.header:
-            output.write(
-                'media,codec,gop,fps,width,height,'
-                'bitrate,real_bitrate,size,vmaf,ssim,'
-                'psnr,file\n'
-            )
-        settings = extra_settings
-        settings['media_path'] = options.media
-        settings['override_reference'] = options.override_reference
-        settings['pix_fmt'] = options.pix_fmt
-        settings['reference_resolution'] = options.reference_resolution
-        settings['fr_fr'] = options.fr_fr
-        settings['fr_lr'] = options.fr_lr
-        settings['lr_lr'] = options.lr_lr
-        settings['lr_fr'] = options.lr_fr
-        settings['recalc'] = options.recalc
-
-        for test in options.test:
-            data = run_quality(test, settings)
-            if data is not None:
-                output.write(data)
+    settings = extra_settings
+    settings['media_path'] = options.media
+    settings['override_reference'] = options.override_reference
+    settings['pix_fmt'] = options.pix_fmt
+    settings['reference_resolution'] = options.reference_resolution
+    settings['fr_fr'] = options.fr_fr
+    settings['fr_lr'] = options.fr_lr
+    settings['lr_lr'] = options.lr_lr
+    settings['lr_fr'] = options.lr_fr
+    settings['recalc'] = options.recalc
+
+    if options.header:
+        print('Warning. --header is ignored, the csv output always has a '
+              'header')
+    db = options.db or f'{os.path.splitext(options.output)[0]}.sqlite'
+    if not exists(db) and exists(options.output):
+        # csv appended to by earlier versions, it is not a table export
+        print(f'Warning. Moving {options.output} to {options.output}.bak, '
+              f'the csv is now exported from {db}')
+        os.replace(options.output, f'{options.output}.bak')
+    table = quality_table.QualityTable(db)
+    for other in options.merge:
+        print(f'Merged {table.merge(other)} rows from {other}')
+
+    if options.shared_ref > 1:
+        jobs = [get_quality_job(test, settings) for test in options.test]
+        run_shared_quality(jobs, settings, options.shared_ref)
+    else:
+        jobs = (run_quality_job(test, settings) for test in options.test)
+    key_options = quality_table.quality_options(settings)
+    for job in jobs:
+        data = quality_row(job)
+        if data is not None:
+            # when the scores were calculated, also for jobs done earlier
+            updated = max(os.path.getmtime(job[name])
+                          for name in ('vmaf_file', 'ssim_file', 'psnr_file')
+                          if exists(job[name]))
+            table.upsert(data, job['reference'], key_options, updated)
+
+    table.export_csv(options.output)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+"""Rate distortion analysis of encapp_quality.py csv files
+
+  hull:    rate-quality convex hull points of every curve
+  bd:      BD-rate and BD-quality of every curve against an anchor
+  target:  bitrate needed for target quality scores
+"""
+
+import argparse
+import sys
+
+from encapp_tool import rd
+
+
+def columns(text):
+    # comma separated column names, e.g. "codec,height"
+    return [column for column in text.split(',') if column]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('func', choices=['hull', 'bd', 'target'])
+    parser.add_argument('quality', nargs='+',
+                        help='Quality csv files (one per device to compare '
+                        'devices with "--column csv")')
+    parser.add_argument('-o', '--output', help='csv output (default stdout)')
+    parser.add_argument('--metric', nargs='+', default=['vmaf'],
+                        help='Quality columns, e.g. vmaf psnr ssim')
+    parser.add_argument('--by', type=columns, default=None,
+                        help='Columns of a curve (hull, target: default '
+                        '"codec,height") or of a comparison (bd: default '
+                        '"height"). Leave height out for the hull across '
+                        'resolutions')
+    parser.add_argument('--column', default='codec',
+                        help='bd: column compared, e.g. codec or csv')
+    parser.add_argument('--anchor', help='bd: anchor value of the column')
+    parser.add_argument('--target', nargs='+', type=float, default=[],
+                        help='target: quality scores')
+    options = parser.parse_args(argv[1:])
+
+    data = rd.read_quality(options.quality)
+    if options.func == 'hull':
+        by = options.by if options.by is not None else ['codec', 'height']
+        table = rd.convex_hull(data, options.metric[0], by)
+    elif options.func == 'bd':
+        assert options.anchor, 'bd needs an --anchor'
+        by = options.by if options.by is not None else ['height']
+        table = rd.compare(data, options.anchor, options.column,
+                           options.metric, by)
+    else:
+        assert options.target, 'target needs --target scores'
+        by = options.by if options.by is not None else ['codec', 'height']
+        table = rd.bitrate_at_quality(data, options.target,
+                                      options.metric[0], by)
+
+    table.to_csv(options.output or sys.stdout, index=False,
+                 float_format='%.4f')
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+
+"""Python script to queue encapp runs and schedule them on a device farm.
+
+Submitted test definitions wait in a persistent queue (a sqlite file)
+until a connected device that fits their constraints (model, codec) is
+free. The scheduler runs one encapp.py per device, retries jobs whose
+device failed (other failures are final), and records when every attempt
+started and finished.
+
+    $ encapp_scheduler.py submit --codec video/hevc test.pbtxt -- -r 1M
+    $ encapp_scheduler.py run
+    $ encapp_scheduler.py list
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from encapp_tool import codec_caps, job_queue
+from encapp_tool.adb_cmds import get_connected_devices
+from encapp_tool.daemon import DAEMON_ENV
+from encapp_tool.emulated_device import DEFAULT_MODEL
+
+ENCAPP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'encapp.py')
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return '-'
+    return time.strftime('%H:%M:%S', time.gmtime(seconds))
+
+
+def encapp_cmd(device, *args):
+    cmd = [sys.executable, ENCAPP, '--serial', device['serial']]
+    if device.get('emulate') is not None:
+        cmd += ['--emulate', device['emulate']]
+    return cmd + list(args)
+
+
+def encapp_env():
+    # the runs of the devices go on in parallel, not one by one in a daemon
+    env = dict(os.environ)
+    env.pop(DAEMON_ENV, None)
+    return env
+
+
+def get_devices(options):
+    if options.emulate:
+        return [{'serial': f'emulated{num + 1:04d}', 'model': DEFAULT_MODEL,
+                 'emulate': os.path.abspath(root)}
+                for num, root in enumerate(options.emulate)]
+    devices = []
+    for serial, info in get_connected_devices(options.debug).items():
+        if options.serial and serial not in options.serial:
+            continue
+        devices.append({'serial': serial, 'model': info['model']})
+    return devices
+
+
+def get_codecs(device, debug=0):
+    if device.get('emulate') is None:
+        codecs = codec_caps.load_capabilities(device['serial'],
+                                              device['model'], debug)
+        if codecs is not None:
+            return codec_caps.codec_names(codecs)
+    # encapp.py list leaves codecs_<model>.txt in the current dir
+    with tempfile.TemporaryDirectory() as tmpdir:
+        proc = subprocess.run(encapp_cmd(device, 'list'), cwd=tmpdir,
+                              env=encapp_env(), stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT,
+                              universal_newlines=True)
+        if debug > 0:
+            print(proc.stdout)
+        filename = os.path.join(tmpdir, f'codecs_{device["model"]}.txt')
+        if proc.returncode != 0 or not os.path.exists(filename):
+            return None
+        with open(filename) as codec_file:
+            return codec_caps.codec_names(
+                codec_caps.parse_codecs(codec_file.read()))
+
+
+def device_connected(device, debug=0):
+    if device.get('emulate') is not None:
+        return True
+    try:
+        return device['serial'] in get_connected_devices(debug)
+    except AssertionError:
+        return False
+
+
+def run_job(queue, job, device, workdir, debug=0):
+    output = job['output'] or os.path.join(workdir, f'job_{job["id"]:05d}')
+    log = os.path.join(workdir, f'job_{job["id"]:05d}_{job["attempt"]}.log')
+    cmd = encapp_cmd(device, 'run', job['configfile'], output) + job['args']
+    print(f'{device["serial"]}: job {job["id"]} attempt {job["attempts"]}: '
+          f'{job["configfile"]}')
+    if debug > 0:
+        print(' '.join(cmd))
+    with open(log, 'w') as logfile:
+        exitcode = subprocess.run(cmd, env=encapp_env(), stdout=logfile,
+                                  stderr=subprocess.STDOUT).returncode
+    # a device can also drop out of a run that then ends "successfully"
+    device_ok = device_connected(device, debug)
+    error = None
+    if not device_ok:
+        error = f'device {device["serial"]} disconnected'
+    elif exitcode != 0:
+        error = f'encapp.py exited with {exitcode}, see {log}'
+    state = queue.finish(job, exitcode, device_ok, log, error)
+    print(f'{device["serial"]}: job {job["id"]} {state}'
+          f'{"" if error is None else ": " + error}')
+    return device_ok
+
+
+def device_worker(queue, device, options):
+    codecs = get_codecs(device, options.debug)
+    if codecs is None:
+        print(f'{device["serial"]}: failed to list codecs, not used')
+        return
+    while True:
+        job = queue.claim(device['serial'], device['model'], codecs)
+        if job is None:
+            if not options.follow:
+                return
+            time.sleep(options.poll)
+            continue
+        if not run_job(queue, job, device, options.workdir, options.debug):
+            print(f'{device["serial"]}: lost the device')
+            return
+
+
+def run_scheduler(queue, options):
+    devices = get_devices(options)
+    assert len(devices) > 0, 'error: no devices connected'
+    os.makedirs(options.workdir, exist_ok=True)
+    # jobs of these devices cannot still be running
+    recovered = queue.recover([device['serial'] for device in devices])
+    if recovered > 0:
+        print(f'{recovered} interrupted jobs queued again')
+    print(f'scheduling on {", ".join(device["serial"] for device in devices)}')
+    workers = [threading.Thread(target=device_worker,
+                                args=(queue, device, options), daemon=True)
+               for device in devices]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        while worker.is_alive():
+            # a plain join() cannot be interrupted
+            worker.join(1)
+    left = queue.jobs(job_queue.QUEUED)
+    if left:
+        print(f'{len(left)} queued jobs do not fit the devices')
+
+
+def print_jobs(queue, state):
+    print(f'{"id":>5} {"state":8} {"attempts":>8} {"serial":16} '
+          f'{"wait":>8} {"run":>8}  constraints  config')
+    now = time.time()
+    for job in queue.jobs(state):
+        wait = (job['started'] or now) - job['submitted']
+        run = None
+        if job['started'] is not None:
+            run = (job['finished'] or now) - job['started']
+        constraints = ','.join(val for val in (job['model'], job['codec'])
+                               if val) or '-'
+        print(f'{job["id"]:>5} {job["state"]:8} {job["attempts"]:>8} '
+              f'{job["serial"] or "-":16} {format_duration(wait):>8} '
+              f'{format_duration(run):>8}  {constraints}  '
+              f'{job["configfile"]}')
+
+
+def print_job(queue, job_id):
+    job = queue.job(job_id)
+    assert job is not None, f'error: no job {job_id}'
+    for key in ('id', 'state', 'configfile', 'output', 'args', 'model',
+                'codec', 'priority', 'attempts', 'max_attempts', 'error'):
+        print(f'{key}: {job[key]}')
+    for attempt in queue.attempts(job_id):
+        duration = None
+        if attempt['finished'] is not None:
+            duration = attempt['finished'] - attempt['started']
+        start = time.strftime('%Y-%m-%d %H:%M:%S',
+                              time.localtime(attempt['started']))
+        print(f'attempt {attempt["id"]}: {attempt["serial"]} {start} '
+              f'{format_duration(duration)} exit: {attempt["exitcode"]} '
+              f'device ok: {bool(attempt["device_ok"])} log: {attempt["log"]}')
+
+
+def get_options(argv):
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--queue', default=job_queue.DEFAULT_QUEUE_FILE,
+                        help='Queue file (default %(default)s)')
+    parser.add_argument('-d', '--debug', action='count', default=0,
+                        help='Increase verbosity (use many times for more)')
+    commands = parser.add_subparsers(dest='command')
+
+    submit = commands.add_parser('submit', help='Queue a test definition')
+    submit.add_argument('configfile', help='Test definition (pbtxt)')
+    submit.add_argument('-o', '--output', default=None,
+                        help='Output dir (default job_<id> in the '
+                             'scheduler workdir)')
+    submit.add_argument('--model', default=None,
+                        help='Only run on devices of this model')
+    submit.add_argument('--codec', default=None,
+                        help='Only run on devices with this codec '
+                             '(name or media type, e.g. video/hevc)')
+    submit.add_argument('--priority', type=int, default=0,
+                        help='Higher priority jobs run first')
+    submit.add_argument('--attempts', type=int,
+                        default=job_queue.DEFAULT_MAX_ATTEMPTS,
+                        help='Attempts before a job is marked failed')
+    submit.add_argument('args', nargs=argparse.REMAINDER,
+                        help='Extra encapp.py run arguments, after --')
+
+    run = commands.add_parser('run', help='Run queued jobs on the devices')
+    run.add_argument('--serial', action='append', default=None,
+                     help='Only use these devices (default all connected)')
+    run.add_argument('--workdir', default='.',
+                     help='Dir for logs and default outputs')
+    run.add_argument('--follow', action='store_true',
+                     help='Keep waiting for new jobs')
+    run.add_argument('--poll', type=float, default=5,
+                     help='Seconds between queue checks with --follow')
+    run.add_argument('--emulate', action='append', default=None,
+                     metavar='dir',
+                     help='Schedule on an emulated device using dir as its '
+                          'storage (can be used multiple times)')
+
+    listing = commands.add_parser('list', help='List the jobs')
+    listing.add_argument('--state', choices=job_queue.JOB_STATES,
+                         default=None)
+    show = commands.add_parser('show', help='Show a job and its attempts')
+    show.add_argument('id', type=int)
+    cancel = commands.add_parser('cancel', help='Cancel a job')
+    cancel.add_argument('id', type=int)
+    retry = commands.add_parser('retry', help='Queue an ended job again')
+    retry.add_argument('id', type=int)
+
+    options = parser.parse_args(argv[1:])
+    if options.command is None:
+        parser.print_help()
+        sys.exit(0)
+    return options
+
+
+def main(argv):
+    options = get_options(argv)
+    queue = job_queue.JobQueue(options.queue)
+    if options.command == 'submit':
+        assert os.path.exists(options.configfile), (
+            f'error: {options.configfile} does not exist')
+        args = options.args
+        if args and args[0] == '--':
+            args = args[1:]
+        output = options.output
+        if output is not None:
+            output = os.path.abspath(output)
+        job_id = queue.submit(os.path.abspath(options.configfile), output,
+                              args, options.model, options.codec,
+                              options.priority, options.attempts)
+        print(job_id)
+    elif options.command == 'run':
+        options.workdir = os.path.abspath(options.workdir)
+        run_scheduler(queue, options)
+    elif options.command == 'list':
+        print_jobs(queue, options.state)
+    elif options.command == 'show':
+        print_job(queue, options.id)
+    elif options.command == 'cancel':
+        assert queue.cancel(options.id), (
+            f'error: job {options.id} is not queued or running')
+    elif options.command == 'retry':
+        assert queue.retry(options.id), (
+            f'error: job {options.id} has not ended')
+
+
+if __name__ == '__main__':
+    try:
+        main(sys.argv)
+    except AssertionError as ae:
+        print(ae, file=sys.stderr)
+        sys.exit(1)
@@ -16,23 +16,35 @@ Searchable properties are
 The output can either be the video source files or the json result.
 """
 
-import argparse
-from argparse import RawTextHelpFormatter
 import sys
-import json
-import os
-import pandas as pd
-import re
-from encapp import convert_to_bps
+
+from encapp_tool.daemon import forward_to_daemon
+
+# hand the command over to a running encapp daemon (see encapp_daemon.py)
+# before paying for the imports below
+if __name__ == '__main__':
+    forward_to_daemon('search', sys.argv)
+
+import argparse  # noqa: E402
+from argparse import RawTextHelpFormatter  # noqa: E402
+import csv  # noqa: E402
+import json  # noqa: E402
+import os  # noqa: E402
+import re  # noqa: E402
+from encapp_tool.units import convert_to_bps  # noqa: E402
 
 INDEX_FILE_NAME = '.encapp_index'
+INDEX_LABELS = ['file', 'media', 'codec', 'gop', 'fps', 'width', 'height',
+                'bitrate', 'real_bitrate']
+# parsed indexes by path, reused while the file is unchanged (the
+# encapp daemon keeps this across queries)
+_INDEX_CACHE = {}
 
 
 def getProperties(options, json):
     data = getData(options, True)
     _, filename = os.path.split(json)
-    row = data.loc[data['file'].str.contains(filename)]
-    return row
+    return [row for row in data if filename in row['file']]
 
 
 def getFilesInDir(directory, recursive):
@@ -69,21 +81,50 @@ def indexDirectory(options, recursive):
         except Exception as exc:
             print('json ' + df + ', load failed: ' + str(exc))
 
-    labels = ['file', 'media', 'codec', 'gop', 'fps', 'width', 'height',
-              'bitrate', 'real_bitrate']
-    pdata = pd.DataFrame.from_records(settings, columns=labels,
-                                      coerce_float=True)
-    pdata.to_csv(f'{options.path}/{INDEX_FILE_NAME}', index=False)
+    with open(f'{options.path}/{INDEX_FILE_NAME}', 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(INDEX_LABELS)
+        writer.writerows(settings)
+
+
+def parseValue(value):
+    # index cells are numbers where possible (plain csv, pandas is too
+    # slow to import for a query)
+    for kind in (int, float):
+        try:
+            return kind(value)
+        except ValueError:
+            pass
+    return value
+
+
+def readIndex(path):
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _INDEX_CACHE.get(path)
+    if cached is None or cached[0] != stamp:
+        with open(path, newline='') as f:
+            reader = csv.DictReader(f)
+            if reader.fieldnames != INDEX_LABELS:
+                raise ValueError(
+                    f'unexpected index columns: {reader.fieldnames}')
+            rows = [{key: parseValue(val) for key, val in row.items()}
+                    for row in reader]
+        cached = (stamp, rows)
+        _INDEX_CACHE[path] = cached
+    # callers modify the rows
+    return [dict(row) for row in cached[1]]
 
 
 def getData(options, recursive):
     try:
-        data = pd.read_csv(f'{options.path}/{INDEX_FILE_NAME}')
+        data = readIndex(f'{options.path}/{INDEX_FILE_NAME}')
     except Exception:
         sys.stderr.write('Error when reading index, reindex\n')
         indexDirectory(options, recursive)
         try:
-            data = pd.read_csv(f'{options.path}/{INDEX_FILE_NAME}')
+            data = readIndex(f'{options.path}/{INDEX_FILE_NAME}')
         except Exception:
             sys.stderr.write('Failed to read index file: '
                              f'{options.path}/{INDEX_FILE_NAME}')
@@ -93,9 +134,11 @@ def getData(options, recursive):
 
 def search(options):
     data = getData(options, not options.no_rec)
-    data['bitrate'] = data['bitrate'].apply(lambda x: convert_to_bps(x))
+    for row in data:
+        row['bitrate'] = convert_to_bps(row['bitrate'])
     if options.codec:
-        data = data.loc[data['codec'].str.contains(options.codec)]
+        data = [row for row in data
+                if re.search(options.codec, str(row['codec']))]
     if options.bitrate:
         ranges = options.bitrate.split('-')
         vals = []
@@ -104,27 +147,29 @@ def search(options):
             vals.append(int(bitrate))
 
         if len(vals) == 2:
-            data = data.loc[(data['bitrate'] >= vals[0]) &
-                            (data['bitrate'] <= vals[1])]
+            data = [row for row in data
+                    if vals[0] <= row['bitrate'] <= vals[1]]
         else:
-            data = data.loc[data['bitrate'] == vals[0]]
+            data = [row for row in data if row['bitrate'] == vals[0]]
     if options.gop:
-        data = data.loc[data['gop'] == options.gop]
+        data = [row for row in data if row['gop'] == options.gop]
     if options.fps:
-        data = data.loc[data['fps'] == options.fps]
+        data = [row for row in data if row['fps'] == options.fps]
     if options.size:
         sizes = options.size.split('x')
         if len(sizes) == 2:
-            data = data.loc[(data['width'] == int(sizes[0])) &
-                            (data['height'] == int(sizes[1]))]
+            data = [row for row in data
+                    if row['width'] == int(sizes[0]) and
+                    row['height'] == int(sizes[1])]
         else:
-            data = data.loc[(data['width'] == int(sizes[0])) |
-                            (data['height'] == int(sizes[0]))]
+            data = [row for row in data
+                    if row['width'] == int(sizes[0]) or
+                    row['height'] == int(sizes[0])]
 
     return data
 
 
-def main():
+def main(argv):
     parser = argparse.ArgumentParser(description=__doc__,
                                      formatter_class=RawTextHelpFormatter)
     parser.add_argument('path',
@@ -140,7 +185,7 @@ def main():
     parser.add_argument('-v', '--video', action='store_true')
     parser.add_argument('-p', '--print_data', action='store_true')
 
-    options = parser.parse_args()
+    options = parser.parse_args(argv[1:])
     if options.path is None:
         options.path = os.getcwd()
 
@@ -149,10 +194,12 @@ def main():
 
     data = search(options)
 
-    data = data.sort_values(by=['codec', 'gop', 'fps', 'height', 'bitrate'])
+    data = sorted(data, key=lambda row: (row['codec'], row['gop'],
+                                         row['fps'], row['height'],
+                                         row['bitrate']))
     if options.print_data:
-        for _index, row in data.iterrows():
-            print('{:s},{:s},{:s},{:d},{:d},{:d},{:d},{:d},{:d}'.format(
+        for row in data:
+            print('{:s},{:s},{:s},{},{},{},{},{},{}'.format(
                   row['file'],
                   row['media'],
                   row['codec'],
@@ -163,16 +210,14 @@ def main():
                   row['bitrate'],
                   row['real_bitrate']))
     else:
-        files = data['file'].values
-        for fl in files:
-            directory, filename = os.path.split(fl)
+        for row in data:
+            directory, filename = os.path.split(row['file'])
             if options.video:
-                video = data.loc[data['file'] == fl]
-                name = directory + '/' + video['media'].values[0]
+                name = directory + '/' + row['media']
             else:
-                name = fl
+                name = row['file']
             print(name)
 
 
 if __name__ == '__main__':
-    main()
+    main(sys.argv)
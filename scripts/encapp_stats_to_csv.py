@@ -3,10 +3,9 @@
 import json
 import argparse
 import pandas as pd
-import seaborn as sb
-import matplotlib.pyplot as plt
 import numpy as np
-import encapp as ep
+from encapp_tool import frame_metrics
+from encapp_tool.units import convert_to_bps
 
 # pd.options.mode.chained_assignment = 'raise'
 
@@ -50,6 +49,14 @@ def parse_encoding_data(json, inputfile, debug=0):
 
     try:
         data = pd.DataFrame(json['frames'])
+        fps = json['settings']['fps']
+        # rolling windows need a frame count
+        valid, metrics = frame_metrics.frame_metrics(
+            data['pts'].values, data['starttime'].values,
+            data['stoptime'].values, data['proctime'].values,
+            size=data['size'].values, window=int(round(fps)))
+        # delete the invalid frames (and the last one, it has no duration)
+        data = data.drop(index=data.index[~valid])
 
         data['source'] = inputfile
         data['codec'] = json['settings']['codec']
@@ -57,40 +64,14 @@ def parse_encoding_data(json, inputfile, debug=0):
         data['camera'] = (json['testdefinition'].find(
             "filepath: \"camera\"")) > 0
         data['test'] = json['test']
-        data['bitrate'] = ep.convert_to_bps(json['settings']['bitrate'])
+        data['bitrate'] = convert_to_bps(json['settings']['bitrate'])
         data['height'] = json['settings']['height']
-        fps = json['settings']['fps']
         data['fps'] = fps
-        data['duration_ms'] = round((data['pts'].shift(-1, axis='index',
-                                     fill_value=0) - data['pts']) / 1000, 2)
-        data['bitrate_per_frame_bps'] = (
-            data['size'] * 8.0) / (data['duration_ms'] / 1000.0)
-        data['average_bitrate'] = np.mean(data['bitrate_per_frame_bps'])
-        data['stop-stop_ms'] = round(
-            (data['stoptime'].shift(-1, axis='index', fill_value=0) -
-             data['stoptime']) / 1000000, 2)
-        data.loc[data['proctime'] < 0] = 0
-        data.loc[data['duration_ms'] < 0] = 0
-        data['fps'] = round(1000.0 / (data['duration_ms']), 2)
-        data['proc_fps'] = round(1000.0 / (data['stop-stop_ms']), 2)
-        # delete the last item
-        data = data.loc[data['starttime'] > 0]
-        start_ts = data.iloc[0]['starttime']
-        data['rel_start_ms'] = round(
-            (data['starttime'] - start_ts) / 1000000, 2)
-        stop_ts = data.iloc[0]['stoptime']
-        data['rel_stop_ms'] = round((data['stoptime'] - stop_ts) / 1000000, 2)
-
-        data['start_pts_diff_ms'] = round(
-            data['rel_start_ms'] - data['pts'] / 1000, 2)
-        data['av_fps'] = data['fps'].rolling(
-            fps, min_periods=fps, win_type=None).sum() / fps
-        data['av_proc_fps'] = data['proc_fps'].rolling(
-            fps, min_periods=fps, win_type=None).sum() / fps
-        data['av_fps'].fillna(data['fps'], inplace=True)
-        data['av_proc_fps'].fillna(data['proc_fps'], inplace=True)
+        for name, values in metrics.items():
+            data[name] = values
+        data['inflight'] = frame_metrics.inflight(data['starttime'].values,
+                                                  data['stoptime'].values)
         data.fillna(0, inplace=True)
-        data, __ = calc_infligh(data, start_ts)
     except Exception as ex:
         print(f'parsing failed: {ex}')
         return None
@@ -106,7 +87,7 @@ def parse_decoding_data(json, inputfile, debug=0):
     try:
         decoded_data = pd.DataFrame(json['decoded_frames'])
         decoded_data['source'] = inputfile
-        fps = 30
+        fps = json.get('settings', {}).get('fps', 30)
         if (len(decoded_data) > 0):
             try:
                 decoded_data['codec'] = json['decoder_media_format']['mime']
@@ -119,38 +100,18 @@ def parse_decoding_data(json, inputfile, debug=0):
                 print('Failed to read decoder data')
                 decoded_data['height'] = 'unknown height'
 
-            decoded_data = decoded_data.loc[decoded_data['proctime'] >= 0]
-
-            # oh no we may have b frames...
-            decoded_data['duration_ms'] = round(
-                (decoded_data['pts'].shift(-1, axis='index', fill_value=0) -
-                 decoded_data['pts']) / 1000, 2)
-
-            decoded_data['fps'] = round(
-                1000.0 / (decoded_data['duration_ms']), 2)
-            decoded_data['stop-stop_ms'] = round(
-                (decoded_data['stoptime'].shift(-1, axis='index',
-                 fill_value=0) - decoded_data['stoptime']) / 1000000, 2)
-            decoded_data['proc_fps'] = round(
-                1000.0 / (decoded_data['stop-stop_ms']), 2)
-
-            start_ts = decoded_data.iloc[0]['starttime']
-            decoded_data['rel_start_ms'] = round(
-                (decoded_data['starttime'] - start_ts) / 1000000, 2)
-            stop_ts = decoded_data.iloc[0]['stoptime']
-            decoded_data['rel_stop_ms'] = round(
-                (decoded_data['stoptime'] - stop_ts) / 1000000, 2)
-
-            decoded_data['start_pts_diff_ms'] = round(
-                decoded_data['rel_start_ms'] - decoded_data['pts'] / 1000, 2)
-            decoded_data['av_fps'] = decoded_data['fps'].rolling(
-                fps, min_periods=fps, win_type=None).sum() / fps
-            decoded_data['av_proc_fps'] = decoded_data['proc_fps'].rolling(
-                fps, min_periods=fps, win_type=None).sum() / fps
-            decoded_data['av_fps'].fillna(decoded_data['fps'], inplace=True)
-            decoded_data['av_proc_fps'].fillna(
-                decoded_data['proc_fps'], inplace=True)
-            decoded_data.fillna(0)
+            decoded_data = decoded_data.drop(
+                index=decoded_data.index[decoded_data['proctime'] < 0])
+
+            # oh no we may have b frames... (a frame with a pts before the
+            # previous one is kept, with nan metrics)
+            _, metrics = frame_metrics.frame_metrics(
+                decoded_data['pts'].values, decoded_data['starttime'].values,
+                decoded_data['stoptime'].values,
+                decoded_data['proctime'].values, window=int(round(fps)),
+                drop_invalid=False)
+            for name, values in metrics.items():
+                decoded_data[name] = values
 
     except Exception as ex:
         print(f'Failed to parse decode data for {inputfile}: {ex}')
@@ -159,70 +120,80 @@ def parse_decoding_data(json, inputfile, debug=0):
     return decoded_data
 
 
+def parse_load_samples(json, time_ref):
+    ''' Get the gpu load and clock samples of a run on the frame time axis
+
+        SystemLoad reads the load and the clock in the same iteration,
+        but labels the load one period later, so the samples are paired
+        by index. Sampling starts with the test, just before the first
+        frame: time_ref (the first frame starttime) is used as time zero.
+        Returns None if the run has no samples.
+    '''
+    gpu = json.get('gpu_data', {})
+    load = pd.DataFrame(gpu.get('gpu_load_percentage', []))
+    clock = pd.DataFrame(gpu.get('gpu_clock_freq', []))
+    count = max(len(load), len(clock))
+    if count == 0:
+        return None
+    samples = pd.DataFrame(index=range(count))
+    if len(clock) == count:
+        samples['time_sec'] = clock['time_sec']
+    else:
+        samples['time_sec'] = load['time_sec'] - load['time_sec'].iloc[0]
+    if len(load) > 0:
+        samples['load_percentage'] = load['load_percentage']
+    if len(clock) > 0:
+        samples['clock_MHz'] = pd.to_numeric(clock['clock_MHz'],
+                                             errors='coerce')
+        try:
+            max_clock = float(gpu['gpu_max_clock'])
+        except (KeyError, ValueError):
+            max_clock = np.nan
+        samples['clock_perc'] = 100.0 * samples['clock_MHz'] / max_clock
+    samples['time_ns'] = time_ref + (samples['time_sec'] * 1e9).round()
+    return samples
+
+
+def align_load_data(frames, samples, column='starttime'):
+    ''' Add the last load sample taken before each frame (as-of join on
+        the frame column) as gpu_<sample> columns, nan before the first
+        sample
+    '''
+    times = samples['time_ns'].values
+    order = np.argsort(times, kind='stable')
+    pos = np.searchsorted(times[order], frames[column].values,
+                          side='right') - 1
+    valid = pos >= 0
+    index = order[np.where(valid, pos, 0)]
+    for name in ('load_percentage', 'clock_MHz', 'clock_perc'):
+        if name in samples:
+            values = samples[name].values.astype(float)[index]
+            frames[f'gpu_{name}'] = np.where(valid, values, np.nan)
+    return frames
+
+
 def parse_gpu_data(json, inputfile, debug=0):
     if debug > 0:
         print('Parse gpu data')
     gpu_data = None
     try:
-        gpu_data = pd.DataFrame(json['gpu_data']['gpu_load_percentage'])
-        if len(gpu_data) > 0:
-            gpuclock_data = pd.DataFrame(json['gpu_data']['gpu_clock_freq'])
-            gpu_max_clock = int(json['gpu_data']['gpu_max_clock'])
-            gpu_data['clock_perc'] = (
-                100.0 * gpuclock_data['clock_MHz'].astype(float) /
-                gpu_max_clock)
-            gpu_data = gpu_data.merge(gpuclock_data)
-            gpu_model = json['gpu_data']['gpu_model']
+        gpu_data = parse_load_samples(json, 0)
+        if gpu_data is not None:
+            gpu_data = gpu_data.drop(columns='time_ns')
             gpu_data['source'] = inputfile
-            gpu_data['gpu_max_clock'] = gpu_max_clock
-            gpu_data['gpu_model'] = gpu_model
-            gpu_data.fillna(0)
+            gpu_data['gpu_max_clock'] = int(json['gpu_data']['gpu_max_clock'])
+            gpu_data['gpu_model'] = json['gpu_data']['gpu_model']
     except Exception as ex:
         print(f'GPU parsing failed: {ex}')
         pass
     return gpu_data
 
 
-def calc_infligh(frames, time_ref):
-    ''' Calculate how many frames have start but not yet stopped
-        during a certain period.
-        Remove the offset using time_ref '''
-
-    sources = pd.unique(frames['source'])
-    coding = []
-    for source in sources:
-        # Calculate how many frames starts encoding before a frame has finished
-        # relying on the accurace of the System.nanoTime()
-        inflight = []
-        filtered = frames.loc[frames['source'] == source]
-        start = np.min(filtered['starttime'])
-        stop = np.max(filtered['stoptime'])
-        # Calculate a time where the start offset (if existing) does not
-        # blur the numbers
-        coding.append([source, start - time_ref, stop - time_ref])
-        for row in filtered.iterrows():
-            start = row[1]['starttime']
-            stop = row[1]['stoptime']
-            intime = (filtered.loc[(filtered['stoptime'] > start) &
-                                   (filtered['starttime'] < stop)])
-            count = len(intime)
-            inflight.append(count)
-        frames.loc[frames['source'] == source, 'inflight'] = inflight
-
-    labels = ['source', 'starttime', 'stoptime']
-    concurrent = pd.DataFrame.from_records(coding, columns=labels,
-                                           coerce_float=True)
-
-    # calculate how many new encoding are started before stoptime
-    inflight = []
-    for row in concurrent.iterrows():
-        start = row[1]['starttime']
-        stop = row[1]['stoptime']
-        count = (len(concurrent.loc[(concurrent['stoptime'] > start) &
-                                    (concurrent['starttime'] < stop)]))
-        inflight.append(count)
-    concurrent['conc'] = inflight
-    return frames, concurrent
+def first_start(json):
+    # time zero of the load samples (see parse_load_samples())
+    starts = [frame['starttime'] for frame in json.get('frames', [])
+              if frame.get('starttime', 0) > 0]
+    return min(starts) if starts else 0
 
 
 def clean_name(name, debug=0):
@@ -258,15 +229,22 @@ def main():
     with open(options.file) as json_file:
         alldata = json.load(json_file)
 
+        # gpu load and clock at the start of every frame
+        samples = parse_load_samples(alldata, first_start(alldata))
+
         encoding_data = parse_encoding_data(alldata, options.file,
                                             options.debug)
 
         if encoding_data is not None and len(encoding_data) > 0:
+            if samples is not None:
+                encoding_data = align_load_data(encoding_data, samples)
             encoding_data.to_csv(f'{options.file}_encoding_data.csv')
 
         decoded_data = parse_decoding_data(alldata, options.file,
                                            options.debug)
         if decoded_data is not None and len(decoded_data) > 0:
+            if samples is not None:
+                decoded_data = align_load_data(decoded_data, samples)
             decoded_data.to_csv(f'{options.file}_decoded_data.csv')
 
         gpu_data = parse_gpu_data(alldata, options.file, options.debug)
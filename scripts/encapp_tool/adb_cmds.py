@@ -1,10 +1,55 @@
 #!/usr/bin/env python3
 import re
+import time
 from subprocess import PIPE, Popen, SubprocessError
 from typing import Dict, List, Optional, Tuple
 
+from encapp_tool.trace import span
+
 ENCAPP_OUTPUT_FILE_NAME_RE = r"encapp_.*"
 
+# stand-in for the adb binary (see set_adb_backend())
+_ADB_BACKEND = None
+# seconds to reuse the "adb devices" output, 0 to always run it (a long-lived
+# process such as the encapp daemon turns it on)
+DEVICE_LIST_TTL = 0
+# (time, device_info)
+_DEVICE_LIST = None
+
+
+def set_adb_backend(backend) -> None:
+    """Run adb commands through a backend instead of the adb binary
+
+    Args:
+        backend: Object with a run(cmd) method returning the same tuple
+                 as run_cmd() (e.g. an EmulatedDevice), None for adb
+    """
+    global _ADB_BACKEND, _DEVICE_LIST
+    _ADB_BACKEND = backend
+    _DEVICE_LIST = None
+
+
+def _cmd_span_name(cmd: str) -> str:
+    """Get a short, low cardinality name for a command (for tracing)
+
+    Args:
+        cmd (str): Command string
+
+    Returns:
+        E.g. "adb shell am" for "adb -s X shell am start ..."
+    """
+    words = cmd.split()
+    if not words:
+        return "cmd"
+    if words[0] != "adb":
+        return words[0]
+    words = words[1:]
+    if len(words) > 1 and words[0] == "-s":
+        words = words[2:]
+    if words and words[0] == "shell":
+        return " ".join(["adb"] + words[:2])
+    return " ".join(["adb"] + words[:1])
+
 
 def run_cmd(cmd: str, debug: int = 0) -> Tuple[bool, str, str]:
     """Run sh command
@@ -17,12 +62,20 @@ def run_cmd(cmd: str, debug: int = 0) -> Tuple[bool, str, str]:
         Tuple with boolean (True cmd execution succeeded, false otherwise)
         stdout and stderr messages.
     """
+    if debug > 0:
+        print(cmd, sep=" ")
+    if _ADB_BACKEND is not None and cmd.startswith("adb "):
+        with span(_cmd_span_name(cmd), cmd=cmd) as record:
+            ret, stdout, stderr = _ADB_BACKEND.run(cmd)
+            record["ret"] = 0 if ret else 1
+        return ret, stdout, stderr
     try:
-        if debug > 0:
-            print(cmd, sep=" ")
-        with Popen(cmd, shell=True, stdout=PIPE, stderr=PIPE) as process:
+        with span(_cmd_span_name(cmd), cmd=cmd) as record, Popen(
+            cmd, shell=True, stdout=PIPE, stderr=PIPE
+        ) as process:
             stdout, stderr = process.communicate()
             ret = bool(process.returncode == 0)
+            record["ret"] = process.returncode
     except SubprocessError:
         print("Failed to run command: " + cmd)
         return False, "", ""
@@ -103,6 +156,9 @@ def get_connected_devices(debug: int) -> Dict:
         Map of found connected devices through adb, with serial no.
         as key.
     """
+    global _DEVICE_LIST
+    if _DEVICE_LIST is not None and time.time() - _DEVICE_LIST[0] < DEVICE_LIST_TTL:
+        return {serial: dict(info) for serial, info in _DEVICE_LIST[1].items()}
     # list all available devices
     adb_cmd = "adb devices -l"
     ret, stdout, _ = run_cmd(adb_cmd, debug)
@@ -123,6 +179,8 @@ def get_connected_devices(debug: int) -> Dict:
         if "model" not in item_dict:
             item_dict["model"] = "generic"
         device_info[serial] = item_dict
+    if DEVICE_LIST_TTL > 0:
+        _DEVICE_LIST = (time.time(), {serial: dict(info) for serial, info in device_info.items()})
     return device_info
 
 
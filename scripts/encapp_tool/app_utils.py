@@ -17,6 +17,11 @@ RELEASE_APK_DIR = os.path.abspath(
 APK_NAME_MAIN = f"{APPNAME_MAIN}-v{__version__}-debug.apk"
 APK_MAIN = os.path.join(RELEASE_APK_DIR, APK_NAME_MAIN)
 
+# host-side state (device storage records, caches) survives across runs
+CACHE_DIR = os.environ.get(
+    "ENCAPP_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "encapp")
+)
+
 
 def install_app(serial, debug=0):
     """Install encapp apk and grant required permissions
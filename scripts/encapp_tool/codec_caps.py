@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+from encapp_tool.adb_cmds import run_cmd
+from encapp_tool.app_utils import CACHE_DIR
+from encapp_tool.units import convert_to_bps
+
+CACHE_VERSION = 2
+FINGERPRINT_PROP = "ro.build.fingerprint"
+# encoder_capabilities entries and the Configure.BitrateMode names
+BITRATE_MODES = {"MODE_CBR": "cbr", "MODE_CQ": "cq", "MODE_VBR": "vbr"}
+# header of the free form "key: value" lines of the default format
+DEFAULT_SETTINGS = "Default settings:"
+# "[1, 40000000]" (android Range.toString())
+_RANGE_RE = re.compile(r"^\[\s*([-0-9.e+]+)\s*,\s*([-0-9.e+]+)\s*\]$")
+
+
+def _number(value: str):
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+
+def _parse_range(value: str) -> Optional[List]:
+    match = _RANGE_RE.match(value.strip())
+    if match is None:
+        return None
+    return [_number(match.group(1)), _number(match.group(2))]
+
+
+def _parse_blocks(text: str) -> Dict:
+    """Parse the codecs.txt text format into nested dicts
+
+    Blocks ("name {" ... "}") become lists of dicts under their name,
+    since most of them repeat (codecs, media types, colors), and
+    "key: value" lines become strings. The default settings the app
+    writes for some codecs are skipped, as is anything else.
+    """
+    root = {}
+    stack = [root]
+    defaults = False
+    for line in text.splitlines():
+        line = line.strip()
+        if line == DEFAULT_SETTINGS:
+            defaults = True
+            continue
+        if line.endswith("{") and ": " in line:
+            # the last default setting has no line end, so the next
+            # block starts on its line ("profile: 8      name {")
+            line = line[:-1].split()[-1] + " {"
+        if defaults and (line.endswith("{") or line == "}"):
+            defaults = False
+        if defaults:
+            continue
+        if line.endswith("{"):
+            block = {}
+            stack[-1].setdefault(line[:-1].strip(), []).append(block)
+            stack.append(block)
+        elif line == "}":
+            if len(stack) > 1:
+                stack.pop()
+        elif ": " in line:
+            key, value = line.split(": ", 1)
+            stack[-1][key.strip()] = value.strip()
+    return root
+
+
+def _media_type(block: Dict) -> Dict:
+    video = (block.get("video_capabilities") or [{}])[0]
+    encoder = (block.get("encoder_capabilities") or [{}])[0]
+    colors = []
+    for formats in block.get("color_formats", []):
+        for color in formats.get("color", []):
+            if color.get("format", "").lstrip("-").isdigit():
+                colors.append({"format": int(color["format"]), "name": color.get("name")})
+    profile_levels = []
+    for levels in block.get("profile_levels", []):
+        for level in levels.get("profile_level", []):
+            try:
+                profile_levels.append({"profile": int(level["profile"]), "level": int(level["level"])})
+            except (KeyError, ValueError):
+                continue
+    alignment = {}
+    for key in ("width_alignment", "height_alignment"):
+        if video.get(key, "").isdigit():
+            alignment[key] = int(video[key])
+    instances = block.get("max_supported_instances", "")
+    return {
+        "media_type": block.get("media_type") or block.get("mime_type"),
+        "max_supported_instances": int(instances) if instances.isdigit() else None,
+        "color_formats": colors,
+        "profile_levels": profile_levels,
+        "bitrate_modes": {
+            mode: encoder[key] == "true" for key, mode in BITRATE_MODES.items() if key in encoder
+        },
+        "bitrate_range": _parse_range(video.get("bitrate_range", "")),
+        "frame_rate_range": _parse_range(video.get("supported_frame_rates", "")),
+        "width_range": _parse_range(video.get("supported_widths", "")),
+        "height_range": _parse_range(video.get("supported_heights", "")),
+        "width_alignment": alignment.get("width_alignment", 1),
+        "height_alignment": alignment.get("height_alignment", 1),
+    }
+
+
+def parse_codecs(text: str) -> List[Dict]:
+    """Parse a codecs.txt file written by the app (list_codecs)
+
+    Args:
+        text (str): codecs.txt contents
+
+    Returns:
+        One capability record per codec: name, encoder (bool) and its
+        media types with color formats, profile levels, bitrate modes,
+        bitrate/frame rate/size ranges and alignments.
+    """
+    root = _parse_blocks(text)
+    codecs = []
+    for section in ("encoders", "decoders"):
+        for block in root.get(section, []):
+            for codec in block.get("MediaCodec", []):
+                codecs.append(
+                    {
+                        "name": codec.get("name"),
+                        "encoder": codec.get("is_encoder", str(section == "encoders")) == "true",
+                        "media_types": [_media_type(media) for media in codec.get("media_type", [])],
+                    }
+                )
+    return codecs
+
+
+def codec_names(codecs: List[Dict]) -> Set[str]:
+    """Get the names and media types of all the codecs"""
+    names = set()
+    for codec in codecs:
+        names.add(codec["name"])
+        names.update(media["media_type"] for media in codec["media_types"])
+    return names
+
+
+def get_fingerprint(serial: str, debug: int = 0) -> str:
+    """Get the build fingerprint of an android device, "" if unknown"""
+    ret, stdout, _ = run_cmd(f"adb -s {serial} shell getprop {FINGERPRINT_PROP}", debug)
+    return stdout.strip() if ret else ""
+
+
+def cache_path(model: str, fingerprint: str) -> str:
+    """Get the capability cache file of a device model and build
+
+    Args:
+        model (str): Device model
+        fingerprint (str): Build fingerprint (ro.build.fingerprint)
+    """
+    digest = hashlib.sha1(fingerprint.encode()).hexdigest()[:16]
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+    return os.path.join(CACHE_DIR, "codecs", f"{name}_{digest}.json")
+
+
+def store_capabilities(serial: str, model: str, text: str, debug: int = 0) -> List[Dict]:
+    """Parse a codecs.txt of a device and cache the capabilities
+
+    Nothing is cached for devices without a build fingerprint, since an
+    update could change their codecs unnoticed.
+
+    Args:
+        serial (str): Android device serial no.
+        model (str): Device model
+        text (str): codecs.txt contents
+
+    Returns:
+        Capability records (see parse_codecs()).
+    """
+    codecs = parse_codecs(text)
+    fingerprint = get_fingerprint(serial, debug)
+    if not fingerprint:
+        return codecs
+    path = cache_path(model, fingerprint)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as fd:
+        json.dump(
+            {"version": CACHE_VERSION, "model": model, "fingerprint": fingerprint, "codecs": codecs},
+            fd,
+            indent=1,
+        )
+    os.replace(tmp_path, path)
+    return codecs
+
+
+def load_capabilities(serial: str, model: str, debug: int = 0) -> Optional[List[Dict]]:
+    """Get the cached capabilities of a device
+
+    Args:
+        serial (str): Android device serial no.
+        model (str): Device model
+
+    Returns:
+        Capability records, None if the model and build are not cached.
+    """
+    fingerprint = get_fingerprint(serial, debug)
+    if not fingerprint:
+        return None
+    try:
+        with open(cache_path(model, fingerprint)) as fd:
+            cached = json.load(fd)
+    except (OSError, ValueError):
+        return None
+    if cached.get("version") != CACHE_VERSION or cached.get("fingerprint") != fingerprint:
+        return None
+    return cached["codecs"]
+
+
+def find_encoder(codecs: List[Dict], codec: str) -> Tuple[Optional[Dict], Optional[str]]:
+    """Find the encoder the app would pick for a Configure.codec value
+
+    Like the app, an exact (case insensitive) name match wins, otherwise
+    the name has to contain the value and be the only video encoder that
+    does.
+
+    Args:
+        codecs (list): Capability records
+        codec (str): Codec name or part of it
+
+    Returns:
+        (encoder, None), or (None, reason) if there is no single match.
+    """
+    wanted = codec.lower()
+    video = [
+        item
+        for item in codecs
+        if item["encoder"] and item["media_types"] and "video" in (item["media_types"][0]["media_type"] or "")
+    ]
+    for item in video:
+        if item["name"].lower() == wanted:
+            return item, None
+    matching = [item for item in video if wanted in item["name"].lower()]
+    if len(matching) == 1:
+        return matching[0], None
+    if not matching:
+        return None, f"no encoder matching {codec}"
+    return None, f"ambiguous codec {codec}: {', '.join(item['name'] for item in matching)}"
+
+
+def _out_of_range(value, limits: Optional[List]) -> bool:
+    return limits is not None and not limits[0] <= value <= limits[1]
+
+
+def check_test(codecs: List[Dict], test) -> List[str]:
+    """Check a test against the capabilities of a device
+
+    Only the settings the capabilities describe are checked: the codec,
+    the output resolution, frame rate, bitrate and bitrate mode.
+    Parallel tests are checked as well.
+
+    Args:
+        codecs (list): Capability records
+        test (tests_pb2.Test): Test to check
+
+    Returns:
+        Reasons the test cannot run, empty if it looks fine.
+    """
+    problems = []
+    configure = test.configure
+    if configure.codec:
+        encoder, problem = find_encoder(codecs, configure.codec)
+        if encoder is None:
+            problems.append(problem)
+        else:
+            caps = encoder["media_types"][0]
+            resolution = configure.resolution or test.input.resolution
+            if re.match(r"^\d+x\d+$", resolution or ""):
+                width, height = (int(val) for val in resolution.split("x"))
+                if _out_of_range(width, caps["width_range"]) or _out_of_range(height, caps["height_range"]):
+                    problems.append(f"{encoder['name']} does not support {resolution}")
+                elif width % caps["width_alignment"] or height % caps["height_alignment"]:
+                    problems.append(
+                        f"{resolution} is not aligned to "
+                        f"{caps['width_alignment']}x{caps['height_alignment']} for {encoder['name']}"
+                    )
+            framerate = configure.framerate or test.input.framerate
+            if framerate and _out_of_range(framerate, caps["frame_rate_range"]):
+                problems.append(f"{encoder['name']} does not support {framerate:g} fps")
+            if configure.bitrate:
+                try:
+                    bitrate = convert_to_bps(configure.bitrate)
+                except ValueError:
+                    bitrate = None
+                if bitrate is not None and _out_of_range(bitrate, caps["bitrate_range"]):
+                    problems.append(f"{encoder['name']} does not support {configure.bitrate}")
+            if configure.HasField("bitrate_mode"):
+                mode = configure.BitrateMode.Name(configure.bitrate_mode)
+                if caps["bitrate_modes"].get(mode) is False:
+                    problems.append(f"{encoder['name']} does not support bitrate mode {mode}")
+    for parallel in test.parallel.test:
+        problems += check_test(codecs, parallel)
+    return problems
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+NS_PER_SEC = 1000000000
+NS_PER_MS = 1000000
+# streams with the same settings share a solo baseline
+BASELINE_KEYS = ("codec", "height", "fps")
+
+
+def busy_segments(starttime: np.ndarray, stoptime: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge frame processing intervals into the busy periods
+
+    Args:
+        starttime (np.ndarray): Frame start times
+        stoptime (np.ndarray): Frame stop times (not before the start)
+
+    Returns:
+        (starts, stops) of the sorted, disjoint periods with at least one
+        frame being processed.
+    """
+    if len(starttime) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    order = np.argsort(starttime, kind="stable")
+    starts = np.asarray(starttime)[order]
+    reach = np.maximum.accumulate(np.asarray(stoptime)[order])
+    # a period starts with a frame starting after all earlier ones stopped
+    first = np.concatenate(([True], starts[1:] > reach[:-1]))
+    last = np.concatenate((first[1:], [True]))
+    return starts[first], reach[last]
+
+
+def covered_time(starts: np.ndarray, stops: np.ndarray, times: np.ndarray) -> np.ndarray:
+    """Time covered by disjoint sorted segments before each time"""
+    lengths = stops - starts
+    before = np.concatenate(([0], np.cumsum(lengths)))
+    index = np.searchsorted(starts, times, side="right") - 1
+    partial = np.clip(times - starts[np.maximum(index, 0)], 0, lengths[np.maximum(index, 0)])
+    return np.where(index >= 0, before[np.maximum(index, 0)] + partial, 0)
+
+
+def inflight_time(starttime: np.ndarray, stoptime: np.ndarray, times: np.ndarray) -> np.ndarray:
+    """Processing time of all frames (overlaps counted) before each time"""
+    times = np.asarray(times, dtype=np.int64)
+    spent = np.zeros(len(times), dtype=np.int64)
+    # relative to the first time, the sums of (nanoTime) times overflow
+    origin = times.min() if len(times) > 0 else 0
+    times = times - origin
+    # sum of (time - start) over the started frames, minus (time - stop)
+    # over the stopped ones
+    for edges, sign in ((starttime, 1), (stoptime, -1)):
+        edges = np.sort(np.asarray(edges, dtype=np.int64) - origin)
+        sums = np.concatenate(([0], np.cumsum(edges)))
+        count = np.searchsorted(edges, times, side="right")
+        spent += sign * (count * times - sums[count])
+    return spent
+
+
+def active_streams(first: np.ndarray, last: np.ndarray, times: np.ndarray) -> np.ndarray:
+    """Count the streams between their first frame start and last stop"""
+    return np.searchsorted(np.sort(first), times, side="right") - np.searchsorted(np.sort(last), times, side="right")
+
+
+def group_runs(first: np.ndarray, last: np.ndarray) -> np.ndarray:
+    """Number the runs of streams, a run being overlapping streams
+
+    Args:
+        first (np.ndarray): First frame start of every stream
+        last (np.ndarray): Last frame stop of every stream
+
+    Returns:
+        Run number of every stream, runs ordered by time.
+    """
+    order = np.argsort(first, kind="stable")
+    reach = np.maximum.accumulate(np.asarray(last)[order])
+    new = np.concatenate(([True], np.asarray(first)[order][1:] >= reach[:-1]))
+    runs = np.empty(len(first), dtype=int)
+    runs[order] = np.cumsum(new) - 1
+    return runs
+
+
+def _latency_ms(stream: Dict) -> np.ndarray:
+    return (stream["stoptime"] - stream["starttime"]) / NS_PER_MS
+
+
+def _median(values: np.ndarray) -> float:
+    return float(np.median(values)) if len(values) > 0 else np.nan
+
+
+def concurrency_table(streams: List[Dict]) -> pd.DataFrame:
+    """Analyze how streams encoding at the same time affect each other
+
+    Streams (results) overlapping in time are one run, e.g. the tests of
+    a parallel test. The contention factor of a stream is its median
+    latency while other streams are active, relative to a solo baseline:
+    the median latency of runs with only one stream with the same codec,
+    height and fps or else the frames of the stream encoded alone.
+
+    Args:
+        streams (list): dicts with stream (name), codec, height, fps and
+                        the starttime and stoptime (ns) arrays of the
+                        frames (as from frame_metrics.frame_times())
+
+    Returns:
+        One row per stream and one for every run (stream "all"): frames,
+        start_sec (from the run start), duration_sec, throughput_fps,
+        throughput_perc (of the configured fps), latency_p50_ms,
+        latency_p99_ms, overlap_perc (frames started while other streams
+        were active), active_streams_mean/max, busy_perc (time with
+        frames in flight, for "all" the encoder utilization),
+        inflight_mean, solo_latency_ms, solo_baseline and
+        contention_factor.
+    """
+    streams = [stream for stream in streams if len(stream["starttime"]) > 0]
+    if len(streams) == 0:
+        return pd.DataFrame()
+    first = np.array([stream["starttime"].min() for stream in streams])
+    last = np.array([stream["stoptime"].max() for stream in streams])
+    runs = group_runs(first, last)
+    run_streams = np.bincount(runs)
+
+    solo = {}
+    for stream, run in zip(streams, runs):
+        if run_streams[run] == 1:
+            key = tuple(stream.get(name) for name in BASELINE_KEYS)
+            solo.setdefault(key, []).append(_latency_ms(stream))
+
+    rows = []
+    for run in range(len(run_streams)):
+        members = np.flatnonzero(runs == run)
+        run_start, run_stop = first[members].min(), last[members].max()
+        run_rows = []
+        for num in members:
+            stream = streams[num]
+            starttime, stoptime = stream["starttime"], stream["stoptime"]
+            span = max(1, last[num] - first[num])
+            active = active_streams(first[members], last[members], starttime)
+            latency = _latency_ms(stream)
+            key = tuple(stream.get(name) for name in BASELINE_KEYS)
+            if run_streams[run] > 1 and key in solo:
+                baseline, source = _median(np.concatenate(solo[key])), "solo run"
+            else:
+                baseline, source = _median(latency[active == 1]), "own frames"
+            concurrent = latency[active > 1]
+            segments = busy_segments(starttime, stoptime)
+            row = {
+                "run": run,
+                "stream": stream["stream"],
+                "codec": stream.get("codec"),
+                "height": stream.get("height"),
+                "fps": stream.get("fps"),
+                "frames": len(starttime),
+                "start_sec": (first[num] - run_start) / NS_PER_SEC,
+                "duration_sec": span / NS_PER_SEC,
+                "throughput_fps": len(starttime) * NS_PER_SEC / span,
+                "latency_p50_ms": _median(latency),
+                "latency_p99_ms": float(np.percentile(latency, 99)),
+                "overlap_perc": 100.0 * np.mean(active > 1),
+                "active_streams_mean": float(np.mean(active)),
+                "active_streams_max": int(np.max(active)),
+                "busy_perc": 100.0 * np.sum(segments[1] - segments[0]) / span,
+                "inflight_mean": float(np.sum(stoptime - starttime)) / span,
+                "solo_latency_ms": baseline,
+                "solo_baseline": source if np.isfinite(baseline) else "",
+                "contention_factor": _median(concurrent) / baseline if len(concurrent) > 0 else np.nan,
+            }
+            fps = float(stream.get("fps") or 0)
+            row["throughput_perc"] = 100.0 * row["throughput_fps"] / fps if fps > 0 else np.nan
+            run_rows.append(row)
+
+        starttime = np.concatenate([streams[num]["starttime"] for num in members])
+        stoptime = np.concatenate([streams[num]["stoptime"] for num in members])
+        span = max(1, run_stop - run_start)
+        latency = (stoptime - starttime) / NS_PER_MS
+        segments = busy_segments(starttime, stoptime)
+        factors = [row["contention_factor"] for row in run_rows if np.isfinite(row["contention_factor"])]
+        active = active_streams(first[members], last[members], starttime)
+        run_rows.append(
+            {
+                "run": run,
+                "stream": "all",
+                "frames": len(starttime),
+                "start_sec": 0.0,
+                "duration_sec": span / NS_PER_SEC,
+                "throughput_fps": len(starttime) * NS_PER_SEC / span,
+                "latency_p50_ms": _median(latency),
+                "latency_p99_ms": float(np.percentile(latency, 99)),
+                "overlap_perc": 100.0 * np.mean(active > 1),
+                "active_streams_mean": float(np.mean(active)),
+                "active_streams_max": int(np.max(active)),
+                "busy_perc": 100.0 * np.sum(segments[1] - segments[0]) / span,
+                "inflight_mean": float(np.sum(stoptime - starttime)) / span,
+                "contention_factor": float(np.mean(factors)) if factors else np.nan,
+            }
+        )
+        rows += run_rows
+
+    columns = [
+        "run", "stream", "codec", "height", "fps", "frames", "start_sec", "duration_sec", "throughput_fps",
+        "throughput_perc", "latency_p50_ms", "latency_p99_ms", "overlap_perc", "active_streams_mean",
+        "active_streams_max", "busy_perc", "inflight_mean", "solo_latency_ms", "solo_baseline", "contention_factor",
+    ]
+    return pd.DataFrame(rows, columns=columns)
+
+
+def timeline(streams: List[Dict], bin_sec: float = 1.0) -> pd.DataFrame:
+    """Throughput and load of the streams of every run over time
+
+    Args:
+        streams (list): Streams, as for concurrency_table()
+        bin_sec (float): Time bin length
+
+    Returns:
+        One row per run, stream (and "all") and time bin: time_sec (bin
+        start from the run start), active_streams (at the bin middle),
+        fps (frames stopped in the bin per second), inflight (mean frames
+        in flight) and busy_perc (time with frames in flight, for "all"
+        the encoder utilization).
+    """
+    streams = [stream for stream in streams if len(stream["starttime"]) > 0]
+    if len(streams) == 0:
+        return pd.DataFrame()
+    first = np.array([stream["starttime"].min() for stream in streams])
+    last = np.array([stream["stoptime"].max() for stream in streams])
+    runs = group_runs(first, last)
+    bin_ns = int(bin_sec * NS_PER_SEC)
+
+    tables = []
+    for run in range(runs.max() + 1):
+        members = np.flatnonzero(runs == run)
+        run_start = first[members].min()
+        edges = np.arange(run_start, last[members].max() + bin_ns, bin_ns, dtype=np.int64)
+        if len(edges) < 2:
+            edges = np.array([run_start, run_start + bin_ns])
+        active = active_streams(first[members], last[members], edges[:-1] + bin_ns // 2)
+        parts = [(streams[num]["stream"], streams[num]["starttime"], streams[num]["stoptime"]) for num in members]
+        parts.append(
+            (
+                "all",
+                np.concatenate([streams[num]["starttime"] for num in members]),
+                np.concatenate([streams[num]["stoptime"] for num in members]),
+            )
+        )
+        for name, starttime, stoptime in parts:
+            busy = covered_time(*busy_segments(starttime, stoptime), edges)
+            tables.append(
+                pd.DataFrame(
+                    {
+                        "run": run,
+                        "stream": name,
+                        "time_sec": (edges[:-1] - run_start) / NS_PER_SEC,
+                        "active_streams": active,
+                        "fps": np.histogram(stoptime, bins=edges)[0] / bin_sec,
+                        "inflight": np.diff(inflight_time(starttime, stoptime, edges)) / bin_ns,
+                        "busy_perc": 100.0 * np.diff(busy) / bin_ns,
+                    }
+                )
+            )
+    return pd.concat(tables, ignore_index=True)
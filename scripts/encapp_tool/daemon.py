@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+import contextlib
+import copy
+import importlib
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+from typing import Callable, Dict, List, Optional, Union
+
+# socket path of a running daemon, the command line tools forward to it
+DAEMON_ENV = "ENCAPP_DAEMON"
+# tool name: module with a main(argv)
+TOOLS = {
+    "run": "encapp",
+    "search": "encapp_search",
+    "quality": "encapp_quality",
+    "verify": "encapp_verify",
+}
+# environment of the client that the tools read
+FORWARDED_ENV_PREFIXES = ("ANDROID_", "ENCAPP_")
+# module globals the tools change while running, restored after each request
+TOOL_STATE = ("extra_settings", "DEBUG", "ERROR_LIMIT")
+# how long the adb device list is reused in the daemon (seconds)
+DEVICE_LIST_TTL = 10
+
+
+def _send(sock: socket.socket, message: Dict) -> None:
+    sock.sendall((json.dumps(message) + "\n").encode())
+
+
+def forward_to_daemon(tool: str, argv: List[str]) -> None:
+    """Run a command line tool in the daemon, if there is one
+
+    Exits with the exit code of the tool when the daemon handled it,
+    returns if no daemon is configured (ENCAPP_DAEMON) or reachable.
+
+    Args:
+        tool (str): Tool name (see TOOLS)
+        argv (list): Command line, argv[0] is the program name
+    """
+    path = os.environ.get(DAEMON_ENV)
+    if not path:
+        return
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return
+    env = {
+        key: val
+        for key, val in os.environ.items()
+        if key.startswith(FORWARDED_ENV_PREFIXES) and key != DAEMON_ENV
+    }
+    with sock:
+        _send(sock, {"tool": tool, "argv": argv, "cwd": os.getcwd(), "env": env})
+        for line in sock.makefile("r"):
+            message = json.loads(line)
+            if "exit" in message:
+                sys.exit(message["exit"])
+            stream = sys.stdout if message["stream"] == "stdout" else sys.stderr
+            stream.write(message["data"])
+            stream.flush()
+    print("error: lost the connection to the encapp daemon", file=sys.stderr)
+    sys.exit(1)
+
+
+def request_daemon(path: str, tool: str) -> Optional[Dict]:
+    """Send a control request ("ping" or "shutdown") to a daemon
+
+    Args:
+        path (str): Daemon socket
+        tool (str): "ping" or "shutdown"
+
+    Returns:
+        Reply, None if the daemon is not running.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    with sock:
+        _send(sock, {"tool": tool})
+        line = sock.makefile("r").readline()
+    return json.loads(line) if line else None
+
+
+class _StreamWriter(io.TextIOBase):
+    # file object sending everything written to the client
+    def __init__(self, sock: socket.socket, name: str):
+        self.sock = sock
+        self.name = name
+
+    def write(self, data: str) -> int:
+        if data:
+            _send(self.sock, {"stream": self.name, "data": data})
+        return len(data)
+
+
+def _exit_code(exc: SystemExit) -> int:
+    if exc.code is None:
+        return 0
+    if isinstance(exc.code, int):
+        return exc.code
+    print(exc.code, file=sys.stderr)
+    return 1
+
+
+class EncappDaemon:
+    """Runs the command line tools in one long-lived process
+
+    The tool modules stay imported, and so do their in-process caches
+    (search index, parsed nal data, adb device list). Requests are run
+    one at a time since the tools share process state (cwd, environment,
+    stdout and module globals), so a long request, e.g. an encapp.py
+    run, holds up the ones after it.
+    """
+
+    def __init__(self, path: str, tools: Optional[Dict[str, Union[str, Callable]]] = None):
+        self.path = path
+        self.tools = dict(TOOLS if tools is None else tools)
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.requests = 0
+        self.server = None
+        # module name: {global name: initial value}
+        self._state = {}
+
+    def preload(self) -> None:
+        """Import all the tools up front, so that no request pays for it"""
+        for tool in self.tools:
+            self._main(tool)
+        self._reset()
+
+    def _main(self, tool: str) -> Callable:
+        target = self.tools[tool]
+        if callable(target):
+            return target
+        module = importlib.import_module(target)
+        if target not in self._state:
+            self._state[target] = {
+                name: copy.deepcopy(getattr(module, name))
+                for name in TOOL_STATE
+                if hasattr(module, name)
+            }
+        return module.main
+
+    def _reset(self) -> None:
+        # undo what a tool run may have left in the module globals
+        if "encapp_tool.adb_cmds" in sys.modules:
+            adb_cmds = sys.modules["encapp_tool.adb_cmds"]
+            adb_cmds.set_adb_backend(None)
+            adb_cmds.DEVICE_LIST_TTL = DEVICE_LIST_TTL
+        if "encapp_tool.trace" in sys.modules:
+            # spans and context (test, serial) of the previous run
+            sys.modules["encapp_tool.trace"].TRACER.reset()
+        for target, state in self._state.items():
+            module = sys.modules[target]
+            for name, value in state.items():
+                value = copy.deepcopy(value)
+                current = getattr(module, name)
+                if isinstance(current, dict):
+                    # update in place, other modules may hold a reference
+                    current.clear()
+                    current.update(value)
+                else:
+                    setattr(module, name, value)
+
+    def run_tool(self, request: Dict, sock: socket.socket) -> int:
+        """Run a tool request, streaming its output to the client
+
+        Args:
+            request (dict): tool, argv, cwd and env of the client
+            sock (socket): Client connection
+
+        Returns:
+            Exit code of the tool.
+        """
+        stdout = _StreamWriter(sock, "stdout")
+        stderr = _StreamWriter(sock, "stderr")
+        with self.lock:
+            self.requests += 1
+            cwd = os.getcwd()
+            env = dict(os.environ)
+            argv = sys.argv
+            try:
+                main = self._main(request["tool"])
+                # argparse takes the program name from sys.argv
+                sys.argv = request["argv"]
+                os.chdir(request.get("cwd", cwd))
+                # the client env replaces the one the daemon started with
+                for key in [key for key in os.environ if key.startswith(FORWARDED_ENV_PREFIXES)]:
+                    del os.environ[key]
+                os.environ.update(request.get("env", {}))
+                with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                    try:
+                        main(request["argv"])
+                        ret = 0
+                    except SystemExit as exc:
+                        ret = _exit_code(exc)
+                    except AssertionError as exc:
+                        print(exc, file=sys.stderr)
+                        ret = 1
+                    except Exception:
+                        traceback.print_exc()
+                        ret = 1
+            finally:
+                sys.argv = argv
+                os.chdir(cwd)
+                os.environ.clear()
+                os.environ.update(env)
+                self._reset()
+        return ret
+
+    def handle(self, sock: socket.socket) -> None:
+        line = sock.makefile("r").readline()
+        if not line:
+            return
+        request = json.loads(line)
+        tool = request.get("tool")
+        if tool == "ping":
+            _send(
+                sock,
+                {
+                    "pid": os.getpid(),
+                    "uptime": time.time() - self.started,
+                    "requests": self.requests,
+                    "tools": sorted(self.tools),
+                },
+            )
+        elif tool == "shutdown":
+            _send(sock, {"exit": 0})
+            threading.Thread(target=self.server.shutdown).start()
+        elif tool in self.tools:
+            _send(sock, {"exit": self.run_tool(request, sock)})
+        else:
+            _send(sock, {"stream": "stderr", "data": f"error: unknown tool {tool}\n"})
+            _send(sock, {"exit": 1})
+
+    def serve_forever(self) -> None:
+        """Listen on the socket until a shutdown request"""
+        if os.path.exists(self.path):
+            if request_daemon(self.path, "ping") is not None:
+                raise RuntimeError(f"a daemon is already running at {self.path}")
+            # left behind by a daemon that did not exit cleanly
+            os.remove(self.path)
+        daemon = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                try:
+                    daemon.handle(self.request)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        self.server = socketserver.ThreadingUnixStreamServer(self.path, Handler)
+        self.server.daemon_threads = True
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+import json
+import os
+import shlex
+import shutil
+import time
+from typing import Dict, List, Optional, Tuple
+
+from encapp_tool.app_utils import APPNAME_MAIN
+from encapp_tool.synthetic import DEFAULT_FRAME_COUNT, synthesize_result
+
+DEFAULT_SERIAL = "emulated0001"
+DEFAULT_MODEL = "emulator"
+DEVICE_LOCATION = "/sdcard/"
+# reported by df, the emulated device never really fills up
+DEFAULT_CAPACITY = 64 * 1024 * 1024 * 1024
+
+EMULATED_CODECS = (
+    ("OMX.google.h264.encoder", "video/avc", True),
+    ("c2.android.avc.encoder", "video/avc", True),
+    ("c2.android.hevc.encoder", "video/hevc", True),
+    ("c2.android.vp9.encoder", "video/x-vnd.on2.vp9", True),
+    ("c2.android.avc.decoder", "video/avc", False),
+    ("c2.android.hevc.decoder", "video/hevc", False),
+)
+
+
+class EmulatedDevice:
+    """Stand-in for adb and an android device running encapp
+
+    Implements the adb commands used by encapp_tool and the encapp
+    scripts against a local directory acting as /sdcard/. Starting a
+    test makes the "app" run for a while and then leave synthetic
+    encapp_*.json results and encoded files behind, like the real app
+    does. Use it with adb_cmds.set_adb_backend() to run the host-side
+    pipeline without a phone, e.g. for benchmarks.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        tests_class,
+        serial: str = DEFAULT_SERIAL,
+        model: str = DEFAULT_MODEL,
+        latency: float = 0.0,
+        bandwidth: float = 0.0,
+        frame_time: float = 0.0,
+        frame_count: Optional[int] = None,
+        capacity: int = DEFAULT_CAPACITY,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            root (str): Host directory holding the emulated /sdcard/
+            tests_class: Tests protobuf message class, to read .run.bin files
+            serial (str): Serial no. reported by adb devices
+            model (str): Model reported by adb devices
+            latency (float): Seconds added to every adb command
+            bandwidth (float): push/pull speed in bytes/s, 0 for unlimited
+            frame_time (float): Seconds the app spends per encoded frame
+            frame_count (int): Frames per test, overrides the definition
+            capacity (int): Storage size in bytes reported by df
+            seed (int): Random seed for the synthetic results
+        """
+        self.root = root
+        self.sdcard = os.path.join(root, "sdcard")
+        os.makedirs(self.sdcard, exist_ok=True)
+        self.tests_class = tests_class
+        self.serial = serial
+        self.model = model
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.frame_time = frame_time
+        self.frame_count = frame_count
+        self.capacity = capacity
+        self.seed = seed
+        self.packages = [APPNAME_MAIN]
+        self.props = {
+            "ro.product.model": model,
+            "ro.build.fingerprint": f"emulated/{model}/{model}:12/EMU1/1:user/release-keys",
+        }
+        self.commands = []
+        self._app = None
+        self._pid = 1000
+        self._runs = 0
+
+    def run(self, cmd: str) -> Tuple[bool, str, str]:
+        """Run an adb command (same contract as adb_cmds.run_cmd())"""
+        self.commands.append(cmd)
+        if self.latency > 0:
+            time.sleep(self.latency)
+        self._settle()
+        args = shlex.split(cmd)[1:]
+        if args[:1] == ["devices"]:
+            return True, self._devices(), ""
+        if args[:1] == ["-s"]:
+            if args[1] != self.serial:
+                return False, "", f"error: device '{args[1]}' not found"
+            args = args[2:]
+        if not args:
+            return False, "", "error: no command"
+        if args[0] == "push":
+            return self._transfer(args[-2], self._device_path(args[-1]))
+        if args[0] == "pull":
+            return self._transfer(self._device_path(args[-2]), args[-1])
+        if args[0] == "install":
+            if APPNAME_MAIN not in self.packages:
+                self.packages.append(APPNAME_MAIN)
+            return True, "Success\n", ""
+        if args[0] == "uninstall":
+            if args[-1] in self.packages:
+                self.packages.remove(args[-1])
+            return True, "Success\n", ""
+        if args[0] == "shell":
+            return self._shell(args[1:])
+        return False, "", f"emulated adb: unsupported command: {cmd}"
+
+    def _devices(self) -> str:
+        return (
+            "List of devices attached\n"
+            f"{self.serial}       device product:{self.model} "
+            f"model:{self.model} device:{self.model} transport_id:1\n"
+        )
+
+    def _device_path(self, path: str) -> str:
+        if not path.startswith(DEVICE_LOCATION):
+            raise ValueError(f"emulated adb: path outside {DEVICE_LOCATION}: {path}")
+        return os.path.join(self.sdcard, path[len(DEVICE_LOCATION) :])
+
+    def _transfer(self, src: str, dst: str) -> Tuple[bool, str, str]:
+        if not os.path.exists(src):
+            return False, "", f"adb: error: '{src}' does not exist"
+        if os.path.isdir(dst):
+            dst = os.path.join(dst, os.path.basename(src))
+        shutil.copyfile(src, dst)
+        size = os.path.getsize(dst)
+        if self.bandwidth > 0:
+            time.sleep(size / self.bandwidth)
+        return True, f"1 file pushed. {size} bytes\n", ""
+
+    def _shell(self, args: List[str]) -> Tuple[bool, str, str]:
+        if args[0] == "ls":
+            return self._ls(args[1:])
+        if args[0] == "rm":
+            path = self._device_path(args[-1])
+            if not os.path.exists(path):
+                return False, "", f"rm: {args[-1]}: No such file or directory"
+            os.remove(path)
+            return True, "", ""
+        if args[0] == "pidof":
+            if self._app is not None and args[1] == APPNAME_MAIN:
+                return True, f"{self._app['pid']}\n", ""
+            return False, "", ""
+        if args[0] == "df":
+            used = sum(
+                os.path.getsize(os.path.join(self.sdcard, name))
+                for name in os.listdir(self.sdcard)
+            )
+            return True, self._df(used), ""
+        if args[0] == "getprop":
+            if len(args) > 1:
+                return True, self.props.get(args[1], "") + "\n", ""
+            return True, "".join(f"[{k}]: [{v}]\n" for k, v in self.props.items()), ""
+        if args[:2] == ["pm", "list"]:
+            return True, "".join(f"package:{name}\n" for name in self.packages), ""
+        if args[:2] in (["pm", "grant"], ["appops", "set"]):
+            return True, "", ""
+        if args[:2] == ["am", "force-stop"]:
+            self._app = None
+            return True, "", ""
+        if args[:2] == ["am", "start"]:
+            return self._am_start(args[2:])
+        return False, "", f"emulated adb: unsupported shell command: {args}"
+
+    def _ls(self, args: List[str]) -> Tuple[bool, str, str]:
+        names = sorted(os.listdir(self.sdcard))
+        if "-l" not in args:
+            return True, "".join(f"{name}\n" for name in names), ""
+        lines = [f"total {len(names)}"]
+        for name in names:
+            stat = os.stat(os.path.join(self.sdcard, name))
+            date = time.strftime("%Y-%m-%d %H:%M", time.localtime(stat.st_mtime))
+            lines.append(f"-rw-rw---- 1 root sdcard_rw {stat.st_size} {date} {name}")
+        return True, "\n".join(lines) + "\n", ""
+
+    def _df(self, used: int) -> str:
+        total = self.capacity // 1024
+        used = used // 1024
+        return (
+            "Filesystem     1K-blocks     Used Available Use% Mounted on\n"
+            f"/dev/fuse      {total} {used} {total - used} "
+            f"{100 * used // total}% /storage/emulated\n"
+        )
+
+    def _am_start(self, args: List[str]) -> Tuple[bool, str, str]:
+        extras = {}
+        for index, arg in enumerate(args[:-1]):
+            if arg == "-e" and index + 2 < len(args):
+                extras[args[index + 1]] = args[index + 2]
+        if self._app is not None:
+            return True, "Warning: Activity not started, its current task has been brought to the front\n", ""
+        self._pid += 1
+        if "list_codecs" in extras:
+            self._app = {"pid": self._pid, "end": time.monotonic(), "codecs": True}
+            return True, "Status: ok\n", ""
+        if "test" not in extras:
+            return True, "Status: ok\n", ""
+        path = self._device_path(extras["test"])
+        if not os.path.exists(path):
+            # the app exits on a missing test definition
+            return True, "Status: ok\n", ""
+        tests = self.tests_class()
+        with open(path, "rb") as fd:
+            tests.ParseFromString(fd.read())
+        frames = [self._frame_count(test) for test in self._flatten(tests.test)]
+        self._app = {
+            "pid": self._pid,
+            "end": time.monotonic() + self.frame_time * sum(frames),
+            "tests": tests,
+        }
+        return True, "Status: ok\n", ""
+
+    def _flatten(self, tests) -> List:
+        # parallel tests run in the same app and write their own results
+        flat = []
+        for test in tests:
+            flat.append(test)
+            flat += self._flatten(test.parallel.test)
+        return flat
+
+    def _frame_count(self, test) -> int:
+        if self.frame_count is not None:
+            return self.frame_count
+        if test.input.playout_frames > 0:
+            return test.input.playout_frames
+        fps = test.input.framerate or test.configure.framerate or 30
+        if test.input.stoptime_sec > 0:
+            return int(test.input.stoptime_sec * fps)
+        name = os.path.basename(test.input.filepath)
+        source = os.path.join(self.sdcard, name)
+        if test.input.resolution and os.path.exists(source):
+            width, height = (int(val) for val in test.input.resolution.split("x"))
+            # yuv420p and nv12 both use 1.5 bytes per pixel
+            return max(1, int(os.path.getsize(source) / (width * height * 1.5)))
+        return DEFAULT_FRAME_COUNT
+
+    def _settle(self) -> None:
+        # the app exits (leaving its outputs) once its run time is over
+        if self._app is None or time.monotonic() < self._app["end"]:
+            return
+        app = self._app
+        self._app = None
+        if app.get("codecs"):
+            with open(os.path.join(self.sdcard, "codecs.txt"), "w") as fd:
+                fd.write(codecs_text())
+            return
+        for test in self._flatten(app["tests"].test):
+            self.write_result(test, self._frame_count(test))
+
+    def write_result(self, test, frame_count: int) -> Dict:
+        """Write the outputs of one test to the emulated /sdcard/
+
+        Args:
+            test (tests_pb2.Test): Test that ran
+            frame_count (int): Number of encoded frames
+
+        Returns:
+            The result dict written as encapp_<id>.json
+        """
+        self._runs += 1
+        result, size = synthesize_result(
+            test, frame_count, seed=self.seed * 1000003 + self._runs
+        )
+        with open(os.path.join(self.sdcard, result["encodedfile"]), "wb") as fd:
+            # contents are never looked at, only the size matters
+            fd.truncate(size)
+        with open(os.path.join(self.sdcard, f"{result['id']}.json"), "w") as fd:
+            json.dump(result, fd, indent=4)
+        return result
+
+
+def codecs_text() -> str:
+    """Get a codecs.txt list in the format written by the app"""
+    sections = {True: ["encoders {\n"], False: ["decoders {\n"]}
+    for name, mime, encoder in EMULATED_CODECS:
+        sections[encoder].append(
+            "  MediaCodec {\n"
+            f"    name: {name}\n"
+            f"    is_encoder: {'true' if encoder else 'false'}\n"
+            "    media_type {\n"
+            f"      media_type: {mime}\n"
+            f"      mime_type: {mime}\n"
+            "      max_supported_instances: 32\n"
+            "      color_formats {\n"
+            "        color {\n"
+            "          format: 2135033992\n"
+            "          name: COLOR_FormatYUV420Flexible\n"
+            "        }\n"
+            "      }\n"
+            "      profile_levels {\n"
+            "        profile_level {\n"
+            "          profile: 1\n"
+            "          level: 2048\n"
+            "        }\n"
+            "      }\n"
+            "      video_capabilities {\n"
+            "        bitrate_range: [1, 40000000]\n"
+            "        height_alignment: 2\n"
+            "        width_alignment: 2\n"
+            "        supported_frame_rates: [0, 960]\n"
+            "        supported_heights: [2, 2160]\n"
+            "        supported_widths: [2, 3840]\n"
+            "      }\n"
+            "    }\n"
+            "  }\n"
+        )
+    return "".join(sections[True]) + "}\n" + "".join(sections[False]) + "}\n"
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+NS_PER_MS = 1000000
+US_PER_MS = 1000
+
+
+def _next_diff(values: np.ndarray) -> np.ndarray:
+    # difference to the next value, nan for the last one
+    diff = np.full(len(values), np.nan)
+    diff[:-1] = values[1:] - values[:-1]
+    return diff
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Mean of every window of values (ending at each value)
+
+    Args:
+        values (np.ndarray): Values
+        window (int): Number of values in a window
+
+    Returns:
+        Means, nan for the first window - 1 values and for windows with
+        non finite values.
+    """
+    window = max(1, window)
+    means = np.full(len(values), np.nan)
+    if len(values) < window:
+        return means
+    finite = np.isfinite(values)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(finite, values, 0.0))))
+    bad = np.concatenate(([0], np.cumsum(~finite)))
+    window_sums = sums[window:] - sums[:-window]
+    window_bad = bad[window:] - bad[:-window]
+    means[window - 1:] = np.where(window_bad == 0, window_sums / window, np.nan)
+    return means
+
+
+def frame_times(frames: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the processing times of the valid frames of a result
+
+    Args:
+        frames (list): Result frames ("frames" or "decoded_frames")
+
+    Returns:
+        (start times, stop times) in ns, in frame order, of the frames
+        with a processing time and a start time, not stopping before it.
+    """
+    count = len(frames)
+    starttime = np.fromiter((frame.get("starttime", 0) for frame in frames), dtype=np.int64, count=count)
+    stoptime = np.fromiter((frame.get("stoptime", 0) for frame in frames), dtype=np.int64, count=count)
+    proctime = np.fromiter((frame.get("proctime", -1) for frame in frames), dtype=np.int64, count=count)
+    valid = (proctime >= 0) & (starttime > 0) & (stoptime >= starttime)
+    return starttime[valid], stoptime[valid]
+
+
+def inflight(starttime: np.ndarray, stoptime: np.ndarray) -> np.ndarray:
+    """Count the frames being processed during each frame
+
+    Args:
+        starttime (np.ndarray): Frame start times
+        stoptime (np.ndarray): Frame stop times (not before the start)
+
+    Returns:
+        For each frame, the number of frames (itself included) that
+        started before it stopped and stopped after it started.
+    """
+    starts = np.sort(starttime)
+    stops = np.sort(stoptime)
+    # started before the stop, minus the ones done before the start
+    return np.searchsorted(starts, stoptime, side="left") - np.searchsorted(stops, starttime, side="right")
+
+
+def frame_metrics(
+    pts: np.ndarray,
+    starttime: np.ndarray,
+    stoptime: np.ndarray,
+    proctime: np.ndarray,
+    size: Optional[np.ndarray] = None,
+    window: int = 30,
+    drop_invalid: bool = True,
+) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Compute the derived per frame metrics of an encoding or decoding
+
+    A frame is invalid when it has a negative processing time, no start
+    time, or no duration (the last frame, or a pts before the previous
+    one). Invalid frames take no part in the relative times, averages
+    and rolling windows.
+
+    Args:
+        pts (np.ndarray): Presentation times (us)
+        starttime (np.ndarray): Processing start times (ns)
+        stoptime (np.ndarray): Processing stop times (ns)
+        proctime (np.ndarray): Processing times (ns)
+        size (np.ndarray): Frame sizes in bytes, to get the bitrates
+        window (int): Frames in the rolling fps windows
+        drop_invalid (bool): Return the metrics of the valid frames only,
+                             instead of nan for the invalid ones
+
+    Returns:
+        (valid frame mask, metrics by column name): duration_ms, fps,
+        stop-stop_ms, proc_fps, rel_start_ms, rel_stop_ms,
+        start_pts_diff_ms, av_fps and av_proc_fps, and with size
+        bitrate_per_frame_bps and average_bitrate.
+    """
+    pts = np.asarray(pts, dtype=float)
+    starttime = np.asarray(starttime, dtype=float)
+    stoptime = np.asarray(stoptime, dtype=float)
+    duration_ms = np.round(_next_diff(pts) / US_PER_MS, 2)
+    stop_stop_ms = np.round(_next_diff(stoptime) / NS_PER_MS, 2)
+    with np.errstate(invalid="ignore"):
+        valid = (np.asarray(proctime) >= 0) & (starttime > 0) & (duration_ms >= 0)
+    keep = valid if drop_invalid else np.ones(len(pts), dtype=bool)
+
+    metrics = {}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        duration_ms = np.where(valid, duration_ms, np.nan)
+        stop_stop_ms = np.where(valid, stop_stop_ms, np.nan)
+        fps = np.round(1000.0 / duration_ms, 2)
+        proc_fps = np.round(1000.0 / stop_stop_ms, 2)
+        metrics["duration_ms"] = duration_ms[keep]
+        if size is not None:
+            bitrate = np.asarray(size, dtype=float) * 8.0 / (duration_ms / 1000.0)
+            finite = np.isfinite(bitrate)
+            metrics["bitrate_per_frame_bps"] = bitrate[keep]
+            average = np.mean(bitrate[finite]) if finite.any() else np.nan
+            metrics["average_bitrate"] = np.full(keep.sum(), average)
+    metrics["fps"] = fps[keep]
+    metrics["stop-stop_ms"] = stop_stop_ms[keep]
+    metrics["proc_fps"] = proc_fps[keep]
+
+    if valid.any():
+        first = np.argmax(valid)
+        rel_start_ms = np.round((starttime - starttime[first]) / NS_PER_MS, 2)
+        rel_stop_ms = np.round((stoptime - stoptime[first]) / NS_PER_MS, 2)
+    else:
+        rel_start_ms = rel_stop_ms = np.full(len(pts), np.nan)
+    metrics["rel_start_ms"] = rel_start_ms[keep]
+    metrics["rel_stop_ms"] = rel_stop_ms[keep]
+    metrics["start_pts_diff_ms"] = np.round(rel_start_ms - pts / US_PER_MS, 2)[keep]
+
+    # rolling windows over the valid frames, the frame value until the
+    # first window is full
+    for name, values in (("av_fps", fps), ("av_proc_fps", proc_fps)):
+        averages = np.full(len(pts), np.nan)
+        averages[valid] = rolling_mean(values[valid], window)
+        metrics[name] = np.where(np.isnan(averages), values, averages)[keep]
+    return valid, metrics
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+import contextlib
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional
+
+from encapp_tool.app_utils import CACHE_DIR
+
+DEFAULT_QUEUE_FILE = os.path.join(CACHE_DIR, "jobs.sqlite")
+DEFAULT_MAX_ATTEMPTS = 3
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELED = "canceled"
+JOB_STATES = (QUEUED, RUNNING, DONE, FAILED, CANCELED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    configfile TEXT NOT NULL,
+    output TEXT,
+    args TEXT NOT NULL DEFAULT '[]',
+    model TEXT,
+    codec TEXT,
+    priority INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL,
+    serial TEXT,
+    submitted REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job INTEGER NOT NULL REFERENCES jobs(id),
+    serial TEXT NOT NULL,
+    model TEXT,
+    started REAL NOT NULL,
+    finished REAL,
+    exitcode INTEGER,
+    device_ok INTEGER,
+    log TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state, priority, id);
+"""
+
+
+def codec_matches(codec: str, codecs: Iterable[str]) -> bool:
+    """Check whether a device offers a codec
+
+    Args:
+        codec (str): Codec name or media type, e.g. "c2.android.avc.encoder"
+                     or "video/avc"
+        codecs (iterable): Codec names and media types of the device
+
+    Returns:
+        True if the codec is available.
+    """
+    codec = codec.lower()
+    return any(codec == name.lower() for name in codecs)
+
+
+class JobQueue:
+    """Persistent queue of encapp runs waiting for a device
+
+    Jobs are test definitions with optional device constraints (model
+    and a codec the device must offer). Schedulers claim jobs for free
+    devices, and every attempt is recorded with its device and timings.
+    The queue is a sqlite file, so several processes can submit and
+    schedule at the same time.
+    """
+
+    def __init__(self, path: str = DEFAULT_QUEUE_FILE):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # one connection per operation: workers run in their own threads
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        with self._connect() as db:
+            # take the write lock up front, so two schedulers never claim
+            # the same job
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def submit(
+        self,
+        configfile: str,
+        output: Optional[str] = None,
+        args: Optional[List[str]] = None,
+        model: Optional[str] = None,
+        codec: Optional[str] = None,
+        priority: int = 0,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ) -> int:
+        """Add a job to the queue
+
+        Args:
+            configfile (str): Test definition (path as seen by the scheduler)
+            output (str): Output dir of the run, None for the encapp default
+            args (list): Extra encapp.py run arguments
+            model (str): Only run on devices of this model
+            codec (str): Only run on devices offering this codec
+            priority (int): Higher priority jobs are claimed first
+            max_attempts (int): Attempts before the job is marked failed
+
+        Returns:
+            Job id.
+        """
+        with self._transaction() as db:
+            cursor = db.execute(
+                "INSERT INTO jobs (configfile, output, args, model, codec, "
+                "priority, max_attempts, state, submitted) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    configfile,
+                    output,
+                    json.dumps(args or []),
+                    model,
+                    codec,
+                    priority,
+                    max_attempts,
+                    QUEUED,
+                    time.time(),
+                ),
+            )
+            return cursor.lastrowid
+
+    def _runnable(self, db, model: str, codecs: Iterable[str]) -> List[sqlite3.Row]:
+        rows = db.execute(
+            "SELECT * FROM jobs WHERE state = ? ORDER BY priority DESC, id",
+            (QUEUED,),
+        ).fetchall()
+        codecs = list(codecs)
+        return [
+            row
+            for row in rows
+            if (row["model"] is None or row["model"] == model)
+            and (row["codec"] is None or codec_matches(row["codec"], codecs))
+        ]
+
+    def claim(self, serial: str, model: str, codecs: Iterable[str]) -> Optional[Dict]:
+        """Take the next job a device can run
+
+        Jobs that already failed on this device are only given to it when
+        no other queued job fits.
+
+        Args:
+            serial (str): Android device serial no.
+            model (str): Device model
+            codecs (iterable): Codec names and media types of the device
+
+        Returns:
+            Job (with the id of the new attempt in "attempt"), None if
+            no queued job fits the device.
+        """
+        with self._transaction() as db:
+            rows = self._runnable(db, model, codecs)
+            if not rows:
+                return None
+            failed_here = {
+                row["job"]
+                for row in db.execute(
+                    "SELECT job FROM attempts WHERE serial = ? AND device_ok = 0",
+                    (serial,),
+                )
+            }
+            fresh = [row for row in rows if row["id"] not in failed_here]
+            row = (fresh or rows)[0]
+            now = time.time()
+            db.execute(
+                "UPDATE jobs SET state = ?, serial = ?, attempts = attempts + 1, "
+                "started = COALESCE(started, ?) WHERE id = ?",
+                (RUNNING, serial, now, row["id"]),
+            )
+            cursor = db.execute(
+                "INSERT INTO attempts (job, serial, model, started) VALUES (?, ?, ?, ?)",
+                (row["id"], serial, model, now),
+            )
+            job = self._job(db, row["id"])
+            job["attempt"] = cursor.lastrowid
+            return job
+
+    def has_runnable(self, model: str, codecs: Iterable[str]) -> bool:
+        """Check whether a queued job fits a device
+
+        Args:
+            model (str): Device model
+            codecs (iterable): Codec names and media types of the device
+        """
+        with self._connect() as db:
+            return len(self._runnable(db, model, codecs)) > 0
+
+    def finish(
+        self,
+        job: Dict,
+        exitcode: int,
+        device_ok: bool = True,
+        log: Optional[str] = None,
+        error: Optional[str] = None,
+    ) -> str:
+        """Record the end of an attempt
+
+        A job whose device failed goes back to the queue until it has
+        used up its attempts. Other failures (e.g. a test the codec does
+        not support) would fail again, so the job fails right away.
+
+        Args:
+            job (dict): Job returned by claim()
+            exitcode (int): Exit code of the run, 0 if it succeeded
+            device_ok (bool): False if the device failed (e.g. went offline)
+            log (str): Log file of the attempt
+            error (str): Reason of the failure
+
+        Returns:
+            New state of the job.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE attempts SET finished = ?, exitcode = ?, device_ok = ?, "
+                "log = ? WHERE id = ?",
+                (now, exitcode, int(device_ok), log, job["attempt"]),
+            )
+            current = self._job(db, job["id"])
+            if current["state"] != RUNNING:
+                # canceled while running
+                return current["state"]
+            if exitcode == 0:
+                state = DONE
+            elif not device_ok and current["attempts"] < current["max_attempts"]:
+                state = QUEUED
+            else:
+                state = FAILED
+            db.execute(
+                "UPDATE jobs SET state = ?, finished = ?, error = ? WHERE id = ?",
+                (state, now if state != QUEUED else None, error, job["id"]),
+            )
+            return state
+
+    def cancel(self, job_id: int) -> bool:
+        """Remove a queued or running job from the queue
+
+        Returns:
+            False if the job has already ended.
+        """
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET state = ?, finished = ? WHERE id = ? AND state IN (?, ?)",
+                (CANCELED, time.time(), job_id, QUEUED, RUNNING),
+            )
+            return cursor.rowcount > 0
+
+    def retry(self, job_id: int) -> bool:
+        """Queue an ended job again, with a fresh set of attempts
+
+        Returns:
+            False if the job is still queued or running.
+        """
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET state = ?, attempts = 0, finished = NULL, error = NULL "
+                "WHERE id = ? AND state IN (?, ?, ?)",
+                (QUEUED, job_id, DONE, FAILED, CANCELED),
+            )
+            return cursor.rowcount > 0
+
+    def recover(self, serials: Optional[Iterable[str]] = None) -> int:
+        """Queue again the jobs left running by a scheduler that died
+
+        Args:
+            serials (iterable): Only recover jobs of these devices, None
+                                for all
+
+        Returns:
+            Number of recovered jobs.
+        """
+        with self._transaction() as db:
+            rows = db.execute("SELECT id, serial FROM jobs WHERE state = ?", (RUNNING,)).fetchall()
+            ids = [row["id"] for row in rows if serials is None or row["serial"] in serials]
+            for job_id in ids:
+                # the attempt was cut short, it does not count against the job
+                db.execute(
+                    "UPDATE attempts SET finished = ?, device_ok = 0 "
+                    "WHERE job = ? AND finished IS NULL",
+                    (time.time(), job_id),
+                )
+                db.execute(
+                    "UPDATE jobs SET state = ?, attempts = MAX(attempts - 1, 0) WHERE id = ?",
+                    (QUEUED, job_id),
+                )
+            return len(ids)
+
+    def _job(self, db, job_id: int) -> Dict:
+        row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        job = dict(row)
+        job["args"] = json.loads(job["args"])
+        return job
+
+    def job(self, job_id: int) -> Optional[Dict]:
+        """Get a job by id, None if there is no such job"""
+        with self._connect() as db:
+            if db.execute("SELECT id FROM jobs WHERE id = ?", (job_id,)).fetchone() is None:
+                return None
+            return self._job(db, job_id)
+
+    def jobs(self, state: Optional[str] = None) -> List[Dict]:
+        """Get all the jobs, oldest first
+
+        Args:
+            state (str): Only jobs in this state
+        """
+        with self._connect() as db:
+            if state is None:
+                ids = db.execute("SELECT id FROM jobs ORDER BY id").fetchall()
+            else:
+                ids = db.execute("SELECT id FROM jobs WHERE state = ? ORDER BY id", (state,)).fetchall()
+            return [self._job(db, row["id"]) for row in ids]
+
+    def attempts(self, job_id: int) -> List[Dict]:
+        """Get the attempts of a job, oldest first"""
+        with self._connect() as db:
+            rows = db.execute("SELECT * FROM attempts WHERE job = ? ORDER BY id", (job_id,)).fetchall()
+            return [dict(row) for row in rows]
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+import json
+import os
+import time
+from typing import Dict, List, Set
+
+JOURNAL_FILE_NAME = ".encapp_journal"
+
+
+class RunJournal:
+    """Append-only record of the progress of a run in its workdir
+
+    Every completed test and every collected result file is written as
+    one json line as soon as it happens, so a run interrupted by a
+    device reboot or a host crash can be resumed later.
+    """
+
+    def __init__(self, workdir: str):
+        self.workdir = workdir
+        self.path = os.path.join(workdir, JOURNAL_FILE_NAME)
+        self._tests = {}
+        self._files = []
+        self.load()
+
+    def exists(self) -> bool:
+        """Check whether the journal has been written to disk"""
+        return os.path.exists(self.path)
+
+    def load(self) -> None:
+        """(Re)read the journal from the workdir
+
+        Lines that cannot be parsed (e.g. a partial last line after a
+        crash) are ignored.
+        """
+        self._tests = {}
+        self._files = []
+        if not self.exists():
+            return
+        with open(self.path, "r") as fd:
+            for line in fd:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self._apply(entry)
+
+    def _apply(self, entry: Dict) -> None:
+        if entry.get("event") == "test":
+            self._tests[entry["test"]] = entry.get("files", [])
+        elif entry.get("event") == "file":
+            self._files.append(entry["file"])
+
+    def _append(self, entry: Dict) -> None:
+        entry["time"] = time.time()
+        os.makedirs(self.workdir, exist_ok=True)
+        with open(self.path, "a") as fd:
+            fd.write(json.dumps(entry) + "\n")
+            fd.flush()
+            os.fsync(fd.fileno())
+        self._apply(entry)
+
+    def record_test(self, key: str, files: List[str]) -> None:
+        """Record that a test has completed
+
+        Args:
+            key (str): Test key (see sweep.test_key())
+            files (list): Host paths of the result files of the test
+        """
+        self._append({"event": "test", "test": key, "files": files})
+
+    def record_file(self, path: str) -> None:
+        """Record that a result file has been collected from the device
+
+        Args:
+            path (str): Host path of the collected file
+        """
+        self._append({"event": "file", "file": path})
+
+    def completed_tests(self) -> Set[str]:
+        """Get the keys of all the completed tests"""
+        return set(self._tests.keys())
+
+    def test_files(self) -> Dict[str, List[str]]:
+        """Get the result files of every completed test, by test key"""
+        return {key: list(files) for key, files in self._tests.items()}
+
+    def collected_files(self) -> List[str]:
+        """Get the host paths of all the collected files"""
+        return list(self._files)
+
+    def result_files(self) -> List[str]:
+        """Get the result files of all the completed tests"""
+        files = []
+        for test_files in self._tests.values():
+            files += test_files
+        return files
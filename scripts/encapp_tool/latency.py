@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+import math
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+# latency percentiles of the report
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+NS_PER_MS = 1000000
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with a relative error bound
+
+    Values are counted in logarithmic buckets (as in DDSketch), so any
+    quantile is estimated within relative_accuracy of a true value,
+    with memory growing with the log of the value range only. Sketches
+    of several runs merge into the sketch of all of them.
+    """
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._buckets = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, values) -> None:
+        """Add values (a number or an array); values <= 0 count as 0"""
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return
+        positive = values[values > 0]
+        self.zero_count += len(values) - len(positive)
+        if len(positive) > 0:
+            indexes = np.ceil(np.log(positive) / self._log_gamma).astype(np.int64)
+            for index, count in zip(*(array.tolist() for array in np.unique(indexes, return_counts=True))):
+                self._buckets[index] = self._buckets.get(index, 0) + count
+        self.count += len(values)
+        self.sum += float(np.sum(values))
+        self.min = min(self.min, float(np.min(values)))
+        self.max = max(self.max, float(np.max(values)))
+
+    def merge(self, other: "QuantileSketch") -> None:
+        """Add the values of another sketch (with the same accuracy)"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches of different accuracy")
+        for index, count in other._buckets.items():
+            self._buckets[index] = self._buckets.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile (0 <= q <= 1), nan without values"""
+        if self.count == 0:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return max(self.min, 0.0)
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen > rank:
+                value = 2 * self._gamma ** index / (self._gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else math.nan
+
+
+def _true_runs(mask: np.ndarray, carry: int) -> Tuple[int, int]:
+    # (longest run of True, length of the run at the end), the first run
+    # continuing carry values of the previous chunk
+    if not mask.any():
+        return 0, 0
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    starts, ends = edges[::2], edges[1::2]
+    lengths = ends - starts
+    if starts[0] == 0:
+        lengths[0] += carry
+    trailing = int(lengths[-1]) if ends[-1] == len(mask) else 0
+    return int(lengths.max()), trailing
+
+
+class StreamLatency:
+    """Latency, pacing and inflight statistics of one encoding stream
+
+    Frames are added in chunks, in frame order, so long runs never have
+    to be held in memory at once.
+    """
+
+    def __init__(
+        self,
+        deadline_ms: float,
+        interval_ms: Optional[float] = None,
+        relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+    ):
+        """
+        Args:
+            deadline_ms (float): Frames with a longer latency are late
+            interval_ms (float): Nominal time between frames, the pacing
+                                 jitter is the deviation from it (default
+                                 the deadline)
+            relative_accuracy (float): Accuracy of the quantiles
+        """
+        self.deadline_ms = deadline_ms
+        self.interval_ms = interval_ms if interval_ms is not None else deadline_ms
+        self.latency = QuantileSketch(relative_accuracy)
+        self.jitter = QuantileSketch(relative_accuracy)
+        self.late = 0
+        self.max_late_run = 0
+        self.inflight = {}
+        self._late_run = 0
+        self._last_stop = None
+
+    def add(self, starttime: Sequence[int], stoptime: Sequence[int], inflight: Optional[Sequence[int]] = None) -> None:
+        """Add a chunk of frames
+
+        Args:
+            starttime (list): Processing start times (ns)
+            stoptime (list): Processing stop times (ns)
+            inflight (list): Frames in flight during each frame
+        """
+        starttime = np.asarray(starttime, dtype=np.int64)
+        stoptime = np.asarray(stoptime, dtype=np.int64)
+        if len(starttime) == 0:
+            return
+        latency_ms = (stoptime - starttime) / NS_PER_MS
+        self.latency.add(latency_ms)
+
+        late = latency_ms > self.deadline_ms
+        self.late += int(late.sum())
+        longest, trailing = _true_runs(late, self._late_run)
+        self.max_late_run = max(self.max_late_run, longest)
+        self._late_run = trailing
+
+        stops = np.sort(stoptime)
+        if self._last_stop is not None:
+            stops = np.concatenate(([self._last_stop], stops))
+        self.jitter.add(np.abs(np.diff(stops) / NS_PER_MS - self.interval_ms))
+        self._last_stop = int(stops[-1])
+
+        if inflight is not None:
+            for depth, count in zip(*(array.tolist() for array in np.unique(inflight, return_counts=True))):
+                self.inflight[depth] = self.inflight.get(depth, 0) + count
+
+    def merge(self, other: "StreamLatency") -> None:
+        """Add the statistics of another stream (e.g. for all streams)"""
+        self.latency.merge(other.latency)
+        self.jitter.merge(other.jitter)
+        self.late += other.late
+        self.max_late_run = max(self.max_late_run, other.max_late_run)
+        for depth, count in other.inflight.items():
+            self.inflight[depth] = self.inflight.get(depth, 0) + count
+
+    def summary(self) -> Dict:
+        """Get the report values of the stream
+
+        Returns:
+            frames, latency_<percentile>_ms, latency_max_ms,
+            latency_mean_ms, late, late_perc, max_consecutive_late,
+            jitter_p50_ms, jitter_p99_ms and inflight_<depth> counts.
+        """
+        frames = self.latency.count
+        summary = {"frames": frames, "deadline_ms": self.deadline_ms}
+        for q in QUANTILES:
+            summary[f"latency_p{q * 100:g}_ms"] = self.latency.quantile(q)
+        summary["latency_max_ms"] = self.latency.max if frames else math.nan
+        summary["latency_mean_ms"] = self.latency.mean
+        summary["late"] = self.late
+        summary["late_perc"] = 100.0 * self.late / frames if frames else math.nan
+        summary["max_consecutive_late"] = self.max_late_run
+        summary["jitter_p50_ms"] = self.jitter.quantile(0.5)
+        summary["jitter_p99_ms"] = self.jitter.quantile(0.99)
+        for depth in sorted(self.inflight):
+            summary[f"inflight_{depth}"] = self.inflight[depth]
+        return summary
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import shlex
+from typing import Dict, Optional
+
+from encapp_tool.adb_cmds import run_cmd
+from encapp_tool.app_utils import CACHE_DIR
+
+PROBE_CMD = "ffprobe -v quiet -show_streams -show_format -of json"
+CACHE_VERSION = 1
+# parsed probes by absolute path: (size, mtime_ns, probe)
+_CACHE = {}
+
+
+def _cache_file(path: str) -> str:
+    digest = hashlib.sha1(path.encode()).hexdigest()
+    return os.path.join(CACHE_DIR, "probe", digest[:2], f"{digest}.json")
+
+
+def probe(path: str, debug: int = 0, use_cache: bool = True) -> Optional[Dict]:
+    """Get the ffprobe streams and format of a media file
+
+    ffprobe runs once per file version: the result is kept in memory and
+    in the cache dir, keyed on the path, size and mtime of the file.
+
+    Args:
+        path (str): Media file
+        debug (int): Debug level
+        use_cache (bool): Reuse earlier probes of the same file
+
+    Returns:
+        ffprobe json output ("streams" and "format"), None if the file
+        cannot be probed.
+    """
+    path = os.path.abspath(path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = [CACHE_VERSION, path, stat.st_size, stat.st_mtime_ns]
+    cache_file = _cache_file(path)
+    if use_cache:
+        cached = _CACHE.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        try:
+            with open(cache_file) as fd:
+                cached = json.load(fd)
+            if cached["key"] == key:
+                _CACHE[path] = (key, cached["probe"])
+                return cached["probe"]
+        except (OSError, ValueError, KeyError):
+            pass
+    ret, stdout, _ = run_cmd(f"{PROBE_CMD} {shlex.quote(path)}", debug)
+    if not ret:
+        return None
+    try:
+        info = json.loads(stdout)
+    except ValueError:
+        return None
+    info = {"streams": info.get("streams", []), "format": info.get("format", {})}
+    _CACHE[path] = (key, info)
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "w") as fd:
+        json.dump({"key": key, "probe": info}, fd)
+    os.replace(tmp_file, cache_file)
+    return info
+
+
+def video_stream(path: str, debug: int = 0) -> Optional[Dict]:
+    """Get the first video stream of a media file, None if there is none"""
+    info = probe(path, debug)
+    if info is None:
+        return None
+    for stream in info["streams"]:
+        if stream.get("codec_type") == "video":
+            return stream
+    return None
+
+
+def parse_rate(rate: str) -> Optional[float]:
+    """Parse an ffprobe frame rate, e.g. "30000/1001"
+
+    Returns:
+        Frames per second (an int if whole), None if unknown.
+    """
+    num, _, den = rate.partition("/")
+    try:
+        value = float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return int(value) if value.is_integer() else value
+
+
+def get_resolution(path: str, debug: int = 0) -> Optional[str]:
+    """Get the "WxH" resolution of a media file, None if unknown"""
+    stream = video_stream(path, debug)
+    if stream is None or "width" not in stream or "height" not in stream:
+        return None
+    return f"{stream['width']}x{stream['height']}"
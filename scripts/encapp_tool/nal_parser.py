@@ -0,0 +1,564 @@
+#!/usr/bin/env python3
+import json
+import mmap
+import os
+import re
+import struct
+from typing import Dict, Iterator, List, Optional, Tuple
+
+H264 = "h264"
+H265 = "h265"
+
+# h264 nal unit types
+H264_SLICE = 1
+H264_IDR = 5
+H264_SPS = 7
+H264_PPS = 8
+# h264 slice types (mod 5)
+SLICE_P = 0
+SLICE_B = 1
+SLICE_I = 2
+SLICE_SP = 3
+SLICE_SI = 4
+# h265 nal unit types 0-31 carry slice segments
+H265_VCL_MAX = 31
+H265_VPS = 32
+
+# bytes of a slice nal that are enough for the slice header
+SLICE_HEADER_BYTES = 512
+CACHE_SUFFIX = ".nal.json"
+# bump when the cached fields change
+CACHE_VERSION = 1
+
+START_CODE_RE = re.compile(b"\x00\x00\x01")
+EMULATION_PREVENTION_RE = re.compile(b"\x00\x00\x03(?=[\x00-\x03])")
+
+_CACHE = {}
+
+
+def codec_type(codec: str) -> Optional[str]:
+    """Get the bitstream type of a codec or mime name
+
+    Args:
+        codec (str): e.g. "OMX.google.h264.encoder" or "video/hevc"
+
+    Returns:
+        H264, H265 or None if the codec is not supported.
+    """
+    codec = codec.lower()
+    if any(name in codec for name in ("avc", "h264", "264")):
+        return H264
+    if any(name in codec for name in ("hevc", "h265", "265")):
+        return H265
+    return None
+
+
+class BitReader:
+    """Read exp-golomb coded fields from an rbsp"""
+
+    def __init__(self, data: bytes):
+        self.value = int.from_bytes(data, "big")
+        self.size = len(data) * 8
+        self.pos = 0
+
+    def u(self, bits: int) -> int:
+        if bits == 0:
+            return 0
+        if self.pos + bits > self.size:
+            raise EOFError("read past the end of the rbsp")
+        self.pos += bits
+        return (self.value >> (self.size - self.pos)) & ((1 << bits) - 1)
+
+    def ue(self) -> int:
+        zeros = 0
+        while self.u(1) == 0:
+            zeros += 1
+            if zeros > 31:
+                raise ValueError("invalid exp-golomb code")
+        return (1 << zeros) - 1 + self.u(zeros)
+
+    def se(self) -> int:
+        val = self.ue()
+        return (val + 1) // 2 if val & 1 else -(val // 2)
+
+
+def rbsp(nal: bytes) -> bytes:
+    """Remove emulation prevention bytes (and the nal header is kept)"""
+    return EMULATION_PREVENTION_RE.sub(b"\x00\x00", nal)
+
+
+def _skip_scaling_list(reader: BitReader, size: int) -> None:
+    last = 8
+    scale = 8
+    for _ in range(size):
+        if scale != 0:
+            scale = (last + reader.se() + 256) % 256
+        last = scale if scale != 0 else last
+
+
+def parse_h264_sps(nal: bytes) -> Dict:
+    """Parse the h264 sps fields needed for slice headers
+
+    Args:
+        nal (bytes): sps nal unit, including the nal header byte
+
+    Returns:
+        Dict with the sps fields.
+    """
+    reader = BitReader(rbsp(nal[1:]))
+    profile_idc = reader.u(8)
+    reader.u(16)  # constraint flags, level_idc
+    sps = {"id": reader.ue(), "separate_colour_plane": 0, "chroma_format_idc": 1}
+    if profile_idc in (100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135):
+        sps["chroma_format_idc"] = reader.ue()
+        if sps["chroma_format_idc"] == 3:
+            sps["separate_colour_plane"] = reader.u(1)
+        reader.ue()  # bit_depth_luma_minus8
+        reader.ue()  # bit_depth_chroma_minus8
+        reader.u(1)  # qpprime_y_zero_transform_bypass_flag
+        if reader.u(1):  # seq_scaling_matrix_present_flag
+            for index in range(8 if sps["chroma_format_idc"] != 3 else 12):
+                if reader.u(1):
+                    _skip_scaling_list(reader, 16 if index < 6 else 64)
+    sps["log2_max_frame_num"] = reader.ue() + 4
+    sps["pic_order_cnt_type"] = reader.ue()
+    sps["delta_pic_order_always_zero"] = 0
+    if sps["pic_order_cnt_type"] == 0:
+        sps["log2_max_poc_lsb"] = reader.ue() + 4
+    elif sps["pic_order_cnt_type"] == 1:
+        sps["delta_pic_order_always_zero"] = reader.u(1)
+        reader.se()  # offset_for_non_ref_pic
+        reader.se()  # offset_for_top_to_bottom_field
+        for _ in range(reader.ue()):
+            reader.se()
+    sps["max_num_ref_frames"] = reader.ue()
+    reader.u(1)  # gaps_in_frame_num_value_allowed_flag
+    reader.ue()  # pic_width_in_mbs_minus1
+    reader.ue()  # pic_height_in_map_units_minus1
+    sps["frame_mbs_only"] = reader.u(1)
+    return sps
+
+
+def parse_h264_pps(nal: bytes) -> Dict:
+    """Parse the h264 pps fields needed for slice headers
+
+    Args:
+        nal (bytes): pps nal unit, including the nal header byte
+
+    Returns:
+        Dict with the pps fields.
+    """
+    reader = BitReader(rbsp(nal[1:]))
+    pps = {"id": reader.ue(), "sps_id": reader.ue()}
+    reader.u(1)  # entropy_coding_mode_flag
+    pps["bottom_field_pic_order_in_frame_present"] = reader.u(1)
+    if reader.ue() > 0:
+        raise ValueError("slice groups are not supported")
+    pps["num_ref_idx_l0_default"] = reader.ue() + 1
+    pps["num_ref_idx_l1_default"] = reader.ue() + 1
+    pps["weighted_pred"] = reader.u(1)
+    pps["weighted_bipred_idc"] = reader.u(2)
+    reader.se()  # pic_init_qp_minus26
+    reader.se()  # pic_init_qs_minus26
+    reader.se()  # chroma_qp_index_offset
+    reader.u(1)  # deblocking_filter_control_present_flag
+    reader.u(1)  # constrained_intra_pred_flag
+    pps["redundant_pic_cnt_present"] = reader.u(1)
+    return pps
+
+
+def _skip_pred_weight_table(reader, sps, slice_type, num_ref_idx) -> None:
+    reader.ue()  # luma_log2_weight_denom
+    chroma = sps["chroma_format_idc"] if not sps["separate_colour_plane"] else 0
+    if chroma != 0:
+        reader.ue()  # chroma_log2_weight_denom
+    lists = 2 if slice_type == SLICE_B else 1
+    for ref_list in range(lists):
+        for _ in range(num_ref_idx[ref_list]):
+            if reader.u(1):  # luma_weight_flag
+                reader.se()
+                reader.se()
+            if chroma != 0 and reader.u(1):  # chroma_weight_flag
+                for _ in range(4):
+                    reader.se()
+
+
+def parse_h264_slice_header(nal: bytes, sps_map: Dict, pps_map: Dict) -> Dict:
+    """Parse an h264 slice header up to the reference picture marking
+
+    Args:
+        nal (bytes): slice nal unit, including the nal header byte
+        sps_map (dict): Parsed sps by id
+        pps_map (dict): Parsed pps by id
+
+    Returns:
+        Dict with first_mb, slice_type, frame_num, long_term_frame_idx
+        (from memory management control operations, -1 if none) and
+        long_term_pic_num (from reference list modification, -1 if none).
+    """
+    nal_ref_idc = (nal[0] >> 5) & 3
+    nal_type = nal[0] & 0x1F
+    reader = BitReader(rbsp(nal[1:SLICE_HEADER_BYTES]))
+    header = {
+        "first_mb": reader.ue(),
+        "slice_type": reader.ue() % 5,
+        "long_term_frame_idx": -1,
+        "long_term_pic_num": -1,
+    }
+    pps = pps_map[reader.ue()]
+    sps = sps_map[pps["sps_id"]]
+    slice_type = header["slice_type"]
+    if sps["separate_colour_plane"]:
+        reader.u(2)
+    header["frame_num"] = reader.u(sps["log2_max_frame_num"])
+    field_pic = 0
+    if not sps["frame_mbs_only"]:
+        field_pic = reader.u(1)
+        if field_pic:
+            reader.u(1)  # bottom_field_flag
+    if nal_type == H264_IDR:
+        reader.ue()  # idr_pic_id
+    if sps["pic_order_cnt_type"] == 0:
+        reader.u(sps["log2_max_poc_lsb"])
+        if pps["bottom_field_pic_order_in_frame_present"] and not field_pic:
+            reader.se()
+    elif sps["pic_order_cnt_type"] == 1 and not sps["delta_pic_order_always_zero"]:
+        reader.se()
+        if pps["bottom_field_pic_order_in_frame_present"] and not field_pic:
+            reader.se()
+    if pps["redundant_pic_cnt_present"]:
+        reader.ue()
+    if slice_type == SLICE_B:
+        reader.u(1)  # direct_spatial_mv_pred_flag
+    num_ref_idx = [pps["num_ref_idx_l0_default"], pps["num_ref_idx_l1_default"]]
+    if slice_type in (SLICE_P, SLICE_SP, SLICE_B):
+        if reader.u(1):  # num_ref_idx_active_override_flag
+            num_ref_idx[0] = reader.ue() + 1
+            if slice_type == SLICE_B:
+                num_ref_idx[1] = reader.ue() + 1
+    # ref_pic_list_modification
+    if slice_type not in (SLICE_I, SLICE_SI):
+        for _ in range(2 if slice_type == SLICE_B else 1):
+            if not reader.u(1):
+                continue
+            while True:
+                idc = reader.ue()
+                if idc == 3:
+                    break
+                val = reader.ue()
+                if idc == 2:
+                    header["long_term_pic_num"] = val
+    if (pps["weighted_pred"] and slice_type in (SLICE_P, SLICE_SP)) or (
+        pps["weighted_bipred_idc"] == 1 and slice_type == SLICE_B
+    ):
+        _skip_pred_weight_table(reader, sps, slice_type, num_ref_idx)
+    # dec_ref_pic_marking
+    if nal_ref_idc != 0:
+        if nal_type == H264_IDR:
+            reader.u(1)  # no_output_of_prior_pics_flag
+            if reader.u(1):  # long_term_reference_flag
+                header["long_term_frame_idx"] = 0
+        elif reader.u(1):  # adaptive_ref_pic_marking_mode_flag
+            while True:
+                mmco = reader.ue()
+                if mmco == 0:
+                    break
+                if mmco in (1, 3):
+                    reader.ue()  # difference_of_pic_nums_minus1
+                if mmco == 2:
+                    reader.ue()  # long_term_pic_num
+                if mmco in (3, 6):
+                    header["long_term_frame_idx"] = reader.ue()
+                if mmco == 4:
+                    reader.ue()  # max_long_term_frame_idx_plus1
+    return header
+
+
+def iter_annexb(data) -> Iterator[bytes]:
+    """Iterate over the nal units of an Annex-B byte stream
+
+    Args:
+        data: bytes-like object (e.g. an mmap)
+
+    Yields:
+        nal units (without start codes)
+    """
+    starts = [match.end() for match in START_CODE_RE.finditer(data)]
+    for index, start in enumerate(starts):
+        if index + 1 < len(starts):
+            end = starts[index + 1] - 3
+            # 4 byte start codes leave a zero byte behind
+            while end > start and data[end - 1] == 0:
+                end -= 1
+        else:
+            end = len(data)
+        yield bytes(data[start:end])
+
+
+def _iter_boxes(data, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack(">I4s", data[pos : pos + 8])
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", data[pos + 8 : pos + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            break
+        yield kind, pos + header, pos + size
+        pos += size
+
+
+def _find_box(data, start: int, end: int, kind: bytes) -> Optional[Tuple[int, int]]:
+    for box, box_start, box_end in _iter_boxes(data, start, end):
+        if box == kind:
+            return box_start, box_end
+    return None
+
+
+def _video_track(data) -> Optional[Dict]:
+    moov = _find_box(data, 0, len(data), b"moov")
+    if moov is None:
+        return None
+    for kind, start, end in _iter_boxes(data, *moov):
+        if kind != b"trak":
+            continue
+        mdia = _find_box(data, start, end, b"mdia")
+        hdlr = mdia and _find_box(data, *mdia, b"hdlr")
+        if hdlr is None or data[hdlr[0] + 8 : hdlr[0] + 12] != b"vide":
+            continue
+        minf = _find_box(data, *mdia, b"minf")
+        stbl = minf and _find_box(data, *minf, b"stbl")
+        if stbl is None:
+            return None
+        return {
+            kind: box
+            for kind, *box in _iter_boxes(data, *stbl)
+            if kind in (b"stsd", b"stsz", b"stco", b"co64", b"stsc")
+        }
+    return None
+
+
+def _parameter_sets(data, stsd: List[int]) -> Tuple[int, List[bytes]]:
+    # sample entry (avc1, hvc1, ...) after the full box header and count
+    entry = next(_iter_boxes(data, stsd[0] + 8, stsd[1]))
+    # skip the visual sample entry fields
+    for kind, start, end in _iter_boxes(data, entry[1] + 78, entry[2]):
+        config = bytes(data[start:end])
+        if kind == b"avcC":
+            length_size = (config[4] & 3) + 1
+            nals = []
+            pos = 6
+            for count_mask in (0x1F, 0xFF):
+                count = config[pos - 1] & count_mask
+                for _ in range(count):
+                    size = struct.unpack(">H", config[pos : pos + 2])[0]
+                    nals.append(config[pos + 2 : pos + 2 + size])
+                    pos += 2 + size
+                pos += 1
+            return length_size, nals
+        if kind == b"hvcC":
+            length_size = (config[21] & 3) + 1
+            nals = []
+            pos = 23
+            for _ in range(config[22]):
+                count = struct.unpack(">H", config[pos + 1 : pos + 3])[0]
+                pos += 3
+                for _ in range(count):
+                    size = struct.unpack(">H", config[pos : pos + 2])[0]
+                    nals.append(config[pos + 2 : pos + 2 + size])
+                    pos += 2 + size
+            return length_size, nals
+    raise ValueError("no avcC/hvcC in the video sample entry")
+
+
+def _sample_offsets(data, boxes: Dict) -> Iterator[Tuple[int, int]]:
+    start = boxes[b"stsz"][0]
+    sample_size, count = struct.unpack(">II", data[start + 4 : start + 12])
+    if sample_size:
+        sizes = [sample_size] * count
+    else:
+        sizes = struct.unpack(f">{count}I", data[start + 12 : start + 12 + 4 * count])
+    if b"co64" in boxes:
+        start = boxes[b"co64"][0]
+        chunks = struct.unpack(">I", data[start + 4 : start + 8])[0]
+        offsets = struct.unpack(f">{chunks}Q", data[start + 8 : start + 8 + 8 * chunks])
+    else:
+        start = boxes[b"stco"][0]
+        chunks = struct.unpack(">I", data[start + 4 : start + 8])[0]
+        offsets = struct.unpack(f">{chunks}I", data[start + 8 : start + 8 + 4 * chunks])
+    start = boxes[b"stsc"][0]
+    runs = struct.unpack(">I", data[start + 4 : start + 8])[0]
+    table = struct.unpack(f">{3 * runs}I", data[start + 8 : start + 8 + 12 * runs])
+    sample = 0
+    for run in range(runs):
+        first_chunk = table[3 * run] - 1
+        last_chunk = table[3 * (run + 1)] - 1 if run + 1 < runs else chunks
+        per_chunk = table[3 * run + 1]
+        for chunk in range(first_chunk, last_chunk):
+            offset = offsets[chunk]
+            for _ in range(per_chunk):
+                if sample >= count:
+                    return
+                yield offset, sizes[sample]
+                offset += sizes[sample]
+                sample += 1
+
+
+def iter_mp4(data) -> Iterator[bytes]:
+    """Iterate over the nal units of the video track of an mp4 file
+
+    Parameter sets from the sample description come first.
+
+    Args:
+        data: bytes-like object with the whole file (e.g. an mmap)
+
+    Yields:
+        nal units
+    """
+    boxes = _video_track(data)
+    if boxes is None or b"stsd" not in boxes:
+        raise ValueError("no video track found")
+    length_size, parameter_sets = _parameter_sets(data, boxes[b"stsd"])
+    for nal in parameter_sets:
+        yield nal
+    for offset, size in _sample_offsets(data, boxes):
+        pos = offset
+        end = offset + size
+        while pos + length_size <= end:
+            nal_size = int.from_bytes(data[pos : pos + length_size], "big")
+            pos += length_size
+            # only the slice header is needed of the slice data
+            yield bytes(data[pos : pos + min(nal_size, SLICE_HEADER_BYTES)])
+            pos += nal_size
+
+
+def parse_nal_units(nals: Iterator[bytes], codec: str) -> Dict:
+    """Decode the fields used for verification from a nal unit stream
+
+    For h264 there is one entry per slice, for h265 the slice header is
+    not parsed so frame_num and the long term reference fields are -1.
+
+    Args:
+        nals: nal units
+        codec (str): H264 or H265
+
+    Returns:
+        Dict with per slice lists (nal_type, first_slice, frame_num,
+        long_term_frame_idx, long_term_pic_num, temporal_id) and the
+        max_num_ref_frames of every sps.
+    """
+    data = {
+        "codec": codec,
+        "nal_type": [],
+        "first_slice": [],
+        "frame_num": [],
+        "long_term_frame_idx": [],
+        "long_term_pic_num": [],
+        "temporal_id": [],
+        "max_num_ref_frames": [],
+    }
+    sps_map = {}
+    pps_map = {}
+    for nal in nals:
+        if len(nal) < 2:
+            continue
+        if codec == H265:
+            nal_type = (nal[0] >> 1) & 0x3F
+            if nal_type > H265_VCL_MAX:
+                continue
+            header = {
+                "first_slice": nal[2] >> 7 if len(nal) > 2 else 1,
+                "frame_num": -1,
+                "long_term_frame_idx": -1,
+                "long_term_pic_num": -1,
+                "temporal_id": (nal[1] & 7) - 1,
+            }
+        else:
+            nal_type = nal[0] & 0x1F
+            if nal_type == H264_SPS:
+                sps = parse_h264_sps(nal)
+                sps_map[sps["id"]] = sps
+                data["max_num_ref_frames"].append(sps["max_num_ref_frames"])
+                continue
+            if nal_type == H264_PPS:
+                pps = parse_h264_pps(nal)
+                pps_map[pps["id"]] = pps
+                continue
+            if nal_type not in (H264_SLICE, H264_IDR):
+                continue
+            header = parse_h264_slice_header(nal, sps_map, pps_map)
+            header["first_slice"] = 1 if header["first_mb"] == 0 else 0
+            header["temporal_id"] = 0
+        data["nal_type"].append(nal_type)
+        for key in (
+            "first_slice",
+            "frame_num",
+            "long_term_frame_idx",
+            "long_term_pic_num",
+            "temporal_id",
+        ):
+            data[key].append(header[key])
+    return data
+
+
+def parse_file(path: str, codec: str) -> Dict:
+    """Parse an mp4 or Annex-B (.264/.265/.h264/.hevc) file
+
+    Args:
+        path (str): Media file
+        codec (str): H264 or H265
+
+    Returns:
+        See parse_nal_units().
+    """
+    if os.path.getsize(path) == 0:
+        return parse_nal_units(iter([]), codec)
+    with open(path, "rb") as fd, mmap.mmap(
+        fd.fileno(), 0, access=mmap.ACCESS_READ
+    ) as data:
+        if data[4:8] == b"ftyp":
+            return parse_nal_units(iter_mp4(data), codec)
+        return parse_nal_units(iter_annexb(data), codec)
+
+
+def get_nal_data(path: str, codec: str, use_cache: bool = True) -> Dict:
+    """Get the nal data of a media file, parsing it only when needed
+
+    Results are cached in memory and in <path>.nal.json, keyed on the
+    size and modification time of the media file.
+
+    Args:
+        path (str): Media file
+        codec (str): Codec or mime name (see codec_type())
+        use_cache (bool): Read and write the cache
+
+    Returns:
+        See parse_nal_units(), None if the codec is not supported.
+    """
+    kind = codec_type(codec)
+    if kind is None:
+        return None
+    stat = os.stat(path)
+    key = [CACHE_VERSION, kind, stat.st_size, stat.st_mtime]
+    cache_file = path + CACHE_SUFFIX
+    if use_cache:
+        if _CACHE.get(path, (None,))[0] == key:
+            return _CACHE[path][1]
+        if os.path.exists(cache_file):
+            try:
+                with open(cache_file) as fd:
+                    cached = json.load(fd)
+                if cached.get("key") == key:
+                    _CACHE[path] = (key, cached["data"])
+                    return cached["data"]
+            except ValueError:
+                pass
+    data = parse_file(path, kind)
+    if use_cache:
+        _CACHE[path] = (key, data)
+        with open(cache_file, "w") as fd:
+            json.dump({"key": key, "data": data}, fd)
+    return data
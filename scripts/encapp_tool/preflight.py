@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+import re
+from typing import Dict, List, Optional, Tuple
+
+from encapp_tool import codec_caps
+
+# what to do with the tests that fail the checks
+PREFLIGHT_MODES = ("prune", "abort", "off")
+# ffprobe codec names of the sources the app can decode
+DECODER_MEDIA_TYPES = {
+    "h264": "video/avc",
+    "hevc": "video/hevc",
+    "vp8": "video/x-vnd.on2.vp8",
+    "vp9": "video/x-vnd.on2.vp9",
+    "av1": "video/av01",
+}
+# both yuv420p and nv12
+RAW_BYTES_PER_PIXEL = 1.5
+
+
+def check_input(test, media: Dict[str, Dict], codecs: Optional[List[Dict]] = None) -> List[str]:
+    """Check the source of a test against its metadata
+
+    Args:
+        test (tests_pb2.Test): Test with the device path of its source
+        media (dict): Metadata by device path: "raw" (bool) and "size"
+                      for raw sources, "codec-name", "width" and "height"
+                      (from ffprobe) for encoded ones
+        codecs (list): Capability records (see codec_caps), to check
+                       that encoded sources can be decoded
+
+    Returns:
+        Reasons the test cannot run, empty if the source looks fine.
+    """
+    path = test.input.filepath
+    if path == "camera" or not path:
+        return []
+    info = media.get(path)
+    if info is None:
+        return [f"source {path} does not exist"]
+    if info["raw"]:
+        resolution = test.input.resolution
+        if not re.match(r"^\d+x\d+$", resolution):
+            return [f"raw source {path} needs an input resolution"]
+        width, height = (int(val) for val in resolution.split("x"))
+        if info["size"] % (width * height * RAW_BYTES_PER_PIXEL) != 0:
+            return [f"size of {path} ({info['size']} bytes) does not match {resolution}"]
+        return []
+    media_type = DECODER_MEDIA_TYPES.get(info.get("codec-name"))
+    if codecs is not None and media_type is not None:
+        if not any(
+            not codec["encoder"] and any(media["media_type"] == media_type for media in codec["media_types"])
+            for codec in codecs
+        ):
+            return [f"no decoder for {path} ({media_type})"]
+    return []
+
+
+def _flatten(test) -> List:
+    # a test and its parallel tests (which have sources of their own)
+    flat = [test]
+    for parallel in test.parallel.test:
+        flat += _flatten(parallel)
+    return flat
+
+
+def check_tests(
+    tests, media: Dict[str, Dict], codecs: Optional[List[Dict]] = None
+) -> Tuple[object, List[Tuple[str, List[str]]]]:
+    """Split expanded tests into the ones that can run and the rest
+
+    Only host-side data is used (capability cache, source metadata), so
+    an invalid sweep point costs no device time.
+
+    Args:
+        tests (tests_pb2.Tests): Expanded tests
+        media (dict): Source metadata by device path (see check_input())
+        codecs (list): Capability records, None to skip the codec checks
+
+    Returns:
+        (Tests that passed, [(test id, reasons)] of the ones that did not).
+    """
+    valid = type(tests)()
+    rejected = []
+    for test in tests.test:
+        problems = []
+        for item in _flatten(test):
+            problems += check_input(item, media, codecs)
+        if codecs is not None:
+            problems += codec_caps.check_test(codecs, test)
+        if problems:
+            rejected.append((test.common.id, problems))
+        else:
+            valid.test.append(test)
+    return valid, rejected
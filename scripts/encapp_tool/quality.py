@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+import math
+import os
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# per frame lines of the ffmpeg ssim/psnr stats files
+SSIM_STATS_RE = re.compile(r"(Y|U|V|All):([0-9.]+)")
+PSNR_STATS_RE = re.compile(r"(mse_avg|psnr_avg):([0-9.]+|inf)")
+# metric filters run on every distorted input
+METRICS = ("vmaf", "ssim", "psnr")
+
+
+def parse_ssim_stats(path: str) -> Optional[Dict[str, float]]:
+    """Average the per frame values of an ffmpeg ssim stats file
+
+    Args:
+        path (str): ssim=stats_file output
+
+    Returns:
+        Mean "Y", "U", "V" and "All" ssim (what ffmpeg prints when the
+        filter ends), None if the file has no frames.
+    """
+    sums = {}
+    frames = 0
+    with open(path) as fd:
+        for line in fd:
+            values = SSIM_STATS_RE.findall(line)
+            if not values:
+                continue
+            frames += 1
+            for comp, val in values:
+                sums[comp] = sums.get(comp, 0.0) + float(val)
+    if frames == 0:
+        return None
+    return {comp: val / frames for comp, val in sums.items()}
+
+
+def parse_psnr_stats(path: str) -> Optional[float]:
+    """Get the average psnr of an ffmpeg psnr stats file
+
+    Like ffmpeg, the average is the psnr of the mean mse of all frames
+    (not the mean of the per frame psnr).
+
+    Args:
+        path (str): psnr=stats_file output
+
+    Returns:
+        Average psnr in dB (inf for identical media), None if the file
+        has no frames.
+    """
+    mse_sum = 0.0
+    frames = 0
+    peak = None
+    with open(path) as fd:
+        for line in fd:
+            values = dict(PSNR_STATS_RE.findall(line))
+            if "mse_avg" not in values:
+                continue
+            frames += 1
+            mse = float(values["mse_avg"])
+            mse_sum += mse
+            if peak is None and mse > 0 and values.get("psnr_avg", "inf") != "inf":
+                # squared max pixel value, from the frame psnr definition
+                peak = mse * 10 ** (float(values["psnr_avg"]) / 10)
+    if frames == 0:
+        return None
+    if mse_sum == 0 or peak is None:
+        return math.inf
+    return 10 * math.log10(peak / (mse_sum / frames))
+
+
+def write_summaries(ssim_file: str, psnr_file: str) -> None:
+    """Write the ffmpeg style ssim/psnr summary lines from the stats files
+
+    The summaries normally come from the ffmpeg log; with several metric
+    filters in one graph they are recreated from <file>.all instead.
+    Nothing is written when the stats are missing.
+
+    Args:
+        ssim_file (str): ssim summary, <ssim_file>.all are the stats
+        psnr_file (str): psnr summary, <psnr_file>.all are the stats
+    """
+    if not os.path.exists(f"{ssim_file}.all") or not os.path.exists(f"{psnr_file}.all"):
+        # the ffmpeg run failed
+        return
+    ssim = parse_ssim_stats(f"{ssim_file}.all")
+    if ssim is not None:
+        comps = " ".join(
+            f"{comp}:{ssim[comp]:.6f} ({_ssim_db(ssim[comp]):.6f})"
+            for comp in ("Y", "U", "V", "All")
+            if comp in ssim
+        )
+        with open(ssim_file, "w") as fd:
+            fd.write(f"SSIM {comps}\n")
+    psnr = parse_psnr_stats(f"{psnr_file}.all")
+    if psnr is not None:
+        with open(psnr_file, "w") as fd:
+            fd.write(f"PSNR average:{psnr:.6f}\n")
+
+
+def _ssim_db(ssim: float) -> float:
+    return math.inf if ssim >= 1 else -10 * math.log10(1 - ssim)
+
+
+def shared_reference_filter(
+    outputs: Sequence[Tuple[str, str, str]],
+    prefilters: Optional[Sequence[str]] = None,
+    n_threads: int = 16,
+) -> Tuple[str, List[str]]:
+    """Build a filter graph comparing N distorted inputs to one reference
+
+    The distorted media are inputs 0..N-1 and the reference is input N.
+    The reference is read (and decoded) once and split to the vmaf, ssim
+    and psnr filters of every distorted input.
+
+    Args:
+        outputs (list): (vmaf log, ssim stats, psnr stats) files of every
+                        distorted input
+        prefilters (list): Filter chain to run on each distorted input
+                           before the metrics ("" for none)
+        n_threads (int): libvmaf threads
+
+    Returns:
+        (filter_complex, output labels to -map).
+    """
+    count = len(outputs)
+    if prefilters is None:
+        prefilters = [""] * count
+    refs = [f"[r{num}]" for num in range(len(METRICS) * count)]
+    chains = [f"[{count}:v]split={len(refs)}{''.join(refs)}"]
+    labels = []
+    for num, (vmaf_log, ssim_stats, psnr_stats) in enumerate(outputs):
+        prefilter = f"{prefilters[num]}," if prefilters[num] else ""
+        chains.append(f"[{num}:v]{prefilter}split=3[d{num}v][d{num}s][d{num}p]")
+        # vmaf wants <distorted> <reference>
+        chains.append(
+            f"[d{num}v]{refs[3 * num]}libvmaf=log_path={vmaf_log}:"
+            f"n_threads={n_threads}:log_fmt=json[v{num}]"
+        )
+        chains.append(f"[d{num}s]{refs[3 * num + 1]}ssim=stats_file={ssim_stats}[s{num}]")
+        chains.append(f"[d{num}p]{refs[3 * num + 2]}psnr=stats_file={psnr_stats}[p{num}]")
+        labels += [f"[v{num}]", f"[s{num}]", f"[p{num}]"]
+    return ";".join(chains), labels
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+import contextlib
+import csv
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import time
+from typing import Dict, List, Optional
+
+# columns of the quality csv, in order
+CSV_COLUMNS = [
+    "media",
+    "codec",
+    "gop",
+    "fps",
+    "width",
+    "height",
+    "bitrate",
+    "real_bitrate",
+    "size",
+    "vmaf",
+    "ssim",
+    "psnr",
+    "file",
+]
+# encapp_quality.py settings that change the scores
+OPTION_KEYS = (
+    "pix_fmt",
+    "reference_resolution",
+    "fr_fr",
+    "fr_lr",
+    "lr_lr",
+    "lr_fr",
+)
+HASH_BLOCK_SIZE = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS quality (
+    key TEXT PRIMARY KEY,
+    encoded_hash TEXT NOT NULL,
+    reference TEXT NOT NULL,
+    options TEXT NOT NULL,
+    media TEXT,
+    codec TEXT,
+    gop TEXT,
+    fps TEXT,
+    width TEXT,
+    height TEXT,
+    bitrate TEXT,
+    real_bitrate TEXT,
+    size INTEGER,
+    vmaf REAL,
+    ssim REAL,
+    psnr REAL,
+    file TEXT,
+    mtime_ns INTEGER,
+    host TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS quality_media ON quality(media, size, mtime_ns);
+"""
+_COLUMNS = [
+    "key",
+    "encoded_hash",
+    "reference",
+    "options",
+    *CSV_COLUMNS,
+    "mtime_ns",
+    "host",
+    "updated",
+]
+
+
+def file_hash(path: str) -> str:
+    """Get the sha1 of the content of a file"""
+    digest = hashlib.sha1()
+    with open(path, "rb") as fd:
+        for block in iter(lambda: fd.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def quality_options(settings: Dict) -> Dict:
+    """Get the encapp_quality.py settings that are part of the row key"""
+    return {key: settings.get(key) for key in OPTION_KEYS}
+
+
+class QualityTable:
+    """Quality scores of encoded media, one row per comparison
+
+    Rows are keyed on the content of the encoded file, the name of the
+    reference and the options of the comparison, so recalculating a file
+    replaces its row, and tables from several hosts can be merged
+    without duplicates (the latest calculation wins). The table is a
+    sqlite file; the quality csv is an export of it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def encoded_hash(self, path: str) -> str:
+        """Get the content hash of an encoded file
+
+        The file is only read if the table has no row of the same path,
+        size and modification time.
+        """
+        stat = os.stat(path)
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT encoded_hash FROM quality WHERE media = ? AND size = ? AND mtime_ns = ?",
+                (path, stat.st_size, stat.st_mtime_ns),
+            ).fetchone()
+        if row is not None:
+            return row["encoded_hash"]
+        return file_hash(path)
+
+    def upsert(self, row: Dict, reference: str, options: Dict, updated: Optional[float] = None) -> str:
+        """Add or replace the scores of an encoded file
+
+        Args:
+            row (dict): Values of the csv columns; "media" is the path of
+                        the encoded file
+            reference (str): Path of the reference (only its name is part
+                             of the key, as media dirs differ by host)
+            options (dict): Comparison options (see quality_options())
+            updated (float): When the scores were calculated (default
+                             now), merges keep the latest calculation
+
+        Returns:
+            Key of the row.
+        """
+        encoded_hash = self.encoded_hash(row["media"])
+        reference = os.path.basename(reference)
+        options = json.dumps(options, sort_keys=True)
+        key = hashlib.sha1(json.dumps([encoded_hash, reference, options]).encode()).hexdigest()
+        values = dict(row)
+        values.update(
+            key=key,
+            encoded_hash=encoded_hash,
+            reference=reference,
+            options=options,
+            mtime_ns=os.stat(row["media"]).st_mtime_ns,
+            host=socket.gethostname(),
+            updated=time.time() if updated is None else updated,
+        )
+        with self._transaction() as db:
+            db.execute(
+                f"INSERT OR REPLACE INTO quality ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                [values.get(column) for column in _COLUMNS],
+            )
+        return key
+
+    def merge(self, path: str) -> int:
+        """Merge the rows of another table into this one
+
+        Rows of the other table replace rows with the same key that were
+        calculated before them.
+
+        Args:
+            path (str): sqlite file of the other table
+
+        Returns:
+            Number of rows added or replaced.
+        """
+        with self._connect() as db:
+            db.execute("ATTACH DATABASE ? AS other", (path,))
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = db.execute(
+                    f"INSERT OR REPLACE INTO quality ({', '.join(_COLUMNS)}) "
+                    f"SELECT {', '.join('o.' + column for column in _COLUMNS)} "
+                    "FROM other.quality o LEFT JOIN quality q ON q.key = o.key "
+                    "WHERE q.key IS NULL OR o.updated > q.updated"
+                )
+                count = cursor.rowcount
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+            db.execute("DETACH DATABASE other")
+        return count
+
+    def rows(self, key: Optional[str] = None) -> List[Dict]:
+        """Get the rows (all of them, or the one with a key)"""
+        with self._connect() as db:
+            if key is None:
+                rows = db.execute("SELECT * FROM quality ORDER BY media, key").fetchall()
+            else:
+                rows = db.execute("SELECT * FROM quality WHERE key = ?", (key,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def export_csv(self, path: str) -> int:
+        """Write the table as a quality csv (with a header)
+
+        Returns:
+            Number of rows written.
+        """
+        rows = self.rows()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", newline="") as fd:
+            writer = csv.writer(fd)
+            writer.writerow(CSV_COLUMNS)
+            for row in rows:
+                writer.writerow([row[column] for column in CSV_COLUMNS])
+        os.replace(tmp_path, path)
+        return len(rows)
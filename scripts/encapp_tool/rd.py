@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+import os
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from encapp_tool.quality_table import QualityTable
+
+# columns of the encapp_quality.py csv
+QUALITY_COLUMNS = [
+    "media",
+    "codec",
+    "gop",
+    "fps",
+    "width",
+    "height",
+    "bitrate",
+    "real_bitrate",
+    "size",
+    "vmaf",
+    "ssim",
+    "psnr",
+    "file",
+]
+NUMERIC_COLUMNS = [
+    "gop",
+    "fps",
+    "width",
+    "height",
+    "bitrate",
+    "real_bitrate",
+    "size",
+    "vmaf",
+    "ssim",
+    "psnr",
+]
+RATE = "real_bitrate"
+# highest polynomial order of the Bjontegaard fits
+BD_ORDER = 3
+
+
+def read_quality(paths: Sequence[str]) -> pd.DataFrame:
+    """Read encapp_quality.py csv files into one table
+
+    The csv files may or may not start with a header, and may have more
+    headers in between (earlier encapp_quality.py versions appended).
+
+    Args:
+        paths (list): csv files or quality tables (.sqlite)
+
+    Returns:
+        Quality table, with a "csv" column with the name of the file
+        each row comes from (e.g. to compare devices).
+    """
+    frames = []
+    for path in paths:
+        if path.endswith(".sqlite"):
+            data = pd.DataFrame(QualityTable(path).rows(), columns=QUALITY_COLUMNS)
+        else:
+            data = pd.read_csv(path, header=None, names=QUALITY_COLUMNS, skipinitialspace=True, dtype=str)
+            data = data.loc[data["media"] != "media"]
+        data["csv"] = os.path.splitext(os.path.basename(path))[0]
+        frames.append(data)
+    data = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=QUALITY_COLUMNS + ["csv"])
+    for column in NUMERIC_COLUMNS:
+        data[column] = pd.to_numeric(data[column], errors="coerce")
+    return data
+
+
+def hull_mask(rates: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    """Find the points on the upper convex hull of one rate-quality curve
+
+    Points that do not improve on the quality of a lower rate, or that
+    are below the line between their neighbours, are not on the hull.
+
+    Args:
+        rates (np.ndarray): Bitrates
+        scores (np.ndarray): Quality scores
+
+    Returns:
+        Boolean mask of the hull points.
+    """
+    order = np.lexsort((-scores, rates))
+    hull = []
+    best = -np.inf
+    for index in order:
+        rate, score = rates[index], scores[index]
+        if np.isnan(rate) or np.isnan(score) or score <= best:
+            continue
+        best = score
+        # drop the points under the segment to this one (monotone chain)
+        while len(hull) >= 2:
+            rate0, score0 = rates[hull[-2]], scores[hull[-2]]
+            rate1, score1 = rates[hull[-1]], scores[hull[-1]]
+            if (score1 - score0) * (rate - rate0) > (score - score0) * (rate1 - rate0):
+                break
+            hull.pop()
+        hull.append(index)
+    mask = np.zeros(len(rates), dtype=bool)
+    mask[hull] = True
+    return mask
+
+
+def convex_hull(data: pd.DataFrame, metric: str = "vmaf", by: Sequence[str] = ("codec", "height")) -> pd.DataFrame:
+    """Get the rate-quality convex hull of every group
+
+    Args:
+        data (pd.DataFrame): Quality table
+        metric (str): Quality column
+        by (list): Columns of a curve, e.g. ("codec", "height") for a
+                   hull per resolution, ("codec",) for the hull across
+                   resolutions
+
+    Returns:
+        The hull rows, sorted by group and rate.
+    """
+    mask = np.zeros(len(data), dtype=bool)
+    for _, rows in data.groupby(list(by), sort=False).indices.items():
+        mask[rows] = hull_mask(data[RATE].values[rows].astype(float), data[metric].values[rows].astype(float))
+    return data.loc[mask].sort_values(list(by) + [RATE])
+
+
+def _fit(rates: np.ndarray, scores: np.ndarray, inverse: bool) -> Optional[tuple]:
+    # polynomial of log rate(score) (inverse) or score(log rate), and its
+    # domain
+    if len(rates) < 2:
+        return None
+    log_rates = np.log(rates)
+    x, y = (scores, log_rates) if inverse else (log_rates, scores)
+    order = min(BD_ORDER, len(rates) - 1)
+    # fitted on a scaled domain, which keeps close scores well conditioned
+    return np.polynomial.Polynomial.fit(x, y, order).integ(), x.min(), x.max()
+
+
+def _bd(anchor: Optional[tuple], test: Optional[tuple]) -> float:
+    # mean difference of two fits over their common domain
+    if anchor is None or test is None:
+        return np.nan
+    low = max(anchor[1], test[1])
+    high = min(anchor[2], test[2])
+    if low >= high:
+        return np.nan
+    area_anchor = anchor[0](high) - anchor[0](low)
+    area_test = test[0](high) - test[0](low)
+    return (area_test - area_anchor) / (high - low)
+
+
+def bd_rate(anchor_rates, anchor_scores, test_rates, test_scores) -> float:
+    """Bjontegaard delta rate of a test curve against an anchor curve
+
+    Returns:
+        Average bitrate difference at the same quality in percent
+        (negative when the test needs less bitrate), nan if the curves
+        have no quality range in common.
+    """
+    anchor = _fit(np.asarray(anchor_rates, float), np.asarray(anchor_scores, float), True)
+    test = _fit(np.asarray(test_rates, float), np.asarray(test_scores, float), True)
+    return (np.exp(_bd(anchor, test)) - 1) * 100
+
+
+def bd_quality(anchor_rates, anchor_scores, test_rates, test_scores) -> float:
+    """Bjontegaard delta quality (e.g. BD-PSNR, BD-VMAF) of a test curve
+
+    Returns:
+        Average quality difference at the same bitrate, nan if the curves
+        have no bitrate range in common.
+    """
+    anchor = _fit(np.asarray(anchor_rates, float), np.asarray(anchor_scores, float), False)
+    test = _fit(np.asarray(test_rates, float), np.asarray(test_scores, float), False)
+    return _bd(anchor, test)
+
+
+def compare(
+    data: pd.DataFrame,
+    anchor: str,
+    column: str = "codec",
+    metrics: Sequence[str] = ("vmaf", "psnr"),
+    by: Sequence[str] = ("height",),
+) -> pd.DataFrame:
+    """Compute BD-rate and BD-quality of every curve against an anchor
+
+    The curves are the convex hulls of the (by, column) groups. Each
+    curve is fitted once however many curves it is compared with.
+
+    Args:
+        data (pd.DataFrame): Quality table
+        anchor (str): Value of column of the anchor curves
+        column (str): Column compared, e.g. "codec", or "csv" to compare
+                      the quality files of several devices
+        metrics (list): Quality columns
+        by (list): Columns every comparison is done within (one row per
+                   group and compared value), e.g. ("height",)
+
+    Returns:
+        Table with the by and column values, the number of points and
+        bd_rate_<metric> and bd_<metric> for every metric.
+    """
+    by = list(by)
+    results = {}
+    for metric in metrics:
+        hull = convex_hull(data, metric, by + [column])
+        curves = {}
+        for key, group in hull.groupby(by + [column], sort=True):
+            key = key if isinstance(key, tuple) else (key,)
+            rates = group[RATE].values.astype(float)
+            scores = group[metric].values.astype(float)
+            curves[key] = (len(group), _fit(rates, scores, True), _fit(rates, scores, False))
+        # anchor curves by group (the values of column are compared as
+        # text, as they are given on the command line)
+        anchors = {key[:-1]: curve for key, curve in curves.items() if str(key[-1]) == str(anchor)}
+        for key, (count, rate_fit, quality_fit) in curves.items():
+            if str(key[-1]) == str(anchor) or key[:-1] not in anchors:
+                continue
+            _, anchor_rate_fit, anchor_quality_fit = anchors[key[:-1]]
+            row = results.setdefault(key, dict(zip(by + [column], key)))
+            row[f"points_{metric}"] = count
+            row[f"bd_rate_{metric}"] = (np.exp(_bd(anchor_rate_fit, rate_fit)) - 1) * 100
+            row[f"bd_{metric}"] = _bd(anchor_quality_fit, quality_fit)
+    columns = by + [column]
+    for metric in metrics:
+        columns += [f"points_{metric}", f"bd_rate_{metric}", f"bd_{metric}"]
+    return pd.DataFrame([results[key] for key in sorted(results)], columns=columns)
+
+
+def bitrate_at_quality(
+    data: pd.DataFrame,
+    targets: Sequence[float],
+    metric: str = "vmaf",
+    by: Sequence[str] = ("codec", "height"),
+) -> pd.DataFrame:
+    """Interpolate the bitrate needed for target qualities
+
+    The bitrate is interpolated (in the log domain) along the convex hull
+    of every group.
+
+    Args:
+        data (pd.DataFrame): Quality table
+        targets (list): Quality scores
+        metric (str): Quality column
+        by (list): Columns of a curve
+
+    Returns:
+        Table with the by values and a bitrate column per target, nan
+        where the target is outside the range of the curve.
+    """
+    by = list(by)
+    targets = np.asarray(targets, float)
+    columns = [f"bitrate_at_{metric}_{target:g}" for target in targets]
+    rows = []
+    for key, group in convex_hull(data, metric, by).groupby(by, sort=True):
+        key = key if isinstance(key, tuple) else (key,)
+        scores = group[metric].values.astype(float)
+        log_rates = np.log(group[RATE].values.astype(float))
+        rates = np.exp(np.interp(targets, scores, log_rates, left=np.nan, right=np.nan))
+        rows.append(list(key) + list(rates))
+    return pd.DataFrame(rows, columns=by + columns)
+
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+import json
+import os
+import time
+from typing import Dict, Iterable, Optional
+
+from encapp_tool.adb_cmds import run_cmd
+from encapp_tool.app_utils import CACHE_DIR
+
+DEVICE_LOCATION = "/sdcard/"
+# never plan to use the last bytes on the device
+DEFAULT_MARGIN = 512 * 1024 * 1024
+# json result, logs and container overhead per encoded output
+OUTPUT_OVERHEAD = 1024 * 1024
+
+
+def get_free_space(serial: str, location: str = DEVICE_LOCATION, debug=0) -> int:
+    """Get the free space at an android device path using one df call
+
+    Args:
+        serial (str): Android device serial no.
+        location (str): Device path to check
+        debug (int): Debug level
+
+    Returns:
+        Available bytes, -1 if df output cannot be parsed.
+    """
+    ret, stdout, _ = run_cmd(f"adb -s {serial} shell df -k {location}", debug)
+    if not ret:
+        return -1
+    return _parse_df_available(stdout)
+
+
+def _parse_df_available(stdout: str) -> int:
+    """Parse df -k output to get the available bytes
+
+    Args:
+        stdout (str): df -k cmd output string
+
+    Returns:
+        Available bytes in the last listed filesystem, -1 if not found.
+    """
+    lines = [line for line in stdout.splitlines() if line.strip()]
+    if len(lines) < 2:
+        return -1
+    fields = lines[-1].split()
+    # Filesystem 1K-blocks Used Available Use% Mounted on
+    if len(fields) < 4 or not fields[3].isdigit():
+        return -1
+    return int(fields[3]) * 1024
+
+
+def estimate_output_size(bitrate: int, duration_sec: float) -> int:
+    """Estimate the device storage needed by one encoded output
+
+    Args:
+        bitrate (int): Target bitrate in bps
+        duration_sec (float): Duration of the encoded media
+
+    Returns:
+        Estimated size in bytes.
+    """
+    return int(bitrate * duration_sec / 8) + OUTPUT_OVERHEAD
+
+
+class DeviceStorage:
+    """Storage budget for the files encapp puts on an android device
+
+    Keeps a host-side record of the source files pushed to the device
+    and when they were last used, so sources can be reused across runs
+    and the least recently used ones evicted when space is needed.
+    Only files pushed through this class are ever evicted.
+    """
+
+    def __init__(
+        self,
+        serial: str,
+        location: str = DEVICE_LOCATION,
+        margin: int = DEFAULT_MARGIN,
+        state_file: Optional[str] = None,
+        debug=0,
+    ):
+        self.serial = serial
+        self.location = location
+        self.margin = margin
+        self.debug = debug
+        if state_file is None:
+            state_file = os.path.join(CACHE_DIR, f"storage_{serial}.json")
+        self.state_file = state_file
+        self.pushed = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, "r") as fd:
+                self.pushed = json.load(fd)
+        except ValueError:
+            print(f"warning: ignoring corrupt storage record {self.state_file}")
+            self.pushed = {}
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+        with open(self.state_file, "w") as fd:
+            json.dump(self.pushed, fd, indent=2)
+
+    def refresh(self) -> None:
+        """Drop records of pushed files that are gone from the device"""
+        _, stdout, _ = run_cmd(
+            f"adb -s {self.serial} shell ls -l {self.location}", self.debug
+        )
+        on_device = _parse_ls_sizes(stdout)
+        for name in list(self.pushed.keys()):
+            if on_device.get(name) != self.pushed[name]["size"]:
+                del self.pushed[name]
+        self._save()
+
+    def is_pushed(self, name: str, size: int, mtime: float = 0) -> bool:
+        """Check whether the same version of a source is on the device
+
+        Args:
+            name (str): Basename of the file at the device location
+            size (int): Host file size
+            mtime (float): Host file modification time
+
+        Returns:
+            True if the file does not need to be pushed again.
+        """
+        record = self.pushed.get(name)
+        return (
+            record is not None
+            and record["size"] == size
+            and record.get("mtime", 0) == mtime
+        )
+
+    def record_push(self, name: str, size: int, mtime: float = 0) -> None:
+        """Record a file pushed to the device location
+
+        Args:
+            name (str): Basename of the file at the device location
+            size (int): Host file size
+            mtime (float): Host file modification time
+        """
+        self.pushed[name] = {"size": size, "mtime": mtime, "used": time.time()}
+        self._save()
+
+    def touch(self, name: str) -> None:
+        """Mark a pushed file as used now"""
+        if name in self.pushed:
+            self.pushed[name]["used"] = time.time()
+            self._save()
+
+    def evict(self, needed: int, keep: Iterable[str] = ()) -> int:
+        """Remove least recently used pushed files from the device
+
+        Args:
+            needed (int): Bytes to free
+            keep (list): Names of files that must stay on the device
+
+        Returns:
+            Number of bytes freed.
+        """
+        keep = set(keep)
+        freed = 0
+        candidates = sorted(
+            (name for name in self.pushed if name not in keep),
+            key=lambda name: self.pushed[name]["used"],
+        )
+        for name in candidates:
+            if freed >= needed:
+                break
+            print(f"evict {self.location}{name} from device")
+            run_cmd(
+                f"adb -s {self.serial} shell rm {self.location}{name}", self.debug
+            )
+            freed += self.pushed[name]["size"]
+            del self.pushed[name]
+        self._save()
+        return freed
+
+    def reserve(self, needed: int, keep: Iterable[str] = ()) -> bool:
+        """Make sure there is room for `needed` bytes plus the safety margin
+
+        Queries the free space once and evicts least recently used
+        sources not in `keep` if that is not enough.
+
+        Args:
+            needed (int): Bytes about to be written to the device
+            keep (list): Names of files that must stay on the device
+
+        Returns:
+            True if the bytes fit, False if the caller should not go on.
+        """
+        free = get_free_space(self.serial, self.location, self.debug)
+        if free < 0:
+            print("warning: unable to read device free space")
+            return True
+        missing = needed + self.margin - free
+        if missing <= 0:
+            return True
+        freed = self.evict(missing, keep)
+        if freed >= missing:
+            return True
+        print(
+            f"error: need {needed} bytes (+{self.margin} margin) but "
+            f"only {free + freed} bytes can be made available"
+        )
+        return False
+
+
+def _parse_ls_sizes(stdout: str) -> Dict[str, int]:
+    """Parse ls -l output to get file sizes
+
+    Args:
+        stdout (str): ls -l cmd output string
+
+    Returns:
+        Map from file name to size in bytes.
+    """
+    sizes = {}
+    for line in stdout.splitlines():
+        fields = line.split()
+        # perms links owner group size date time name
+        if len(fields) < 8 or not line.startswith("-"):
+            continue
+        if not fields[4].isdigit():
+            continue
+        sizes[fields[-1]] = int(fields[4])
+    return sizes
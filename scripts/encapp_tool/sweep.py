@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+import itertools
+import os
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from google.protobuf.descriptor import FieldDescriptor
+
+from encapp_tool.journal import RunJournal
+
+SWEEP_MODES = ("product", "zip")
+SWEEP_SECTIONS = ("input", "configure")
+# short names for the most common sweep dimensions
+SWEEP_FIELDS = {
+    "bitrate": "configure.bitrate",
+    "bitrate_mode": "configure.bitrate_mode",
+    "codec": "configure.codec",
+    "framerate": "configure.framerate",
+    "i_frame_interval": "configure.i_frame_interval",
+    "resolution": "configure.resolution",
+}
+
+
+def resolve_field(name: str) -> Tuple[str, str]:
+    """Map a sweep field name to a (section, field) pair
+
+    Args:
+        name (str): Either a short name (see SWEEP_FIELDS) or a dotted
+            path like "input.resolution" or "configure.bitrate"
+
+    Returns:
+        Tuple with the Test sub-message name and the field name
+    """
+    path = SWEEP_FIELDS.get(name, name)
+    assert "." in path, f"error: unknown sweep field: {name}"
+    section, field = path.split(".", 1)
+    assert section in SWEEP_SECTIONS, (
+        f"error: sweep field must be in {'/'.join(SWEEP_SECTIONS)}: {name}"
+    )
+    return section, field
+
+
+def set_field(test, name: str, value: Any) -> None:
+    """Set a Configure/Input field in a Test, converting the value
+
+    Args:
+        test (tests_pb2.Test): Test to modify
+        name (str): Sweep field name
+        value: New value, as string or already typed
+    """
+    section, field = resolve_field(name)
+    message = getattr(test, section)
+    descriptor = message.DESCRIPTOR.fields_by_name.get(field)
+    assert descriptor is not None, (
+        f"error: {section} has no field {field}"
+    )
+    cpp_type = descriptor.cpp_type
+    if cpp_type == FieldDescriptor.CPPTYPE_ENUM:
+        if isinstance(value, str) and not value.isdigit():
+            enum_value = descriptor.enum_type.values_by_name.get(value)
+            assert enum_value is not None, (
+                f"error: invalid value for {field}: {value}"
+            )
+            value = enum_value.number
+        value = int(value)
+    elif cpp_type in (
+        FieldDescriptor.CPPTYPE_INT32,
+        FieldDescriptor.CPPTYPE_INT64,
+        FieldDescriptor.CPPTYPE_UINT32,
+        FieldDescriptor.CPPTYPE_UINT64,
+    ):
+        value = int(value)
+    elif cpp_type in (
+        FieldDescriptor.CPPTYPE_FLOAT,
+        FieldDescriptor.CPPTYPE_DOUBLE,
+    ):
+        value = float(value)
+    elif cpp_type == FieldDescriptor.CPPTYPE_BOOL:
+        if isinstance(value, str):
+            value = value.lower() in ("1", "true", "yes")
+        value = bool(value)
+    else:
+        value = str(value)
+    setattr(message, field, value)
+
+
+def sweep_points(
+    sweep: Dict[str, List], mode: str = "product"
+) -> Iterator[Dict[str, Any]]:
+    """Generate the sweep points for a set of dimensions
+
+    Args:
+        sweep (dict): Map from sweep field name to list of values
+        mode (str): "product" for the cartesian product of all the
+            dimensions, "zip" to walk all of them in lockstep
+
+    Returns:
+        Iterator over dicts mapping each field to its value at that point.
+    """
+    assert mode in SWEEP_MODES, f"error: invalid sweep mode: {mode}"
+    names = list(sweep.keys())
+    values = [sweep[name] for name in names]
+    if mode == "product":
+        combinations = itertools.product(*values)
+    else:
+        lengths = set(len(val) for val in values)
+        assert len(lengths) <= 1, (
+            "error: zip sweep needs the same number of values in all "
+            f"dimensions ({', '.join(names)})"
+        )
+        combinations = zip(*values)
+    for combination in combinations:
+        yield dict(zip(names, combination))
+
+
+def test_key(test) -> str:
+    """Get a key identifying a (fully expanded) test
+
+    The key is the canonical one-line text format of the test as the
+    host expanded it. It is not what the app reports back as
+    "testdefinition" in its result json files: the app fills in the
+    defaults and rewrites the codec and the input before running.
+
+    Args:
+        test (tests_pb2.Test): Test to identify
+
+    Returns:
+        Key string.
+    """
+    from google.protobuf import text_format
+
+    return text_format.MessageToString(test, as_one_line=True)
+
+
+def completed_test_keys(workdir: str) -> Set[str]:
+    """Get the keys of all the tests with results in a workdir
+
+    The keys are the host test keys the run journal of the workdir
+    recorded when the results were collected. Tests whose result files
+    are gone do not count.
+
+    Args:
+        workdir (str): Workdir of earlier runs
+
+    Returns:
+        Set of test keys with results already in workdir.
+    """
+    if not os.path.isdir(workdir):
+        return set()
+    tests = RunJournal(workdir).test_files()
+    return {
+        key
+        for key, files in tests.items()
+        if files and all(os.path.exists(path) for path in files)
+    }
+
+
+def expand_tests(
+    tests,
+    sweep: Optional[Dict[str, List]] = None,
+    mode: str = "product",
+    skip: Optional[Set[str]] = None,
+) -> Iterator:
+    """Lazily expand every test in a Tests message over a sweep
+
+    Sweeps are only applied to the top level tests, parallel tests are
+    copied as they are.
+
+    Args:
+        tests (tests_pb2.Tests): Tests to expand
+        sweep (dict): Map from sweep field name to list of values
+        mode (str): Sweep mode, see sweep_points()
+        skip (set): Keys of tests that should not be generated, e.g.
+            the ones already completed
+
+    Returns:
+        Iterator over the expanded Test messages.
+    """
+    if skip is None:
+        skip = set()
+    for test in tests.test:
+        points = sweep_points(sweep, mode) if sweep else [{}]
+        for point in points:
+            ntest = type(test)()
+            ntest.CopyFrom(test)
+            for name, value in point.items():
+                set_field(ntest, name, value)
+            if test_key(ntest) in skip:
+                continue
+            yield ntest
+
+
+def build_tests(
+    tests,
+    sweep: Optional[Dict[str, List]] = None,
+    mode: str = "product",
+    skip: Optional[Set[str]] = None,
+):
+    """Build a new Tests message with every test expanded over a sweep
+
+    Args:
+        tests (tests_pb2.Tests): Tests to expand
+        sweep (dict): Map from sweep field name to list of values
+        mode (str): Sweep mode, see sweep_points()
+        skip (set): Keys of tests that should not be generated
+
+    Returns:
+        Expanded Tests message.
+    """
+    fresh = type(tests)()
+    fresh.test.extend(expand_tests(tests, sweep, mode, skip))
+    return fresh
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+import json
+import os
+import random
+import time
+import uuid
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from encapp_tool._version import __version__
+
+DEFAULT_FRAME_COUNT = 300
+DEFAULT_FRAMERATE = 30.0
+DEFAULT_BITRATE = 1000000
+DEFAULT_RESOLUTION = "1280x720"
+# mean time the emulated encoder spends on one frame
+DEFAULT_PROC_TIME_NS = 8000000
+IFRAME_SIZE_FACTOR = 5
+# SystemLoad samples the gpu at 10 Hz
+GPU_SAMPLE_FREQUENCY = 10
+GPU_MAX_CLOCK = 587
+# result files per sub directory in a corpus
+CORPUS_DIR_SIZE = 1000
+
+
+def parse_bitrate(value, default: int = DEFAULT_BITRATE) -> int:
+    """Parse a bitrate as used in test definitions ("100 kbps", "2M", "300")
+
+    Args:
+        value (str): Bitrate string
+        default (int): Value used when the string is empty
+
+    Returns:
+        Bitrate in bps.
+    """
+    value = str(value).strip()
+    if not value:
+        return default
+    number = value.rstrip("bps").strip()
+    mul = 1
+    if number.endswith("k"):
+        mul = 1000
+        number = number[:-1]
+    elif number.endswith("M"):
+        mul = 1000000
+        number = number[:-1]
+    return int(float(number) * mul)
+
+
+def synthesize_gpu_data(duration_sec: float, rng: random.Random) -> Dict:
+    """Create the gpu_data part of a result (as written by SystemLoad)
+
+    Args:
+        duration_sec (float): Length of the run
+        rng (random.Random): Random source
+
+    Returns:
+        gpu_data dict with gpu info, load and clock series.
+    """
+    samples = max(1, int(round(duration_sec * GPU_SAMPLE_FREQUENCY)))
+    step = 1.0 / GPU_SAMPLE_FREQUENCY
+    # like the app, load samples start one period later than clock samples
+    load = [
+        {
+            "time_sec": round((num + 1) * step, 3),
+            "load_percentage": rng.randint(0, 100),
+        }
+        for num in range(samples)
+    ]
+    clock = [
+        {
+            "time_sec": round(num * step, 3),
+            "clock_MHz": str(rng.choice((257, 345, 427, 587))),
+        }
+        for num in range(samples)
+    ]
+    return {
+        "gpu_model": "Adreno640v2",
+        "gpu_min_clock": "257",
+        "gpu_max_clock": str(GPU_MAX_CLOCK),
+        "gpu_load_percentage": load,
+        "gpu_clock_freq": clock,
+    }
+
+
+def _runtime_changes(test) -> Tuple[Dict, Dict, set]:
+    bitrates = {
+        param.framenum: parse_bitrate(param.bitrate)
+        for param in test.runtime.video_bitrate
+    }
+    framerates = {
+        param.framenum: param.framerate for param in test.runtime.dynamic_framerate
+    }
+    return bitrates, framerates, set(test.runtime.request_sync)
+
+
+def synthesize_result(
+    test,
+    frame_count: int = DEFAULT_FRAME_COUNT,
+    encodedfile: Optional[str] = None,
+    start_ns: Optional[int] = None,
+    seed: Optional[int] = None,
+    gpu: bool = False,
+    decode: bool = False,
+) -> Tuple[Dict, int]:
+    """Create an encapp result (as written by the app) for a test
+
+    Frame sizes follow the configured bitrate, with larger key frames,
+    and encoding times follow DEFAULT_PROC_TIME_NS. Runtime bitrate and
+    framerate changes and sync requests in the test are applied. The
+    numbers are realistic in shape and size, not in value.
+
+    Args:
+        test (tests_pb2.Test): Test that "ran"
+        frame_count (int): Number of encoded frames
+        encodedfile (str): Name of the encoded media file
+        start_ns (int): System.nanoTime() of the first frame
+        seed (int): Random seed, for reproducible results
+        gpu (bool): Add gpu_data
+        decode (bool): Add decoded_frames (as for a transcoding test)
+
+    Returns:
+        Tuple with the result dict and the encoded media size in bytes.
+    """
+    rng = random.Random(seed)
+    # ids stay unique across runs, like the app's random uuids
+    test_id = f"encapp_{uuid.uuid4()}"
+    if encodedfile is None:
+        encodedfile = f"{test_id}.mp4"
+    if start_ns is None:
+        start_ns = time.monotonic_ns() if hasattr(time, "monotonic_ns") else 0
+    configure = test.configure
+    input_fps = test.input.framerate or configure.framerate or DEFAULT_FRAMERATE
+    fps = configure.framerate or input_fps
+    bitrate = parse_bitrate(configure.bitrate)
+    resolution = configure.resolution or test.input.resolution
+    resolution = resolution or DEFAULT_RESOLUTION
+    width, height = (int(val) for val in resolution.split("x"))
+    gop = configure.i_frame_interval if configure.HasField("i_frame_interval") else 1
+    bitrates, framerates, syncs = _runtime_changes(test)
+
+    frames = []
+    total_size = 0
+    target = bitrate
+    current_fps = fps
+    key_distance = max(1, int(round(gop * current_fps)))
+    pts = 0.0
+    original = 0.0
+    last_key = 0
+    for num in range(frame_count):
+        if num in bitrates:
+            target = bitrates[num]
+        if num in framerates:
+            current_fps = framerates[num]
+            key_distance = max(1, int(round(gop * current_fps)))
+        iframe = num == 0 or num - last_key >= key_distance or num in syncs
+        if iframe:
+            last_key = num
+        # p frames get what is left once the key frames took their share
+        p_size = (target / 8.0 / current_fps) * key_distance / (
+            key_distance - 1 + IFRAME_SIZE_FACTOR
+        )
+        size = p_size * (IFRAME_SIZE_FACTOR if iframe else 1)
+        size = max(1, int(rng.gauss(size, size * 0.1)))
+        starttime = start_ns + int(pts * 1000)
+        proctime = max(1, int(rng.gauss(DEFAULT_PROC_TIME_NS, 1000000)))
+        frames.append(
+            {
+                "frame": num + 1,
+                "original_frame": int(original),
+                "iframe": 1 if iframe else 0,
+                "size": size,
+                "pts": int(pts),
+                "proctime": proctime,
+                "starttime": starttime,
+                "stoptime": starttime + proctime,
+            }
+        )
+        total_size += size
+        pts += 1000000 / current_fps
+        # a lower output framerate drops input frames
+        original += input_fps / current_fps
+
+    duration_sec = pts / 1000000
+    result = {
+        "id": test_id,
+        "description": test.common.description,
+        "test": test.common.description,
+        "testdefinition": str(test),
+        "date": time.strftime("%a %b %d %H:%M:%S %Z %Y"),
+        "encapp_version": __version__,
+        "proctime": sum(frame["proctime"] for frame in frames),
+        "framecount": frame_count,
+        "encodedfile": encodedfile,
+        "sourcefile": test.input.filepath.split("/")[-1],
+        "settings": {
+            "codec": configure.codec,
+            "fps": fps,
+            "bitrate": configure.bitrate or str(bitrate),
+            "meanbitrate": int(total_size * 8 / duration_sec) if duration_sec else 0,
+        },
+        "encoder_media_format": {
+            "width": width,
+            "height": height,
+            "frame-rate": fps,
+            "bitrate": bitrate,
+        },
+        "frames": frames,
+    }
+    # the app only lists the settings given in the test definition
+    if configure.HasField("i_frame_interval"):
+        result["settings"]["gop"] = gop
+    if configure.resolution:
+        result["settings"]["width"] = width
+        result["settings"]["height"] = height
+    if decode:
+        result["decoder"] = "c2.android.avc.decoder"
+        result["decoder_media_format"] = {
+            "mime": "video/avc",
+            "width": width,
+            "height": height,
+        }
+        result["decoded_frames"] = [
+            {
+                "frame": frame["frame"],
+                "flags": 1 if frame["iframe"] else 0,
+                "size": width * height * 3 // 2,
+                "pts": frame["pts"],
+                "proctime": frame["proctime"] // 2,
+                "starttime": frame["starttime"] - DEFAULT_PROC_TIME_NS,
+                "stoptime": frame["starttime"] - DEFAULT_PROC_TIME_NS // 2,
+            }
+            for frame in frames
+        ]
+    if gpu:
+        result["gpu_data"] = synthesize_gpu_data(duration_sec, rng)
+    return result, total_size
+
+
+def write_corpus(
+    directory: str,
+    tests: Sequence,
+    file_count: int,
+    frame_count: int = DEFAULT_FRAME_COUNT,
+    parallel: int = 1,
+    gpu: bool = False,
+    media: bool = False,
+    seed: int = 0,
+) -> List[str]:
+    """Write a corpus of synthetic result files, as pulled from devices
+
+    Results go to sub directories of at most CORPUS_DIR_SIZE files, each
+    one looking like the output of one encapp run.
+
+    Args:
+        directory (str): Corpus root
+        tests (list): tests_pb2.Test messages, used round robin
+        file_count (int): Number of result files
+        frame_count (int): Frames per result
+        parallel (int): Number of results sharing a run time window, as
+                        written by parallel tests (different sources)
+        gpu (bool): Add gpu_data to every result
+        media (bool): Also write (sparse) encoded media files
+        seed (int): Random seed
+
+    Returns:
+        Paths to the written result files.
+    """
+    paths = []
+    start_ns = 0
+    for num in range(file_count):
+        test = tests[num % len(tests)]
+        subdir = os.path.join(directory, f"run_{num // CORPUS_DIR_SIZE:04d}")
+        if num % CORPUS_DIR_SIZE == 0:
+            os.makedirs(subdir, exist_ok=True)
+        if parallel > 1 and num % parallel != 0:
+            test = type(test)()
+            test.CopyFrom(tests[num % len(tests)])
+            test.input.filepath = f"{test.input.filepath}.{num % parallel}"
+        else:
+            start_ns += 60 * 1000000000
+        result, size = synthesize_result(
+            test, frame_count, start_ns=start_ns, seed=seed * 1000003 + num, gpu=gpu
+        )
+        path = os.path.join(subdir, f"{result['id']}.json")
+        with open(path, "w") as fd:
+            json.dump(result, fd)
+        if media:
+            with open(os.path.join(subdir, result["encodedfile"]), "wb") as fd:
+                fd.truncate(size)
+        paths.append(path)
+    return paths
+
+
+def write_quality_files(
+    encodedfile: str, frame_count: int, seed: Optional[int] = None
+) -> None:
+    """Write vmaf/ssim/psnr outputs like the ones encapp_quality gets
+    from ffmpeg (<encodedfile>.vmaf, .ssim, .psnr and the per frame
+    .ssim.all and .psnr.all stats files)
+
+    Args:
+        encodedfile (str): Path of the encoded media
+        frame_count (int): Number of frames
+        seed (int): Random seed
+    """
+    rng = random.Random(seed)
+    vmaf = [round(rng.uniform(80, 100), 6) for _ in range(frame_count)]
+    ssim = [round(rng.uniform(0.95, 1.0), 6) for _ in range(frame_count)]
+    mse = [round(rng.uniform(1.0, 10.0), 2) for _ in range(frame_count)]
+    with open(f"{encodedfile}.vmaf", "w") as fd:
+        json.dump(
+            {
+                "version": "2.3.1",
+                "frames": [
+                    {"frameNum": num, "metrics": {"vmaf": val}}
+                    for num, val in enumerate(vmaf)
+                ],
+                "pooled_metrics": {
+                    "vmaf": {
+                        "min": min(vmaf),
+                        "max": max(vmaf),
+                        "mean": sum(vmaf) / frame_count,
+                        "harmonic_mean": frame_count / sum(1 / val for val in vmaf),
+                    }
+                },
+            },
+            fd,
+            indent=4,
+        )
+    with open(f"{encodedfile}.ssim.all", "w") as fd:
+        for num, val in enumerate(ssim):
+            fd.write(
+                f"n:{num + 1} Y:{val:.6f} U:{val:.6f} V:{val:.6f} "
+                f"All:{val:.6f} (20.000000)\n"
+            )
+    mean_ssim = sum(ssim) / frame_count
+    with open(f"{encodedfile}.ssim", "w") as fd:
+        fd.write(
+            "[Parsed_ssim_0 @ 0x5581e7c0] SSIM "
+            f"Y:{mean_ssim:.6f} (20.000000) U:{mean_ssim:.6f} (20.000000) "
+            f"V:{mean_ssim:.6f} (20.000000) All:{mean_ssim:.6f} (20.000000)\n"
+        )
+    with open(f"{encodedfile}.psnr.all", "w") as fd:
+        for num, val in enumerate(mse):
+            fd.write(
+                f"n:{num + 1} mse_avg:{val:.2f} mse_y:{val:.2f} "
+                f"mse_u:{val:.2f} mse_v:{val:.2f} psnr_avg:40.00 "
+                "psnr_y:40.00 psnr_u:40.00 psnr_v:40.00\n"
+            )
+    with open(f"{encodedfile}.psnr", "w") as fd:
+        fd.write(
+            "[Parsed_psnr_0 @ 0x5581e7c0] PSNR y:40.000000 u:40.000000 "
+            "v:40.000000 average:40.000000 min:35.000000 max:45.000000\n"
+        )
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+import contextlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+class Tracer:
+    """Collect timing spans of the host-side phases of an encapp run
+
+    Spans are written as json lines (one object per finished span) and
+    can also be exported in the Chrome trace-event format, which can be
+    loaded in chrome://tracing or https://ui.perfetto.dev.
+    Tracing is disabled (and costs next to nothing) until enable() is
+    called.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.spans = []
+        self.context = {}
+        self._fd = None
+        self._lock = threading.Lock()
+
+    def enable(self, path: Optional[str] = None) -> None:
+        """Start recording spans
+
+        Args:
+            path (str): Optional json lines file to append spans to
+        """
+        self.enabled = True
+        if path is not None:
+            self._fd = open(path, "a")
+
+    def set_context(self, **attrs) -> None:
+        """Set attributes (e.g. serial, test) added to all later spans"""
+        self.context.update(attrs)
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attrs):
+        """Time the enclosed block
+
+        The yielded dict can be used to add attributes known only
+        inside the block, e.g. the number of bytes transferred.
+
+        Args:
+            name (str): Phase name, e.g. "push" or "wait_for_exit"
+            attrs: Span attributes
+        """
+        if not self.enabled:
+            yield {}
+            return
+        record = dict(self.context)
+        record.update(attrs)
+        start = time.time()
+        perf_start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            duration = time.perf_counter() - perf_start
+            record.update(
+                {
+                    "name": name,
+                    "start": start,
+                    "end": start + duration,
+                    "duration": duration,
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                }
+            )
+            self._add(record)
+
+    def _add(self, record: Dict) -> None:
+        with self._lock:
+            self.spans.append(record)
+            if self._fd is not None:
+                self._fd.write(json.dumps(record) + "\n")
+                self._fd.flush()
+
+    def chrome_trace(self) -> Dict:
+        """Get the recorded spans as a Chrome trace-event object"""
+        events = []
+        for record in self.spans:
+            args = {
+                key: val
+                for key, val in record.items()
+                if key not in ("name", "start", "end", "duration", "pid", "tid")
+            }
+            events.append(
+                {
+                    "name": record["name"],
+                    "ph": "X",
+                    "ts": int(record["start"] * 1e6),
+                    "dur": int(record["duration"] * 1e6),
+                    "pid": record["pid"],
+                    "tid": record["tid"],
+                    "args": args,
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path: str) -> None:
+        """Write the recorded spans in Chrome trace-event format"""
+        with open(path, "w") as fd:
+            json.dump(self.chrome_trace(), fd)
+
+    def close(self) -> None:
+        """Stop recording and close the json lines file"""
+        self.enabled = False
+        if self._fd is not None:
+            self._fd.close()
+            self._fd = None
+
+    def reset(self) -> None:
+        """Stop recording and drop the recorded spans and the context"""
+        self.close()
+        with self._lock:
+            self.spans = []
+        self.context = {}
+
+
+# process-wide tracer used by encapp_tool and the encapp scripts
+TRACER = Tracer()
+
+
+def span(name: str, **attrs):
+    """Time a block with the process-wide tracer (see Tracer.span())"""
+    return TRACER.span(name, **attrs)
+
+
+def summarize(spans: List[Dict]) -> Dict[str, Dict]:
+    """Aggregate spans per name
+
+    Args:
+        spans (list): Span records, e.g. read back from a json lines trace
+
+    Returns:
+        Map from span name to count, total/max duration and bytes.
+    """
+    summary = {}
+    for record in spans:
+        item = summary.setdefault(
+            record["name"], {"count": 0, "total": 0.0, "max": 0.0, "bytes": 0}
+        )
+        item["count"] += 1
+        item["total"] += record["duration"]
+        item["max"] = max(item["max"], record["duration"])
+        item["bytes"] += record.get("bytes", 0)
+    return summary
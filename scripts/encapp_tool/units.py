@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+import sys
+from typing import Union
+
+
+def is_int(value: Union[int, str]) -> bool:
+    """Check if a value is an int or a string with an int
+
+    Args:
+        value: int or string, e.g. "-30"
+
+    Returns:
+        True if the value is an int.
+    """
+    if isinstance(value, int):
+        return True
+    return value[1:].isdigit() if value[0] in ("-", "+") else value.isdigit()
+
+
+def convert_to_bps(value: Union[int, str]) -> int:
+    """Convert a bitrate to bits per second
+
+    Args:
+        value: bps as an int, or a string with a k or M suffix, e.g. "500k"
+
+    Returns:
+        Bitrate in bps.
+    """
+    if isinstance(value, str):
+        mul = 1
+        index = value.rfind("k")
+        if index == -1:
+            index = value.rfind("M")
+            if index > 0:
+                mul = 1000000
+            elif index == -1:
+                # plain bps
+                return int(value)
+        elif index > 0:
+            mul = 1000
+        return int(value[0:index]) * mul
+    return int(value)
+
+
+def convert_to_frames(value: Union[int, str], fps: float = 30) -> int:
+    """Convert a value in either time or frame units into frame units
+
+    Args:
+        value: Frame count, or a duration humanfriendly can parse (e.g. "2s")
+        fps (float): Frame rate used for durations
+
+    Returns:
+        Frame count, exits on values that cannot be parsed.
+    """
+    if is_int(value):
+        # value is already fps
+        return int(value)
+    # only needed for durations, and slow to import
+    import humanfriendly
+
+    # check if it can be parsed as a duration (time)
+    try:
+        sec = humanfriendly.parse_timespan(value)
+    except humanfriendly.InvalidTimespan:
+        print('error: invalid frame value "%s"' % value)
+        sys.exit(-1)
+    return int(sec * fps)
@@ -3,22 +3,33 @@
 """
     Verify tests
 """
-import argparse
+
 import sys
-import json
-import os
-import re
-import shutil
-from datetime import datetime
-import pandas as pd
-import numpy as np
-
-import encapp as ep
-import encapp_search as es
-from encapp_tool.adb_cmds import run_cmd, get_device_info
-from encapp import convert_to_bps
-from google.protobuf import text_format
-import proto.tests_pb2 as proto
+
+from encapp_tool.daemon import forward_to_daemon
+
+# hand the command over to a running encapp daemon (see encapp_daemon.py)
+# before paying for the imports below
+if __name__ == '__main__':
+    forward_to_daemon('verify', sys.argv)
+
+import argparse  # noqa: E402
+import json  # noqa: E402
+import os  # noqa: E402
+import re  # noqa: E402
+import shutil  # noqa: E402
+from concurrent.futures import ProcessPoolExecutor  # noqa: E402
+from datetime import datetime  # noqa: E402
+from itertools import groupby, repeat  # noqa: E402
+import pandas as pd  # noqa: E402
+import numpy as np  # noqa: E402
+
+import encapp_search as es  # noqa: E402
+from encapp_tool import nal_parser  # noqa: E402
+from encapp_tool.adb_cmds import get_device_info  # noqa: E402
+from encapp_tool.units import convert_to_bps  # noqa: E402
+from google.protobuf import text_format  # noqa: E402
+import proto.tests_pb2 as proto  # noqa: E402
 
 DEFAULT_TESTS = ['bitrate_buffer.pbtxt',
                  'bitrate_surface.pbtxt',
@@ -41,30 +52,11 @@ def parse_schema(schema):
 
 
 def get_nal_data(videopath, codec):
-    ending = ''
-    if codec.find('avc') or codec.find('h264') or codec.find('264'):
-        ending = '264'
-    elif codec.find('hevc') or codec.find('h265') or codec.find('265'):
-        ending = '265'
-    if len(ending) > 0:
-        filename = os.path.splitext(videopath)[0]
-        if not os.path.exists(f'{filename}.{ending}.nal'):
-            if ending == '264':
-                cmd = (f'ffmpeg -i {videopath} -c copy -bsf:v h264_mp4toannexb'
-                       f' {filename}.{ending}')
-                run_cmd(cmd, True)
-                cmd = f'h264nal {filename}.{ending} > {filename}.{ending}.nal'
-            else:
-                cmd = (f'ffmpeg -i {videopath} -c copy -bsf:v hevc_mp4toannexb'
-                       f' {filename}.{ending}')
-                run_cmd(cmd, True)
-                cmd = f'h265nal {filename}.{ending} > {filename}.{ending}.nal'
-
-            print(f'cmd = {cmd}')
-            run_cmd(cmd)
-        return f'{filename}.{ending}.nal'
-
-    return ''
+    # parsed in process and cached next to the media file
+    if not os.path.exists(videopath):
+        print(f'ERROR: {videopath} does not exist')
+        return None
+    return nal_parser.get_nal_data(videopath, codec)
 
 
 def find_frame(frame, rfid, frame_list, count):
@@ -76,11 +68,43 @@ def find_frame(frame, rfid, frame_list, count):
                 return frame + index
     return -1
 
+
+# columns of the verification records, the context columns (codec and
+# onwards) are only set where they apply
+RECORD_FIELDS = ['check', 'test', 'subtest', 'file', 'metric', 'target',
+                 'measured', 'error_perc', 'passed', 'codec', 'height', 'fps',
+                 'first_frame', 'last_frame']
+
+
+def make_record(check, test, subtest, file, metric, target=None,
+                measured=None, error_perc=None, passed=None, **context):
+    record = dict.fromkeys(RECORD_FIELDS)
+    record.update(check=check, test=test, subtest=subtest, file=file,
+                  metric=metric, target=target, measured=measured,
+                  error_perc=error_perc, passed=passed)
+    record.update(context)
+    return record
+
+
+def group_by_file(records):
+    # records of a file are adjacent
+    return [list(group) for _, group in groupby(records, lambda x: x['file'])]
+
+
+def join_lines(lines):
+    return ''.join(f'\n{line}' for line in lines)
+
+
+def status_string(passed):
+    return 'passed' if passed else 'failed'
+
+
 # TODO: fix ltr
+LTR_FRAME_RANGE = 2
 
 
-def check_long_term_ref(resultpath):
-    result_string = ''
+def verify_long_term_ref(result, test, file):
+    records = []
 
     '''
       "vendor.qti-ext-enc-ltr.mark-frame": {
@@ -96,149 +120,124 @@ def check_long_term_ref(resultpath):
           "180": "0"
         }
     '''
-    for file in resultpath:
-        with open(file) as resultfile:
-            result = json.load(resultfile)
-            directory, __ = os.path.split(file)
-            encoder_settings = result.get('settings')
-            testname = result.get('test')
-
-            mark_frame = None
-            use_frame = None
-
-            test_def = result.get('testdefinition')
-            test = text_format.Parse(test_def, proto.Test())
-
-            dynamics = parse_dynamic_settings(test.runtime)['params']
-
-            if dynamics is not None and len(dynamics) > 0:
-                mark_frame = dynamics['vendor.qti-ext-enc-ltr.mark-frame']
-                use_frame = dynamics['vendor.qti-ext-enc-ltr.use-frame']
-
-            reg_long_term_id = 'long_term_frame_idx { ([0-9]*) }'
-            reg_long_pic_id = 'long_term_pic_num { ([0-9]*) }'
-            reg_max_num_ref_frames = 'max_num_ref_frames: ([0-9]*)'
-            lt_mark = {}
-            lt_use = {}
-            if mark_frame is not None and use_frame is not None:
-                nal_file = get_nal_data(f'{directory}/'
-                                        f"{result.get('encodedfile')}",
-                                        encoder_settings.get('codec'))
-                ltr_count = -1
-                frame = 0
-                with open(nal_file) as nal:
-                    line = '-1'
-                    while len(line) > 0:
-                        line = nal.readline()
-                        if line.find('frame_num:') != -1:
-                            # if frame < 4:
-                            #    print(f'frame: {frame} - {line}')
-                            frame += 1
-                            match = re.search(reg_long_term_id, line)
-                            if match:
-                                num = match.group(1)
-                                lt_mark[frame] = num
-                                continue
-                            match = re.search(reg_long_pic_id, line)
-                            if match:
-                                num = match.group(1)
-                                lt_use[frame] = num
-                                continue
-                        match = re.search(reg_max_num_ref_frames, line)
-                        if match:
-                            num = int(match.group(1)) - 1
-                            if ltr_count != -1:
-                                print(
-                                    'ERROR: ltr count appears multiple times, '
-                                    f'{ltr_count} -> {num}')
-                            ltr_count = num
-                            continue
-                # ltr refs are flushed after an I frame
-                frames = result.get('frames')
-                iframes = list(filter(lambda x: (x['iframe'] == 1), frames))
-                result_string += f'\n\n----- test case: [{testname}] -----'
-                # each mark frame will cause a use frame so merge the mark
-                # with the use
-
-                for frame in iframes:
-                    lt_mark[frame['frame']] = 0  # implicit marking of 0th
-                    for ltr in range(0, ltr_count - 1, 1):
-                        mark_frame[frame['original_frame'] + ltr] = ltr
-                        use_frame[frame['original_frame'] + ltr_count + 1] = ltr
-
-                ok_range = 2
-                matching = {}
-
-                result_string += f'\nLtr frame count: {ltr_count}'
-                result_string += '\n(1) Verify long term reference mark'
-
-                # Check 'mark' frames
-                for frame in sorted(mark_frame.keys()):
-                    frame_match = find_frame(
-                        frame, mark_frame[frame], lt_mark, ok_range)
-                    if frame_match != -1:
-                        matching[frame] = frame_match
-
-                not_found = {}
-                for frame in sorted(mark_frame.keys()):
-                    if not (frame in matching.keys()):
-                        not_found[frame] = mark_frame[frame]
-
-                if len(matching) > 0:
-                    result_string += ('\nMarked ltr frames correct (within '
-                                      f'{ok_range} frames)')
-                    for frame in matching.keys():
-                        result_string += (
-                            f'\nframe: {frame} as {matching[frame]} id: '
-                            f'{mark_frame[frame]}')
-                if len(not_found) > 0:
-                    result_string += ('\nFollowing mark ltr frames not found '
-                                      f'(within {ok_range})')
-                    for frame in sorted(not_found.keys()):
-                        result_string += f'\n{frame} id:{not_found[frame]}'
-
-                # Check 'use' frames
-                matching = {}
-                for frame in sorted(use_frame.keys()):
-                    frame_match = find_frame(
-                        frame, use_frame[frame], lt_use, ok_range)
-                    if frame_match != -1:
-                        matching[frame] = frame_match
-                # How many missed?
-                not_found = {}
-                for frame in sorted(use_frame.keys()):
-                    if not (frame in matching.keys()):
-                        not_found[frame] = use_frame[frame]
-                result_string += '\n(2) Verify long term reference use setting'
-                if len(matching) > 0:
-                    result_string += ('\nUsed ltr frames correct (within '
-                                      f'{ok_range})')
-                    for frame in matching:
-                        result_string += (
-                            f'\nframe: {frame} as {matching[frame]} id: '
-                            f'{use_frame[frame]}')
-
-                if len(not_found) > 0:
-                    result_string += ('\nFollowing ltr use frames not '
-                                      f'found (within {ok_range} frames):')
-                    for frame in sorted(not_found.keys()):
-                        result_string += f'\n{frame} id:{not_found[frame]}'
-
-                # What was found
-                result_string += '\n\nMarked in media:'
-                for val in lt_mark:
-                    result_string += ('\nframe {:4d} - id: {:d}'
-                                      .format(val, int(lt_mark[val])))
-                result_string += '\nUsed in media:'
-                for val in lt_use:
-                    result_string += ('\nframe {:4d} - id: {:d}'
-                                      .format(val, int(lt_use[val])))
-
-                if len(iframes) > 0:
-                    result_string += '\nKey frames:\n'
-                    for frame in iframes:
-                        result_string += f"{frame['frame']}\n"
-    return result_string
+    directory, resultfilename = os.path.split(file)
+    encoder_settings = result.get('settings')
+    testname = result.get('test')
+
+    dynamics = parse_dynamic_settings(test.runtime)['params']
+    if (dynamics is None or
+            'vendor.qti-ext-enc-ltr.mark-frame' not in dynamics or
+            'vendor.qti-ext-enc-ltr.use-frame' not in dynamics):
+        return records
+    mark_frame = {frame: int(val) for frame, val in
+                  dynamics['vendor.qti-ext-enc-ltr.mark-frame'].items()}
+    use_frame = {frame: int(val) for frame, val in
+                 dynamics['vendor.qti-ext-enc-ltr.use-frame'].items()}
+
+    nal = get_nal_data(f'{directory}/'
+                       f"{result.get('encodedfile')}",
+                       encoder_settings.get('codec'))
+    if nal is None:
+        return records
+    ltr_count = -1
+    for num in nal['max_num_ref_frames']:
+        if ltr_count != -1 and ltr_count != num - 1:
+            print('ERROR: ltr count appears multiple times, '
+                  f'{ltr_count} -> {num - 1}')
+        ltr_count = num - 1
+    lt_mark = {}
+    lt_use = {}
+    frame = 0
+    for first_slice, lt_idx, lt_num in zip(
+            nal['first_slice'], nal['long_term_frame_idx'],
+            nal['long_term_pic_num']):
+        if not first_slice:
+            continue
+        frame += 1
+        if lt_idx != -1:
+            lt_mark[frame] = lt_idx
+        elif lt_num != -1:
+            lt_use[frame] = lt_num
+    # ltr refs are flushed after an I frame
+    frames = result.get('frames')
+    iframes = list(filter(lambda x: (x['iframe'] == 1), frames))
+    # each mark frame will cause a use frame so merge the mark
+    # with the use
+    for frame in iframes:
+        lt_mark[frame['frame']] = 0  # implicit marking of 0th
+        for ltr in range(0, ltr_count - 1, 1):
+            mark_frame[frame['original_frame'] + ltr] = ltr
+            use_frame[frame['original_frame'] + ltr_count + 1] = ltr
+
+    def record(subtest, metric, **kwargs):
+        return make_record('ltr', testname, subtest, resultfilename, metric,
+                           **kwargs)
+
+    records.append(record('Ltr frame count', 'ltr_count',
+                          measured=ltr_count))
+    for subtest, settings, media in (('Long term reference mark',
+                                      mark_frame, lt_mark),
+                                     ('Long term reference use',
+                                      use_frame, lt_use)):
+        for frame in sorted(settings.keys()):
+            frame_match = find_frame(
+                frame, settings[frame], media, LTR_FRAME_RANGE)
+            found = frame_match != -1
+            records.append(record(
+                subtest, 'ltr_id', target=settings[frame],
+                measured=media[frame_match] if found else None,
+                passed=found, first_frame=frame,
+                last_frame=frame_match if found else None))
+    # What was found
+    for metric, media in (('media_mark', lt_mark), ('media_use', lt_use)):
+        for frame in media:
+            records.append(record('Media', metric, measured=media[frame],
+                                  first_frame=frame))
+    for frame in iframes:
+        records.append(record('Media', 'key_frame',
+                              first_frame=frame['frame']))
+    return records
+
+
+def format_long_term_ref(records):
+    lines = []
+    for file_records in group_by_file(records):
+        lines.append(f"\n----- test case: [{file_records[0]['test']}] -----")
+        for item in file_records:
+            if item['metric'] == 'ltr_count':
+                lines.append(f"Ltr frame count: {item['measured']}")
+        for index, (subtest, verb) in enumerate(
+                (('Long term reference mark', 'Marked'),
+                 ('Long term reference use', 'Used'))):
+            checked = [item for item in file_records
+                       if item['subtest'] == subtest]
+            lines.append(f'({index + 1}) Verify {subtest.lower()}')
+            found = [item for item in checked if item['passed']]
+            if len(found) > 0:
+                lines.append(f'{verb} ltr frames correct (within '
+                             f'{LTR_FRAME_RANGE} frames)')
+                for item in found:
+                    lines.append(f"frame: {item['first_frame']} as "
+                                 f"{item['last_frame']} id: {item['target']}")
+            not_found = [item for item in checked if not item['passed']]
+            if len(not_found) > 0:
+                lines.append(f'Following {verb.lower()} ltr frames not found '
+                             f'(within {LTR_FRAME_RANGE} frames)')
+                for item in not_found:
+                    lines.append(f"{item['first_frame']} id:{item['target']}")
+        for metric, header in (('media_mark', '\nMarked in media:'),
+                               ('media_use', 'Used in media:')):
+            lines.append(header)
+            for item in file_records:
+                if item['metric'] == metric:
+                    lines.append('frame {:4d} - id: {:d}'.format(
+                        item['first_frame'], item['measured']))
+        key_frames = [str(item['first_frame']) for item in file_records
+                      if item['metric'] == 'key_frame']
+        if len(key_frames) > 0:
+            lines.append('Key frames:')
+            lines.extend(key_frames)
+    return join_lines(lines)
 
 
 def get_config_param(config, param_name):
@@ -247,109 +246,171 @@ def get_config_param(config, param_name):
             return param.value
 
 
-def check_temporal_layer(resultpath):
-    result_string = ''
-
-    for file in resultpath:
-        with open(file) as resultfile:
-            result = json.load(resultfile)
-            _, resultfilename = os.path.split(file)
-            testname = result.get('test')
-            encoder_settings = result.get('settings')
-            schema = encoder_settings.get('ts-schema')
-
-            test_def = result.get('testdefinition')
-            test = text_format.Parse(test_def, proto.Test())
-            schema = get_config_param(test.configure, 'ts-schema')
-            if not isinstance(schema, type(None)) and len(schema) > 0:
-                frames = result.get('frames')
-                layer_count = parse_schema(schema)
-                layer_size = []
-                for index in range(0, layer_count):
-                    layer = list(filter(lambda x: ((x['frame'] + index) %
-                                                   layer_count), frames))
-                    accum = 0
-                    for item in layer:
-                        accum += item['size']
-
-                    layer_size.append([index, accum])
-                total_size = 0
-                for size in layer_size:
-                    total_size += size[1]
-
-                result_string += f'\n\n----- test case: [{testname}] -----'
-                for size in layer_size:
-                    if total_size > 0:
-                        ratio = size[1] / total_size
-                        result_string += ('\nlayer {:d}:{:3d}%, {:s}'
-                                          .format(size[0],
-                                                  int(round(ratio * 100, 0)),
-                                                  resultfilename))
-
-    return result_string
+def temporal_layer_ids(iframes, layer_count):
+    # layer of every frame for a dyadic android.generic.N schema, e.g.
+    # 0,2,1,2,0,2,1,2... for N=3. The pattern restarts at key frames.
+    iframes = np.asarray(iframes) == 1
+    index = np.arange(len(iframes))
+    last_key = np.maximum.accumulate(np.where(iframes, index, 0))
+    period = 1 << (layer_count - 1)
+    pos = (index - last_key) % period
+    # the layer is given by the number of trailing zero bits of pos
+    lowest_bit = pos & -pos
+    trailing_zeros = np.log2(np.maximum(lowest_bit, 1)).astype(int)
+    return np.where(pos == 0, 0, layer_count - 1 - trailing_zeros)
+
+
+def temporal_layer_stats(frames, layer_count):
+    data = pd.DataFrame(frames)
+    layers = temporal_layer_ids(data['iframe'].values, layer_count)
+    sizes = data['size'].values
+    layer_bytes = np.bincount(layers, weights=sizes, minlength=layer_count)
+    layer_frames = np.bincount(layers, minlength=layer_count)
+    latency = np.bincount(
+        layers, weights=(data['stoptime'] - data['starttime']).values,
+        minlength=layer_count)
+    latency = latency / np.maximum(layer_frames, 1) / 1000000
+    duration_sec = max((data['pts'].iloc[-1] - data['pts'].iloc[0]) / 1000000,
+                       1e-6)
+    # per layer bitrate in every second of the stream
+    # pts are not in order with b-frames, so count from the first one
+    seconds = ((data['pts'].values - data['pts'].min()) //
+               1000000).astype(int)
+    per_second = np.bincount(seconds * layer_count + layers,
+                             weights=sizes * 8,
+                             minlength=(seconds.max() + 1) * layer_count)
+    per_second = per_second.reshape(-1, layer_count)
+    return {
+        'bytes': layer_bytes,
+        'frames': layer_frames,
+        'bitrate': layer_bytes * 8 / duration_sec,
+        'bitrate_per_second': per_second,
+        'latency_ms': latency,
+    }
 
 
-def check_idr_placement(resultpath):
-    result_string = ''
-    status = []
-
-    for file in resultpath:
-        with open(file) as resultfile:
-            result = json.load(resultfile)
-            _, resultfilename = os.path.split(file)
-            encoder_settings = result.get('settings')
-            testname = result.get('test')
-            frames = result.get('frames')
-
-            iframes = list(filter(lambda x: (x['iframe'] == 1), frames))
-            idr_ids = []
-            # gop, either static gop or distance from last?
-            gop = encoder_settings.get('gop')
-            if gop <= 0:
-                print('gop is missing')
-                gop = 1
-            fps = encoder_settings.get('fps')
-            if fps <= 0:
-                print('fps is missing')
-                fps = 30
-            for frame in iframes:
-                idr_ids.append(frame['frame'])
-
-            test_def = result.get('testdefinition')
-            test = text_format.Parse(test_def, proto.Test())
-
-            dynamic_sync = parse_dynamic_settings(test.runtime)['syncs']
-            if dynamic_sync is not None:
-                passed = True
-                for item in dynamic_sync:
-                    if int(item) not in idr_ids:
-                        passed = False
-
-                    status.append([testname, 'Runtime sync request', passed,
-                                   item, resultfilename])
-            frame_gop = gop * fps
-            passed = True
-            if frame_gop < len(frames):
-                for frame in idr_ids:
-                    if frame % frame_gop != 0:
-                        passed = False
-            # TODO: check for missing key frames
-            status.append([testname, 'Even gop', passed, gop, resultfilename])
-
-    labels = ['test', 'subtest', 'passed', 'gop', 'file']
-    data = pd.DataFrame.from_records(status, columns=labels, coerce_float=True)
-    data = data.sort_values(by=['gop'])
-    test_names = np.unique(data['test'])
-    for name in test_names:
-        result_string += f'\n\n----- test case: [{testname}] -----'
-        files = data.loc[data['test'] == name]
+def verify_temporal_layer(result, test, file):
+    records = []
+
+    _, resultfilename = os.path.split(file)
+    testname = result.get('test')
+    encoder_settings = result.get('settings')
+    schema = encoder_settings.get('ts-schema')
+
+    schema = get_config_param(test.configure, 'ts-schema')
+    frames = result.get('frames')
+    if (not isinstance(schema, type(None)) and len(schema) > 0 and
+            len(frames) > 0):
+        layer_count = parse_schema(schema)
+        if layer_count < 1:
+            return records
+        stats = temporal_layer_stats(frames, layer_count)
+        total_size = np.sum(stats['bytes'])
+        if total_size <= 0:
+            return records
+
+        for index in range(layer_count):
+            per_second = stats['bitrate_per_second'][:, index]
+            measured = {
+                'size_perc': 100 * stats['bytes'][index] / total_size,
+                'frames': stats['frames'][index],
+                'bitrate': stats['bitrate'][index],
+                'min_bitrate': np.min(per_second),
+                'max_bitrate': np.max(per_second),
+                'latency_ms': stats['latency_ms'][index],
+            }
+            for metric, value in measured.items():
+                records.append(make_record(
+                    'temporal', testname, f'layer {index}', resultfilename,
+                    metric, measured=float(value)))
+    return records
+
+
+def format_temporal_layer(records):
+    lines = []
+    for file_records in group_by_file(records):
+        lines.append(f"\n----- test case: [{file_records[0]['test']}] -----")
+        layers = {}
+        for item in file_records:
+            layers.setdefault(item['subtest'], {})[item['metric']] = (
+                item['measured'])
+        for subtest, layer in layers.items():
+            lines.append(
+                '{:s}:{:3d}%, {:5d} frames, {:6d}kbps '
+                '({:d}-{:d}kbps), {:.2f} ms, {:s}'
+                .format(subtest, int(round(layer['size_perc'], 0)),
+                        int(layer['frames']),
+                        int(layer['bitrate'] / 1000),
+                        int(layer['min_bitrate'] / 1000),
+                        int(layer['max_bitrate'] / 1000),
+                        layer['latency_ms'],
+                        file_records[0]['file']))
+    return join_lines(lines)
+
+
+def verify_idr_placement(result, test, file):
+    records = []
+
+    _, resultfilename = os.path.split(file)
+    encoder_settings = result.get('settings')
+    testname = result.get('test')
+    frames = result.get('frames')
+
+    iframes = list(filter(lambda x: (x['iframe'] == 1), frames))
+    idr_ids = []
+    # gop, either static gop or distance from last?
+    gop = encoder_settings.get('gop', 0)
+    if gop <= 0:
+        print('gop is missing')
+        gop = 1
+    fps = encoder_settings.get('fps', 0)
+    if fps <= 0:
+        print('fps is missing')
+        fps = 30
+    for frame in iframes:
+        idr_ids.append(frame['frame'])
+
+    dynamic_sync = parse_dynamic_settings(test.runtime)['syncs']
+    if dynamic_sync is not None:
+        for item in dynamic_sync:
+            passed = int(item) in idr_ids
+            records.append(make_record(
+                'idr', testname, 'Runtime sync request', resultfilename,
+                'key_frame', target=int(item),
+                measured=int(item) if passed else None, passed=passed))
+    frame_gop = gop * fps
+    passed = True
+    if frame_gop < len(frames):
+        for frame in idr_ids:
+            if frame % frame_gop != 0:
+                passed = False
+    # TODO: check for missing key frames
+    records.append(make_record('idr', testname, 'Even gop', resultfilename,
+                               'gop', target=gop, passed=passed))
+    return records
+
+
+def format_table(records, row_format, footer=None):
+    # one section per test, rows sorted by target
+    lines = []
+    if len(records) == 0:
+        return lines
+    data = pd.DataFrame.from_records(records, columns=RECORD_FIELDS)
+    data = data.sort_values(by=['target'], kind='stable')
+    for name, files in data.groupby('test', sort=True):
+        lines.append(f'\n----- test case: [{name}] -----')
         for row in files.itertuples():
-            result_string += ('\n{:s} "{:s}" at {:2d} frames, {:s}'
-                              .format({True: 'passed', False: 'failed'}
-                                      [row.passed], row.subtest, row.gop,
-                                      row.file))
+            lines.append(row_format(row))
+        if footer is not None:
+            lines.append(footer)
+    return lines
 
-    return result_string
+
+def format_idr_placement(records):
+    return join_lines(format_table(
+        records, lambda row: '{:s} "{:s}" at {:2d} frames, {:s}'.format(
+            status_string(row.passed), row.subtest, int(row.target),
+            row.file)))
 
 
 def parse_dynamic_settings(settings):
@@ -394,233 +455,191 @@ def parse_dynamic_settings(settings):
 ERROR_LIMIT = 5
 
 
-def check_mean_bitrate_deviation(resultpath):
-    result_string = ''
-    bitrate_error = []
-
-    for file in resultpath:
-        with open(file) as resultfile:
-            result = json.load(resultfile)
-            _, resultfilename = os.path.split(file)
-            encoder_settings = result.get('settings')
-            codec = encoder_settings.get('codec')
-            testname = result.get('test')
-            bitrate = convert_to_bps(encoder_settings.get('bitrate'))
-            fps = encoder_settings.get('fps')
-
-            test_def = result.get('testdefinition')
-            test = text_format.Parse(test_def, proto.Test())
-            parse_dynamic_settings(test.runtime)
-            dynamic_video_bitrate = parse_dynamic_settings(test.runtime)[
-                'bitrates']
-
-            if (dynamic_video_bitrate is not None
-               and len(dynamic_video_bitrate) > 0):
-                frames = result.get('frames')
-                previous_limit = 0
-                dyn_data = []
-                target_bitrate = bitrate
-                limits = list(dynamic_video_bitrate.keys())
-                limits.append(frames[-1]['frame'])
-                status = 'passed'
-                limit_too_high = False
-                for limit in limits:
-                    if limit > len(frames):
-                        limit_too_high = True
-                    filtered = list(filter(lambda x: (x['frame'] >=
-                                                      int(previous_limit) and
-                                                      x['frame'] < int(limit)),
-                                           frames))
-                    accum = 0
-                    for item in filtered:
-                        accum += item['size']
-                    # Calc mean in bits per second
-                    num = len(filtered)
-                    if num > 0:
-                        mean = (fps * 8 * accum / num)
-                    else:
-                        mean = 0
-                    ratio = mean / target_bitrate
-                    bitrate_error_perc = int((ratio - 1) * 100)
-                    if abs(bitrate_error_perc) > ERROR_LIMIT:
-                        status = 'failed'
-                    dyn_data.append([int(previous_limit), int(limit),
-                                     int(target_bitrate), int(round(mean, 0)),
-                                     int(round(bitrate_error_perc, 0))])
-                    if limit in dynamic_video_bitrate:
-                        target_bitrate = convert_to_bps(
-                            dynamic_video_bitrate[limit])
-                    previous_limit = limit
-                result_string += f'\n\n----- test case: [{testname}] -----'
-
-                result_string += (f'\n{status} "Dynamic bitrate", ')
-                result_string += (f" codec: {encoder_settings.get('codec')}"
-                                  f", {encoder_settings.get('height')}"
-                                  f'p @ {fps}fps'
-                                  f', {resultfilename}')
-
-                if limit_too_high:
-                    result_string += (
-                        f'\nERROR: limit higher than available frames '
-                        f'({len(frames)}), adjust test case')
-                for item in dyn_data:
-                    result_string += ('\n      {:3d}% error in {:4d}:{:4d} '
-                                      '({:4d}kbps) for {:4d}kbps'
-                                      .format(item[4], item[0], item[1],
-                                              int(item[3] / 1000),
-                                              int(item[2] / 1000)))
-                result_string += f'\n      (limit set to {ERROR_LIMIT}%)'
+def verify_mean_bitrate_deviation(result, test, file):
+    records = []
+
+    _, resultfilename = os.path.split(file)
+    encoder_settings = result.get('settings')
+    codec = encoder_settings.get('codec')
+    testname = result.get('test')
+    bitrate = convert_to_bps(encoder_settings.get('bitrate'))
+    fps = encoder_settings.get('fps')
+    context = {'codec': codec, 'height': encoder_settings.get('height'),
+               'fps': fps}
+
+    dynamic_video_bitrate = parse_dynamic_settings(test.runtime)[
+        'bitrates']
+
+    if (dynamic_video_bitrate is not None
+       and len(dynamic_video_bitrate) > 0):
+        frames = result.get('frames')
+        previous_limit = 0
+        target_bitrate = bitrate
+        limits = list(dynamic_video_bitrate.keys())
+        limits.append(frames[-1]['frame'])
+        records.append(make_record(
+            'bitrate', testname, 'Dynamic bitrate', resultfilename,
+            'frame_count', target=max(limits), measured=len(frames),
+            passed=max(limits) <= len(frames), **context))
+        for limit in limits:
+            filtered = list(filter(lambda x: (x['frame'] >=
+                                              int(previous_limit) and
+                                              x['frame'] < int(limit)),
+                                   frames))
+            accum = 0
+            for item in filtered:
+                accum += item['size']
+            # Calc mean in bits per second
+            num = len(filtered)
+            if num > 0:
+                mean = (fps * 8 * accum / num)
             else:
-                mean_bitrate = encoder_settings.get('meanbitrate')
-                ratio = mean_bitrate / bitrate
-                bitrate_error_perc = int((ratio - 1) * 100)
-                bitrate_error.append([testname, bitrate_error_perc,
-                                      int(bitrate), mean_bitrate,
-                                      codec, encoder_settings.get('height'),
-                                      fps, resultfilename])
-
-    labels = ['test', 'error', 'bitrate', 'real_bitrate',
-              'codec', 'height', 'fps', 'file']
-    data = pd.DataFrame.from_records(bitrate_error, columns=labels,
-                                     coerce_float=True)
-    data = data.sort_values(by=['bitrate'])
-    test_names = np.unique(data['test'])
-    for name in test_names:
-        result_string += f'\n\n----- test case: [{testname}] -----'
-        files = data.loc[data['test'] == name]
-        for row in files.itertuples():
-            status = 'passed'
-            if abs(row.error) > ERROR_LIMIT:
-                status = 'failed'
-            result_string += (
-                '\n{:s} "Bitrate accuracy" {:3d} % error for '
-                '{:4d}kbps ({:4d}kbps), codec: {:s}, {:4d}p @ {:.2f} fps, {:s}'
-                .format(status,
-                        row.error, int(row.bitrate / 1000),
-                        int(row.real_bitrate / 1000),
-                        row.codec,
-                        row.height,
-                        row.fps,
-                        row.file))
-        result_string += f'\n      (limit set to {ERROR_LIMIT}%)'
-
-    return result_string
-
-
-
-def check_framerate_deviation(resultpath):
-    result_string = ''
-    framerate_error = []
-
-    for file in resultpath:
-        with open(file) as resultfile:
-            result = json.load(resultfile)
-            _, resultfilename = os.path.split(file)
-            encoder_settings = result.get('settings')
-            codec = encoder_settings.get('codec')
-            testname = result.get('test')
-            bitrate = convert_to_bps(encoder_settings.get('bitrate'))
-            fps = encoder_settings.get('fps')
-
-            test_def = result.get('testdefinition')
-            test = text_format.Parse(test_def, proto.Test())
-            parse_dynamic_settings(test.runtime)
-            dynamic_video_framerates = parse_dynamic_settings(test.runtime)[
-                'framerates']
-            frames = result.get('frames')
-            print(f"dyn frmrate: {dynamic_video_framerates}")
-            if (dynamic_video_framerates is not None
-               and len(dynamic_video_framerates) > 0):
-                previous_limit = 0
-                dyn_data = []
-                limits = list(dynamic_video_framerates.keys())
-                limits.append(frames[-1]['original_frame'])
-                status = 'passed'
-                limit_too_high = False
-                target_rate = fps
-                for limit in limits:
-                    if limit > len(frames):
-                        limit_too_high = True
-                    filtered = list(filter(lambda x: (x['original_frame'] >=
-                                                      int(previous_limit) and
-                                                      x['original_frame'] < int(limit)),
-                                           frames))
-                    frame1 = filtered[0]
-                    frame2 = filtered[-1]
-                    actual_framerate, deviation_perc = calcFrameRate(frame1,
-                                                                     frame2,
-                                                                     target_rate)
-                    if abs(deviation_perc) > ERROR_LIMIT:
-                        status = 'failed'
-                    dyn_data.append([int(previous_limit), int(limit),
-                                     target_rate, round(actual_framerate, 2),
-                                     int(round(deviation_perc, 0))])
-
-                    previous_limit = limit
-                    if limit in dynamic_video_framerates:
-                        target_rate = dynamic_video_framerates[limit]
-
-                print(f"Dyn data = {dyn_data}")
-                result_string += f'\n\n----- test case: [{testname}] -----'
-
-                result_string += (f'\n{status} "Dynamic framerate", ')
-                result_string += (f" codec: {encoder_settings.get('codec')}"
-                                  f", {encoder_settings.get('height')}"
-                                  f'p @ {fps}fps'
-                                  f', {resultfilename}')
-
-                if limit_too_high:
-                    result_string += (
-                        f'\nERROR: limit higher than available frames '
-                        f'({len(frames)}), adjust test case')
-                for item in dyn_data:
-                    result_string += ('\n      {:3d}% error in {:4d}:{:4d} '
-                                      '({:.2f} fps) for {:.2f} fps'
-                                      .format(item[4],
-                                              item[0],
-                                              item[1],
-                                              item[3],
-                                              item[2]))
-                result_string += f'\n      (limit set to {ERROR_LIMIT}%)'
-            elif len(frames) > 0:
-                framerate = encoder_settings.get('framerate')
-                frame1 = frames[0]
-                frame2 = frames[-1]
-                actual_framerate, deviation_perc = calcFrameRate(frame1,
-                                                                 frame2,
-                                                                 fps)
-                framerate_error.append([testname, int(round(deviation_perc, 0)),
-                                      fps, actual_framerate,
-                                      codec, encoder_settings.get('height'),
-                                      fps, resultfilename])
-
-                labels = ['test', 'error', 'framerate', 'real_framerate',
-                          'codec', 'height', 'fps', 'file']
-                data = pd.DataFrame.from_records(framerate_error, columns=labels,
-                                                 coerce_float=True)
-                data = data.sort_values(by=['framerate'])
-                print(f'{data}')
-                test_names = np.unique(data['test'])
-                for name in test_names:
-                    result_string += f'\n\n----- test case: [{testname}] -----'
-                    files = data.loc[data['test'] == name]
-                    for row in files.itertuples():
-                        status = 'passed'
-                        if abs(row.error) > ERROR_LIMIT:
-                            status = 'failed'
-                        result_string += (
-                            '\n{:s} "Framerate accuracy" {:3d} % error for '
-                            '{:.2f} fps ({:.2f} fps), codec: {:s}, {:4d}p @ {:.2f} fps, {:s}'
-                            .format(status,
-                                    row.error,
-                                    row.framerate,
-                                    row.real_framerate,
-                                    row.codec,
-                                    row.height,
-                                    row.fps,
-                                    row.file))
-                    result_string += f'\n      (limit set to {ERROR_LIMIT}%)'
-    return result_string
+                mean = 0
+            ratio = mean / target_bitrate
+            bitrate_error_perc = int((ratio - 1) * 100)
+            records.append(make_record(
+                'bitrate', testname, 'Dynamic bitrate', resultfilename,
+                'bitrate', target=int(target_bitrate),
+                measured=int(round(mean, 0)), error_perc=bitrate_error_perc,
+                passed=abs(bitrate_error_perc) <= ERROR_LIMIT,
+                first_frame=int(previous_limit), last_frame=int(limit),
+                **context))
+            if limit in dynamic_video_bitrate:
+                target_bitrate = convert_to_bps(
+                    dynamic_video_bitrate[limit])
+            previous_limit = limit
+    else:
+        mean_bitrate = encoder_settings.get('meanbitrate')
+        ratio = mean_bitrate / bitrate
+        bitrate_error_perc = int((ratio - 1) * 100)
+        records.append(make_record(
+            'bitrate', testname, 'Bitrate accuracy', resultfilename,
+            'bitrate', target=int(bitrate), measured=mean_bitrate,
+            error_perc=bitrate_error_perc,
+            passed=abs(bitrate_error_perc) <= ERROR_LIMIT, **context))
+    return records
+
+
+def format_dynamic(records, metric, segment_format):
+    lines = []
+    for file_records in group_by_file(records):
+        first = file_records[0]
+        segments = [item for item in file_records if item['metric'] == metric]
+        passed = all(item['passed'] for item in segments)
+        lines.append(f"\n----- test case: [{first['test']}] -----")
+        lines.append(f"{status_string(passed)} \"{first['subtest']}\", "
+                     f" codec: {first['codec']}, {first['height']}"
+                     f"p @ {first['fps']}fps, {first['file']}")
+        for item in file_records:
+            if item['metric'] == 'frame_count' and not item['passed']:
+                lines.append('ERROR: limit higher than available frames '
+                             f"({item['measured']}), adjust test case")
+        for item in segments:
+            lines.append(segment_format(item))
+        lines.append(f'      (limit set to {ERROR_LIMIT}%)')
+    return lines
+
+
+def format_accuracy(records, unit_format):
+    return format_table(
+        records, lambda row: '{:s} "{:s}" {:3d} % error for {:s} ({:s}), '
+        'codec: {:s}, {:>4}p @ {:.2f} fps, {:s}'.format(
+            status_string(row.passed), row.subtest, int(row.error_perc),
+            unit_format(row.target), unit_format(row.measured), row.codec,
+            int(row.height) if pd.notna(row.height) else '-', row.fps,
+            row.file),
+        f'      (limit set to {ERROR_LIMIT}%)')
+
+
+def format_mean_bitrate_deviation(records):
+    dynamic = [item for item in records
+               if item['subtest'] == 'Dynamic bitrate']
+    static = [item for item in records
+              if item['subtest'] == 'Bitrate accuracy']
+    lines = format_dynamic(
+        dynamic, 'bitrate', lambda item: (
+            '      {:3d}% error in {:4d}:{:4d} ({:4d}kbps) for {:4d}kbps'
+            .format(item['error_perc'], item['first_frame'],
+                    item['last_frame'], int(item['measured'] / 1000),
+                    int(item['target'] / 1000))))
+    lines += format_accuracy(
+        static, lambda bitrate: '{:4d}kbps'.format(int(bitrate / 1000)))
+    return join_lines(lines)
+
+
+def verify_framerate_deviation(result, test, file):
+    records = []
+
+    _, resultfilename = os.path.split(file)
+    encoder_settings = result.get('settings')
+    codec = encoder_settings.get('codec')
+    testname = result.get('test')
+    fps = encoder_settings.get('fps')
+    context = {'codec': codec, 'height': encoder_settings.get('height'),
+               'fps': fps}
+
+    dynamic_video_framerates = parse_dynamic_settings(test.runtime)[
+        'framerates']
+    frames = result.get('frames')
+    if (dynamic_video_framerates is not None
+       and len(dynamic_video_framerates) > 0):
+        previous_limit = 0
+        limits = list(dynamic_video_framerates.keys())
+        limits.append(frames[-1]['original_frame'])
+        records.append(make_record(
+            'framerate', testname, 'Dynamic framerate', resultfilename,
+            'frame_count', target=max(limits), measured=len(frames),
+            passed=max(limits) <= len(frames), **context))
+        target_rate = fps
+        for limit in limits:
+            filtered = list(filter(lambda x: (x['original_frame'] >=
+                                              int(previous_limit) and
+                                              x['original_frame'] < int(limit)),
+                                   frames))
+            frame1 = filtered[0]
+            frame2 = filtered[-1]
+            actual_framerate, deviation_perc = calcFrameRate(frame1,
+                                                             frame2,
+                                                             target_rate)
+            records.append(make_record(
+                'framerate', testname, 'Dynamic framerate', resultfilename,
+                'framerate', target=target_rate,
+                measured=round(actual_framerate, 2),
+                error_perc=int(round(deviation_perc, 0)),
+                passed=abs(deviation_perc) <= ERROR_LIMIT,
+                first_frame=int(previous_limit), last_frame=int(limit),
+                **context))
+
+            previous_limit = limit
+            if limit in dynamic_video_framerates:
+                target_rate = dynamic_video_framerates[limit]
+    elif len(frames) > 0:
+        frame1 = frames[0]
+        frame2 = frames[-1]
+        actual_framerate, deviation_perc = calcFrameRate(frame1,
+                                                         frame2,
+                                                         fps)
+        records.append(make_record(
+            'framerate', testname, 'Framerate accuracy', resultfilename,
+            'framerate', target=fps, measured=actual_framerate,
+            error_perc=int(round(deviation_perc, 0)),
+            passed=abs(deviation_perc) <= ERROR_LIMIT, **context))
+    return records
+
+
+def format_framerate_deviation(records):
+    dynamic = [item for item in records
+               if item['subtest'] == 'Dynamic framerate']
+    static = [item for item in records
+              if item['subtest'] == 'Framerate accuracy']
+    lines = format_dynamic(
+        dynamic, 'framerate', lambda item: (
+            '      {:3d}% error in {:4d}:{:4d} ({:.2f} fps) for {:.2f} fps'
+            .format(item['error_perc'], item['first_frame'],
+                    item['last_frame'], item['measured'], item['target'])))
+    lines += format_accuracy(
+        static, lambda framerate: '{:.2f} fps'.format(framerate))
+    return join_lines(lines)
 
 
 def calcFrameRate(frame1, frame2, target_rate):
@@ -640,6 +659,122 @@ def print_partial_result(header, partial_result):
     return ''
 
 
+# (name, report header, check of one result, formatting of the records)
+CHECKS = [
+    ('bitrate', 'Verify bitrate accuracy', verify_mean_bitrate_deviation,
+     format_mean_bitrate_deviation),
+    ('framerate', 'Verify framerate accuracy', verify_framerate_deviation,
+     format_framerate_deviation),
+    ('idr', 'Verify idr accuracy', verify_idr_placement,
+     format_idr_placement),
+    ('temporal', 'Verify temporal layers', verify_temporal_layer,
+     format_temporal_layer),
+    ('ltr', 'Verify long term reference settings', verify_long_term_ref,
+     format_long_term_ref),
+]
+NUMERIC_FIELDS = ['target', 'measured', 'error_perc', 'height', 'fps',
+                  'first_frame', 'last_frame']
+
+
+def verify_file(file, checks, error_limit):
+    # runs in a worker, the result is parsed once for all checks
+    global ERROR_LIMIT
+    ERROR_LIMIT = error_limit
+    with open(file) as resultfile:
+        result = json.load(resultfile)
+    test = text_format.Parse(result.get('testdefinition'), proto.Test())
+    records = []
+    for name, _, verify, _ in CHECKS:
+        if name in checks:
+            records += verify(result, test, file)
+    return records
+
+
+def run_checks(resultpath, checks=None, jobs=1):
+    if checks is None:
+        checks = [check[0] for check in CHECKS]
+    if jobs > 1 and len(resultpath) > 1:
+        chunksize = max(1, len(resultpath) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            partials = list(executor.map(
+                verify_file, resultpath, repeat(checks),
+                repeat(ERROR_LIMIT), chunksize=chunksize))
+    else:
+        partials = [verify_file(file, checks, ERROR_LIMIT)
+                    for file in resultpath]
+    # in file order
+    return [record for partial in partials for record in partial]
+
+
+def submit_checks(executor, resultpath, checks=None):
+    if checks is None:
+        checks = [check[0] for check in CHECKS]
+    return [executor.submit(verify_file, file, checks, ERROR_LIMIT)
+            for file in resultpath]
+
+
+def critical_failures(futures, critical):
+    # records of critical checks that failed, of the finished files only
+    return [record for future in futures if future.done()
+            for record in future.result()
+            if record['check'] in critical and record['passed'] is False]
+
+
+def format_check(records, name):
+    for check, _, _, format_records in CHECKS:
+        if check == name:
+            return format_records(
+                [record for record in records if record['check'] == name])
+    return ''
+
+
+def format_failed_runs(records):
+    return join_lines(f"{record['test']}: {record['subtest']}"
+                      for record in records if record['check'] == 'run')
+
+
+def format_report(records):
+    result_string = ''
+    for name, header, _, _ in CHECKS:
+        result_string += print_partial_result(
+            header, format_check(records, name))
+    result_string += print_partial_result('Failed test runs',
+                                          format_failed_runs(records))
+    return result_string
+
+
+def write_records(records, path):
+    # json lines, and parquet if pandas has an engine for it
+    data = pd.DataFrame.from_records(records, columns=RECORD_FIELDS)
+    data[NUMERIC_FIELDS] = data[NUMERIC_FIELDS].apply(pd.to_numeric)
+    data.to_json(f'{path}.jsonl', orient='records', lines=True)
+    try:
+        data.to_parquet(f'{path}.parquet')
+    except ImportError:
+        pass
+    return data
+
+
+def check_mean_bitrate_deviation(resultpath):
+    return format_check(run_checks(resultpath, ['bitrate']), 'bitrate')
+
+
+def check_framerate_deviation(resultpath):
+    return format_check(run_checks(resultpath, ['framerate']), 'framerate')
+
+
+def check_idr_placement(resultpath):
+    return format_check(run_checks(resultpath, ['idr']), 'idr')
+
+
+def check_temporal_layer(resultpath):
+    return format_check(run_checks(resultpath, ['temporal']), 'temporal')
+
+
+def check_long_term_ref(resultpath):
+    return format_check(run_checks(resultpath, ['ltr']), 'ltr')
+
+
 def main(argv):
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument('--serial', help='Android device serial number')
@@ -664,9 +799,14 @@ def main(argv):
     parser.add_argument('--bitrate_limit', nargs='?',
                         help='Set acceptance lmit on bitrate in percentage',
                         default=5)
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='Number of result files verified in parallel')
+    parser.add_argument('--critical', nargs='+', default=[],
+                        choices=[check[0] for check in CHECKS],
+                        help='Skip the remaining tests when any of these '
+                        'checks fail')
 
     options = parser.parse_args(argv[1:])
-    result_string = ''
     model = None
     serial = None
 
@@ -676,22 +816,18 @@ def main(argv):
 
     global ERROR_LIMIT
     ERROR_LIMIT = int(options.bitrate_limit)
-    bitrate_string = ''
-    idr_string = ''
-    temporal_string = ''
-    ltr_string = ''
-    framerate_string = ''
+    records = []
     workdir = options.dir
     if options.result is not None:
+        os.makedirs(workdir, exist_ok=True)
         results = []
         for file in options.result:
             results.append(file)
-        bitrate_string += check_mean_bitrate_deviation(results)
-        idr_string += check_idr_placement(results)
-        temporal_string += check_temporal_layer(results)
-        ltr_string += check_long_term_ref(results)
-        framerate_string += check_framerate_deviation(results)
+        records = run_checks(results, jobs=options.jobs)
     else:
+        # only needed for running tests on a device
+        import encapp as ep
+
         if os.path.exists(workdir):
             shutil.rmtree(workdir)
 
@@ -711,7 +847,17 @@ def main(argv):
         else:
             tests = DEFAULT_TESTS
 
+        # results are verified while the device runs the next test
+        executor = ProcessPoolExecutor(max_workers=max(1, options.jobs))
+        futures = []
+        failed_runs = []
         for test in tests:
+            failed = critical_failures(futures, options.critical)
+            if len(failed) > 0:
+                print('Critical check failed: '
+                      f"{failed[0]['check']} \"{failed[0]['subtest']}\" "
+                      f"in {failed[0]['file']}, skipping remaining tests")
+                break
             directory, _ = os.path.split(__file__)
             if options.test is None:
                 test_path = '../tests/' + test
@@ -751,23 +897,24 @@ def main(argv):
             settings['inp_framerate'] = options.input_fps
             settings['out_framerate'] = options.output_fps
             settings['output'] = workdir
-
-            result = ep.codec_test(settings, model, serial)
-            bitrate_string += check_mean_bitrate_deviation(result)
-            idr_string += check_idr_placement(result)
-            temporal_string += check_temporal_layer(result)
-            ltr_string += check_long_term_ref(result)
-            framerate_string += check_framerate_deviation(result)
-
-    result_string += print_partial_result(
-        'Verify bitrate accuracy', bitrate_string)
-    result_string += print_partial_result(
-        'Verify framerate accuracy', framerate_string)
-    result_string += print_partial_result('Verify idr accuracy', idr_string)
-    result_string += print_partial_result(
-        'Verify temporal layers', temporal_string)
-    result_string += print_partial_result(
-        'Verify long term reference settings', ltr_string)
+            # the tests here are known to run, no need to list the codecs
+            settings['preflight'] = 'off'
+
+            try:
+                result = ep.codec_test(settings, model, serial)
+            except ep.RunFailed as failure:
+                # verify what the test left and go on with the next one
+                result = failure.results
+                failed_runs.append(make_record(
+                    'run', test, str(failure), None, 'results',
+                    measured=len(result), passed=False))
+            futures += submit_checks(executor, result)
+        executor.shutdown(wait=True)
+        records = [record for future in futures
+                   for record in future.result()] + failed_runs
+
+    result_string = format_report(records)
+    write_records(records, f'{workdir}/RESULT')
 
     print(f'\nRESULTS\n{result_string}')
     with open(f'{workdir}/RESULT.txt', 'w') as output:
@@ -6,10 +6,10 @@
 
 import matplotlib.pyplot as plt
 import argparse
-import json
 import os
 import numpy as np
-import pandas as pd
+
+from encapp_tool import rd
 
 
 class RDPlot:
@@ -63,37 +63,32 @@ class RDPlot:
         plt.draw()
 
     def plot_rd_curve(self, quality_csv):
-        rd_results = None
-        with open(quality_csv, 'r') as fp:
-            data = pd.read_csv(fp)
-            fp.close()
-
-            heights = np.unique(data['height'])
-            codecs = np.unique(data['codec'])
+        data = rd.read_quality([quality_csv])
+        heights = np.unique(data['height'].dropna())
+        codecs = np.unique(data['codec'].dropna())
 
-            for height in heights:
-                filtHeight = data.loc[data['height'] == height]
-                filtHeight = filtHeight.apply(pd.to_numeric, errors='ignore')
-                if len(filtHeight) <= 1:
-                    continue
-                self.vmaf_figure(f'VMAF for {height}p')
-                for codec in codecs:
-                    filtCodec = filtHeight.loc[filtHeight['height'] == height]
-                    filtHeight = filtHeight.sort_values('real_bitrate')
-                    if len(filtHeight) > 0:
-                        self.draw(filtHeight['real_bitrate'] / 1000,
-                                  filtHeight['vmaf'],
-                                  f'{codec}')
-                self.finish()
-                self.bitrate_figure(f'Bitrate accuracy for {height}p')
-                for codec in codecs:
-                    filtCodec = filtHeight.loc[filtHeight['height'] == height]
-                    filtHeight = filtHeight.sort_values('real_bitrate')
-                    if len(filtHeight) > 0:
-                        self.draw(filtHeight['real_bitrate'] / 1000,
-                                  filtHeight['bitrate'] / 1000,
-                                  f'{codec}')
-                self.finish()
+        for height in heights:
+            filtHeight = data.loc[data['height'] == height]
+            if len(filtHeight) <= 1:
+                continue
+            self.vmaf_figure(f'VMAF for {height:g}p')
+            for codec in codecs:
+                filtCodec = filtHeight.loc[filtHeight['codec'] == codec]
+                filtCodec = filtCodec.sort_values('real_bitrate')
+                if len(filtCodec) > 0:
+                    self.draw(filtCodec['real_bitrate'] / 1000,
+                              filtCodec['vmaf'],
+                              f'{codec}')
+            self.finish()
+            self.bitrate_figure(f'Bitrate accuracy for {height:g}p')
+            for codec in codecs:
+                filtCodec = filtHeight.loc[filtHeight['codec'] == codec]
+                filtCodec = filtCodec.sort_values('real_bitrate')
+                if len(filtCodec) > 0:
+                    self.draw(filtCodec['real_bitrate'] / 1000,
+                              filtCodec['bitrate'] / 1000,
+                              f'{codec}')
+            self.finish()
         plt.show()
 
 
@@ -0,0 +1,6 @@
+import sys
+import os
+
+MODULE_PATH = os.path.dirname(__file__)
+ENCAPP_SCRIPTS_DIR = os.path.join(MODULE_PATH, os.pardir, os.pardir)
+sys.path.append(ENCAPP_SCRIPTS_DIR)
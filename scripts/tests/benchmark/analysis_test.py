@@ -0,0 +1,197 @@
+"""Benchmarks of the result analysis scripts on synthetic corpora
+
+Frame counts (per result) and file counts (per corpus) scale with
+ENCAPP_BENCH_SCALE, see conftest.py.
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import encapp_latency
+import encapp_quality
+import encapp_search
+import encapp_verify
+from encapp_tool import concurrency, frame_metrics, latency, rd, synthetic
+
+from .conftest import FILE_COUNTS, FRAME_COUNTS, corpus_tests
+
+
+def _load(path):
+    with open(path) as fd:
+        return json.load(fd)
+
+
+def _search_options(path, **kwargs):
+    options = argparse.Namespace(
+        path=path, size=None, codec=None, bitrate=None, gop=None, fps=None,
+        no_rec=False)
+    for key, val in kwargs.items():
+        setattr(options, key, val)
+    return options
+
+
+@pytest.mark.parametrize("frame_count", FRAME_COUNTS)
+def test_parse_encoding_data(benchmark, corpus, frame_count):
+    stats = pytest.importorskip("encapp_stats_to_csv")
+    path = corpus(1, frame_count)[0]
+    result = _load(path)
+    data = benchmark(stats.parse_encoding_data, result, path)
+    assert len(data) > 0
+
+
+@pytest.mark.parametrize("frame_count", FRAME_COUNTS)
+def test_parse_decoding_and_gpu_data(benchmark, tmp_path, frame_count):
+    stats = pytest.importorskip("encapp_stats_to_csv")
+    test = corpus_tests(frame_count)[0]
+    result, _ = synthetic.synthesize_result(
+        test, frame_count, start_ns=0, seed=1, gpu=True, decode=True)
+
+    def parse():
+        return (stats.parse_decoding_data(result, "result.json"),
+                stats.parse_gpu_data(result, "result.json"))
+
+    decoded, gpu = benchmark(parse)
+    assert len(decoded) == frame_count
+    assert len(gpu) > 0
+
+
+@pytest.mark.parametrize("frame_count", FRAME_COUNTS)
+def test_align_load_data(benchmark, frame_count):
+    stats = pytest.importorskip("encapp_stats_to_csv")
+    test = corpus_tests(frame_count)[0]
+    result, _ = synthetic.synthesize_result(
+        test, frame_count, start_ns=0, seed=1, gpu=True)
+    data = stats.parse_encoding_data(result, "result.json")
+
+    def align():
+        samples = stats.parse_load_samples(result, stats.first_start(result))
+        return stats.align_load_data(data.copy(), samples)
+
+    aligned = benchmark(align)
+    assert aligned["gpu_clock_MHz"].notna().all()
+
+
+@pytest.mark.parametrize("frame_count", FRAME_COUNTS)
+def test_latency_report(benchmark, frame_count):
+    results = [synthetic.synthesize_result(test, frame_count, start_ns=0, seed=1)[0]
+               for test in corpus_tests(frame_count)]
+
+    def report():
+        total = latency.StreamLatency(33.3)
+        for result in results:
+            total.merge(encapp_latency.stream_latency(result))
+        return total.summary()
+
+    summary = benchmark(report)
+    assert summary["frames"] > 0
+
+
+@pytest.mark.parametrize("frame_count", FRAME_COUNTS)
+def test_concurrency_table(benchmark, frame_count):
+    streams = []
+    for num, test in enumerate(corpus_tests(frame_count)):
+        result, _ = synthetic.synthesize_result(
+            test, frame_count, start_ns=num * 1000000000, seed=num)
+        starttime, stoptime = frame_metrics.frame_times(result["frames"])
+        streams.append({"stream": test.common.id, "fps": 30,
+                        "starttime": starttime, "stoptime": stoptime})
+
+    def analyze():
+        return (concurrency.concurrency_table(streams),
+                concurrency.timeline(streams))
+
+    table, timeline = benchmark(analyze)
+    assert table["run"].max() == 0
+    assert len(timeline) > 0
+
+
+@pytest.mark.parametrize("file_count", FILE_COUNTS)
+def test_index(benchmark, corpus, tmp_path, file_count):
+    paths = corpus(file_count, 100)
+    root = os.path.dirname(os.path.dirname(paths[0]))
+    options = _search_options(root)
+
+    def index():
+        encapp_search.indexDirectory(options, True)
+        return encapp_search.getData(options, True)
+
+    data = benchmark(index)
+    assert len(data) == file_count
+
+
+@pytest.mark.parametrize("file_count", FILE_COUNTS)
+def test_search(benchmark, corpus, file_count):
+    paths = corpus(file_count, 100)
+    root = os.path.dirname(os.path.dirname(paths[0]))
+    encapp_search.indexDirectory(_search_options(root), True)
+    options = _search_options(root, size="1280x720", codec="avc",
+                              bitrate="500k-2M")
+    data = benchmark(encapp_search.search, options)
+    assert len(data) == file_count
+
+
+@pytest.mark.parametrize("file_count", FILE_COUNTS)
+@pytest.mark.parametrize("check", [
+    "check_mean_bitrate_deviation",
+    "check_framerate_deviation",
+    "check_idr_placement",
+    "check_temporal_layer",
+])
+def test_verify(benchmark, corpus, file_count, check):
+    paths = corpus(file_count, 300)
+    result = benchmark(getattr(encapp_verify, check), paths)
+    assert len(result) > 0
+
+
+@pytest.mark.parametrize("frame_count", FRAME_COUNTS)
+def test_verify_long_run(benchmark, corpus, frame_count):
+    paths = corpus(4, frame_count)
+    result = benchmark(encapp_verify.check_mean_bitrate_deviation, paths)
+    assert len(result) > 0
+
+
+@pytest.mark.parametrize("frame_count", FRAME_COUNTS)
+def test_parse_quality(benchmark, tmp_path, frame_count):
+    encodedfile = str(tmp_path / "encapp_quality.mp4")
+    synthetic.write_quality_files(encodedfile, frame_count, seed=1)
+    vmaf, ssim, psnr = benchmark(
+        encapp_quality.parse_quality, f"{encodedfile}.vmaf",
+        f"{encodedfile}.ssim", f"{encodedfile}.psnr")
+    assert 80 <= vmaf <= 100
+
+
+@pytest.mark.parametrize("file_count", FILE_COUNTS)
+def test_plot_data(benchmark, corpus, file_count):
+    # what encapp_plot.py gets: the frame data of all results in one table
+    stats = pytest.importorskip("encapp_stats_to_csv")
+    paths = corpus(file_count, 300)
+
+    def prepare():
+        return pd.concat([stats.parse_encoding_data(_load(path), path)
+                          for path in paths])
+
+    data = benchmark(prepare)
+    assert len(data) > 0
+
+
+@pytest.mark.parametrize("file_count", FILE_COUNTS)
+def test_rd_compare(benchmark, file_count):
+    # quality table of a sweep: 4 codecs x 4 resolutions x bitrate ladders
+    # (at least 4 points per curve)
+    count = max(file_count, 64)
+    rng = np.random.default_rng(1)
+    rates = rng.uniform(1e5, 1e7, count)
+    codecs = np.array(["avc", "hevc", "vp9", "av1"])[np.arange(count) % 4]
+    heights = np.array([360, 540, 720, 1080])[np.arange(count) // 4 % 4]
+    gain = pd.Series(codecs).map({"avc": 1.0, "hevc": 0.7, "vp9": 0.75, "av1": 0.6})
+    vmaf = 100 - 4e6 / (rates / gain.values + 4e4) / heights * 10
+    data = pd.DataFrame({"codec": codecs, "height": heights,
+                         "real_bitrate": rates, "vmaf": vmaf,
+                         "psnr": vmaf / 2})
+
+    table = benchmark(rd.compare, data, "avc")
+    assert len(table) > 0
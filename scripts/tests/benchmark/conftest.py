@@ -0,0 +1,117 @@
+import os
+import time
+
+import pytest
+
+import proto.tests_pb2 as tests_definitions
+from encapp_tool import adb_cmds, synthetic
+from encapp_tool.emulated_device import EmulatedDevice
+
+
+# ENCAPP_BENCH_SCALE=medium|full adds the large corpora, which take
+# long to generate (and to process, for the slow paths)
+SCALES = {
+    "small": {"frames": [1000], "files": [10]},
+    "medium": {"frames": [1000, 100000], "files": [10, 10000]},
+    "full": {"frames": [1000, 100000, 1000000], "files": [10, 10000, 500000]},
+}
+SCALE = SCALES[os.environ.get("ENCAPP_BENCH_SCALE", "small")]
+FRAME_COUNTS = SCALE["frames"]
+FILE_COUNTS = SCALE["files"]
+
+try:
+    import pytest_benchmark  # noqa: F401
+except ImportError:
+
+    class _Benchmark:
+        # minimal stand-in for the pytest-benchmark fixture
+        def __init__(self, name):
+            self.name = name
+
+        def __call__(self, func, *args, **kwargs):
+            return self.pedantic(func, args, kwargs)
+
+        def pedantic(self, func, args=(), kwargs=None, setup=None, rounds=1,
+                     iterations=1):
+            elapsed = []
+            for _ in range(rounds):
+                if setup is not None:
+                    args, kwargs = setup()
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    result = func(*args, **(kwargs or {}))
+                elapsed.append((time.perf_counter() - start) / iterations)
+            print(f"\n{self.name}: min {min(elapsed):.4f} s "
+                  f"({rounds} rounds)")
+            return result
+
+    @pytest.fixture
+    def benchmark(request):
+        return _Benchmark(request.node.name)
+
+
+@pytest.fixture
+def emulated_device(tmp_path, monkeypatch):
+    """Emulated device used by all adb commands, with a private cache dir"""
+    monkeypatch.setattr("encapp_tool.storage.CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr("encapp_tool.codec_caps.CACHE_DIR", str(tmp_path / "cache"))
+    device = EmulatedDevice(
+        str(tmp_path / "device"),
+        tests_definitions.Tests,
+        latency=float(os.environ.get("ENCAPP_BENCH_LATENCY", "0.002")),
+        bandwidth=float(os.environ.get("ENCAPP_BENCH_BANDWIDTH", "0")),
+    )
+    adb_cmds.set_adb_backend(device)
+    yield device
+    adb_cmds.set_adb_backend(None)
+
+
+def corpus_tests(frame_count):
+    """Tests covering the result flavours the analysis scripts handle"""
+    tests = []
+    for name in ("bitrate", "dynamic_bitrate", "dynamic_framerate", "temporal"):
+        test = tests_definitions.Test()
+        test.common.id = name
+        test.common.description = name
+        test.input.filepath = "/sdcard/source_720p.yuv"
+        test.input.resolution = "1280x720"
+        test.input.framerate = 30
+        test.configure.codec = "c2.android.avc.encoder"
+        test.configure.bitrate = "1000 kbps"
+        test.configure.resolution = "1280x720"
+        test.configure.framerate = 30
+        test.configure.i_frame_interval = 2
+        if name == "dynamic_bitrate":
+            for framenum, bitrate in ((frame_count // 3, "500k"),
+                                      (2 * frame_count // 3, "2M")):
+                param = test.runtime.video_bitrate.add()
+                param.framenum = framenum
+                param.bitrate = bitrate
+        elif name == "dynamic_framerate":
+            param = test.runtime.dynamic_framerate.add()
+            param.framenum = frame_count // 2
+            param.framerate = 15
+        elif name == "temporal":
+            param = test.configure.parameter.add()
+            param.key = "ts-schema"
+            param.type = tests_definitions.DataValueType.Value("stringType")
+            param.value = "android.generic.2"
+        tests.append(test)
+    return tests
+
+
+@pytest.fixture(scope="session")
+def corpus(tmp_path_factory):
+    """Get (and cache) a synthetic result corpus: corpus(files, frames)"""
+    corpora = {}
+
+    def get(file_count, frame_count, **kwargs):
+        key = (file_count, frame_count, tuple(sorted(kwargs.items())))
+        if key not in corpora:
+            directory = tmp_path_factory.mktemp(f"corpus_{file_count}_{frame_count}")
+            corpora[key] = synthetic.write_corpus(
+                str(directory), corpus_tests(frame_count), file_count,
+                frame_count, **kwargs)
+        return corpora[key]
+
+    return get
@@ -0,0 +1,70 @@
+"""Host-side benchmarks of the encapp.py run pipeline
+
+The device is emulated (see encapp_tool.emulated_device), so these
+measure the orchestration cost only: test expansion, pushing, polling,
+pulling and bookkeeping. Run with `pytest scripts/tests/benchmark`.
+"""
+import pytest
+
+import encapp
+import proto.tests_pb2 as tests_definitions
+
+TEST_COUNT = 40
+FRAMES = 60
+
+
+def _settings(output, batch_size=None):
+    settings = dict(encapp.extra_settings)
+    settings["configfile"] = "bench.pbtxt"
+    settings["output"] = str(output)
+    settings["bitrate"] = ",".join(
+        f"{100 + 10 * index}kbps" for index in range(TEST_COUNT)
+    )
+    settings["batch_size"] = batch_size
+    return settings
+
+
+def _tests(source):
+    tests = tests_definitions.Tests()
+    test = tests.test.add()
+    test.common.id = "bench"
+    test.common.description = "run pipeline benchmark"
+    test.input.filepath = str(source)
+    test.input.resolution = "176x144"
+    test.input.framerate = 30
+    test.input.playout_frames = FRAMES
+    test.configure.codec = "OMX.google.h264.encoder"
+    return tests
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "akiyo_qcif.yuv"
+    path.write_bytes(b"\0" * (176 * 144 * 3 // 2 * FRAMES))
+    return path
+
+
+@pytest.fixture(autouse=True)
+def fast_poll(monkeypatch):
+    monkeypatch.setattr(encapp, "WAIT_POLL_INTERVAL", 0.01)
+
+
+@pytest.mark.parametrize("batch_size", [None, 8])
+def test_run_codec_tests(benchmark, emulated_device, tmp_path, source, batch_size):
+    rounds = []
+
+    def setup():
+        # every round starts from an empty output dir
+        settings = _settings(tmp_path / f"out{len(rounds)}", batch_size)
+        rounds.append(settings)
+        args = (
+            _tests(source),
+            emulated_device.model,
+            emulated_device.serial,
+            settings["output"],
+            settings,
+        )
+        return args, {}
+
+    result = benchmark.pedantic(encapp.run_codec_tests, setup=setup, rounds=3)
+    assert len(result) == TEST_COUNT
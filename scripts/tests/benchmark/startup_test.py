@@ -0,0 +1,47 @@
+"""Startup time of the command line tools
+
+Orchestration scripts call these many times, so a plain invocation
+should not pay for imports it does not use. The limit (ms) can be set
+with ENCAPP_BENCH_STARTUP_MS.
+"""
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+STARTUP_LIMIT_MS = float(os.environ.get("ENCAPP_BENCH_STARTUP_MS", "200"))
+ROUNDS = 5
+
+
+def _startup_ms(args, cwd=None):
+    elapsed = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=cwd, check=True,
+                       stdout=subprocess.DEVNULL)
+        elapsed.append((time.perf_counter() - start) * 1000)
+    return min(elapsed)
+
+
+@pytest.mark.parametrize("args", [
+    ["encapp.py", "--version"],
+    ["encapp_quality.py", "--help"],
+    ["encapp_search.py", "--help"],
+])
+def test_startup(benchmark, args):
+    args = [os.path.join(SCRIPTS_DIR, args[0])] + args[1:]
+    elapsed = benchmark(_startup_ms, args)
+    assert elapsed < STARTUP_LIMIT_MS
+
+
+def test_search_query(benchmark, corpus):
+    root = os.path.dirname(os.path.dirname(corpus(10, 100)[0]))
+    search = os.path.join(SCRIPTS_DIR, "encapp_search.py")
+    subprocess.run([sys.executable, search, "-i", root], check=True,
+                   stdout=subprocess.DEVNULL)
+    elapsed = benchmark(_startup_ms, [search, "-s", "1280x720", root])
+    assert elapsed < STARTUP_LIMIT_MS
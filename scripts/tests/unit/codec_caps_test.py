@@ -0,0 +1,133 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import proto.tests_pb2 as tests_definitions
+from encapp_tool import adb_cmds, codec_caps
+from encapp_tool.emulated_device import EmulatedDevice, codecs_text
+
+SERIAL = "emulated0001"
+
+# as written by the app, with the free form default settings of some codecs
+# (the last of them without a line end)
+HW_ENCODER = """encoders {
+  MediaCodec {
+    name: OMX.vendor.hevc.encoder
+    is_encoder: true
+    media_type {
+      media_type: video/hevc
+      mime_type: video/hevc
+      max_supported_instances: 4
+      profile_levels {
+        profile_level {
+          profile: 1
+          level: 65536
+        }
+      }
+
+Default settings:
+bitrate: 20000000
+mime: video/hevc
+profile: 1      encoder_capabilities {
+        complexity_range: [0, 0]
+        quality_range: [0, 100]
+        MODE_CBR: true
+        MODE_CQ: false
+        MODE_VBR: true
+      }
+      video_capabilities {
+        bitrate_range: [1, 100000000]
+        height_alignment: 16
+        width_alignment: 16
+        supported_frame_rates: [1, 240]
+        supported_heights: [64, 2160]
+        supported_widths: [64, 4096]
+      }
+    }
+  }
+}
+decoders {
+}
+"""
+
+
+def _test(codec, resolution="1280x720", bitrate="1 Mbps", framerate=30):
+    test = tests_definitions.Test()
+    test.common.id = "test"
+    test.input.resolution = resolution
+    test.configure.codec = codec
+    test.configure.bitrate = bitrate
+    test.configure.framerate = framerate
+    return test
+
+
+class TestCodecCaps(unittest.TestCase):
+    def test_parse_codecs_shall_read_capabilities(self):
+        codecs = codec_caps.parse_codecs(codecs_text())
+        self.assertEqual(len(codecs), 6)
+        self.assertEqual(sum(codec["encoder"] for codec in codecs), 4)
+        avc = codecs[1]
+        self.assertEqual(avc["name"], "c2.android.avc.encoder")
+        caps = avc["media_types"][0]
+        self.assertEqual(caps["media_type"], "video/avc")
+        self.assertEqual(caps["bitrate_range"], [1, 40000000])
+        self.assertEqual(caps["width_range"], [2, 3840])
+        self.assertEqual(caps["height_alignment"], 2)
+        self.assertEqual(caps["color_formats"][0]["name"], "COLOR_FormatYUV420Flexible")
+        self.assertEqual(caps["profile_levels"], [{"profile": 1, "level": 2048}])
+        self.assertIn("video/hevc", codec_caps.codec_names(codecs))
+
+    def test_parse_codecs_shall_skip_free_form_lines(self):
+        (codec,) = codec_caps.parse_codecs(HW_ENCODER)
+        caps = codec["media_types"][0]
+        self.assertTrue(caps["bitrate_modes"])
+        self.assertEqual(caps["bitrate_modes"], {"cbr": True, "cq": False, "vbr": True})
+        self.assertEqual(caps["bitrate_range"], [1, 100000000])
+        self.assertEqual(caps["frame_rate_range"], [1, 240])
+        self.assertEqual(caps["width_alignment"], 16)
+
+    def test_find_encoder_shall_match_like_the_app(self):
+        codecs = codec_caps.parse_codecs(codecs_text())
+        encoder, _ = codec_caps.find_encoder(codecs, "OMX.google.h264.encoder")
+        self.assertEqual(encoder["name"], "OMX.google.h264.encoder")
+        encoder, _ = codec_caps.find_encoder(codecs, "hevc")
+        self.assertEqual(encoder["name"], "c2.android.hevc.encoder")
+        encoder, problem = codec_caps.find_encoder(codecs, "c2.android")
+        self.assertIsNone(encoder)
+        self.assertIn("ambiguous", problem)
+        encoder, problem = codec_caps.find_encoder(codecs, "av1")
+        self.assertIsNone(encoder)
+
+    def test_check_test_shall_report_unsupported_settings(self):
+        codecs = codec_caps.parse_codecs(codecs_text() + HW_ENCODER)
+        self.assertEqual(codec_caps.check_test(codecs, _test("c2.android.avc.encoder")), [])
+        self.assertEqual(len(codec_caps.check_test(codecs, _test("c2.android.avc.encoder", "4096x2160"))), 1)
+        self.assertEqual(len(codec_caps.check_test(codecs, _test("c2.android.avc.encoder", "1279x720"))), 1)
+        self.assertEqual(len(codec_caps.check_test(codecs, _test("c2.android.avc.encoder", bitrate="50M"))), 1)
+        self.assertEqual(len(codec_caps.check_test(codecs, _test("vendor.hevc", "1288x720"))), 1)
+        self.assertEqual(codec_caps.check_test(codecs, _test("vendor.hevc", "1280x704", framerate=120)), [])
+        test = _test("vendor.hevc", "1280x704")
+        test.configure.bitrate_mode = tests_definitions.Configure.cq
+        self.assertEqual(len(codec_caps.check_test(codecs, test)), 1)
+        test = _test("c2.android.avc.encoder")
+        test.parallel.test.append(_test("av1"))
+        self.assertEqual(len(codec_caps.check_test(codecs, test)), 1)
+
+    def test_capabilities_shall_be_cached_per_build(self):
+        with tempfile.TemporaryDirectory() as tmpdir, patch("encapp_tool.codec_caps.CACHE_DIR", tmpdir):
+            device = EmulatedDevice(os.path.join(tmpdir, "dev"), tests_definitions.Tests)
+            adb_cmds.set_adb_backend(device)
+            try:
+                self.assertIsNone(codec_caps.load_capabilities(SERIAL, "emulator"))
+                stored = codec_caps.store_capabilities(SERIAL, "emulator", codecs_text())
+                self.assertEqual(codec_caps.load_capabilities(SERIAL, "emulator"), stored)
+                # an update changes the fingerprint
+                device.props[codec_caps.FINGERPRINT_PROP] += ".1"
+                self.assertIsNone(codec_caps.load_capabilities(SERIAL, "emulator"))
+            finally:
+                adb_cmds.set_adb_backend(None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+
+import numpy as np
+
+from encapp_tool import concurrency
+
+MS = 1000000
+
+
+def _stream(name, first_ms, count, latency_ms, interval_ms=10):
+    starttime = (first_ms + np.arange(count) * interval_ms) * MS
+    return {"stream": name, "codec": "avc", "height": 720, "fps": 100,
+            "starttime": starttime, "stoptime": starttime + latency_ms * MS}
+
+
+class TestConcurrency(unittest.TestCase):
+    def test_busy_segments_shall_merge_overlapping_frames(self):
+        starts, stops = concurrency.busy_segments(np.array([0, 5, 20, 12]), np.array([10, 8, 30, 15]))
+        self.assertEqual(list(starts), [0, 12, 20])
+        self.assertEqual(list(stops), [10, 15, 30])
+        covered = concurrency.covered_time(starts, stops, np.array([-1, 5, 11, 25, 40]))
+        self.assertEqual(list(covered), [0, 5, 10, 18, 23])
+
+    def test_inflight_time_shall_sum_the_frame_times(self):
+        rng = np.random.default_rng(1)
+        start = rng.integers(0, 1000, 100)
+        stop = start + rng.integers(0, 100, 100)
+        times = np.array([0, 250, 500, 1200])
+        expected = [np.sum(np.clip(time - start, 0, stop - start)) for time in times]
+        np.testing.assert_array_equal(concurrency.inflight_time(start, stop, times), expected)
+
+    def test_table_shall_compare_concurrent_latency_with_solo_runs(self):
+        streams = [
+            _stream("solo", 0, 100, 4),
+            # the second stream doubles the latency of both
+            _stream("first", 10000, 100, 4),
+            _stream("second", 10500, 100, 8),
+        ]
+        streams[1]["stoptime"][50:] += 4 * MS
+        table = concurrency.concurrency_table(streams).set_index("stream")
+        self.assertEqual(list(table["run"]), [0, 0, 1, 1, 1])
+        self.assertEqual(table.loc["first", "solo_baseline"], "solo run")
+        self.assertEqual(table.loc["first", "overlap_perc"], 50)
+        self.assertAlmostEqual(table.loc["first", "contention_factor"], 2)
+        self.assertAlmostEqual(table.loc["second", "contention_factor"], 2)
+        self.assertAlmostEqual(table.loc["second", "throughput_fps"], 100 * 1000 / 998)
+        self.assertTrue(np.isnan(table.loc["solo", "contention_factor"]))
+        run = table.loc["all"].iloc[1]
+        self.assertEqual(run["frames"], 200)
+        self.assertEqual(run["active_streams_max"], 2)
+        # 1.5 s, the first 500 ms 40% busy, the next 1 s 80%
+        self.assertAlmostEqual(run["duration_sec"], 1.498)
+        self.assertAlmostEqual(run["busy_perc"], 100 * (200 + 800) / 1498)
+
+    def test_timeline_shall_bin_the_runs(self):
+        streams = [_stream("first", 0, 100, 4), _stream("second", 500, 100, 8)]
+        timeline = concurrency.timeline(streams, bin_sec=0.5)
+        total = timeline.loc[timeline["stream"] == "all"]
+        self.assertEqual(list(total["time_sec"]), [0, 0.5, 1.0])
+        self.assertEqual(list(total["active_streams"]), [1, 2, 1])
+        self.assertEqual(list(total["fps"]), [100, 200, 100])
+        np.testing.assert_allclose(total["inflight"], [0.4, 1.2, 0.8], atol=0.02)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+from encapp_tool.daemon import DAEMON_ENV, EncappDaemon, request_daemon
+from encapp_tool.trace import TRACER, span
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def fail(argv):
+    raise AssertionError(f"error: {argv[1]}")
+
+
+def traced(argv):
+    # like encapp.py --chrome_trace
+    TRACER.enable()
+    TRACER.set_context(test=argv[1])
+    with span("push"):
+        pass
+    TRACER.write_chrome_trace(argv[2])
+    TRACER.close()
+
+
+class TestEncappDaemon(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.workdir.name, "daemon.sock")
+        self.resultdir = os.path.join(self.workdir.name, "results")
+        os.mkdir(self.resultdir)
+        self.daemon = EncappDaemon(self.path, {"search": "encapp_search", "verify": fail})
+        self.thread = threading.Thread(target=self.daemon.serve_forever)
+        self.thread.start()
+        # wait until the socket is listening
+        while request_daemon(self.path, "ping") is None:
+            self.thread.join(0.01)
+
+    def tearDown(self):
+        request_daemon(self.path, "shutdown")
+        self.thread.join()
+        self.assertFalse(os.path.exists(self.path))
+        self.workdir.cleanup()
+
+    def _run(self, script, *args, path=None):
+        env = dict(os.environ)
+        env[DAEMON_ENV] = path or self.path
+        return subprocess.run(
+            [sys.executable, os.path.join(SCRIPTS_DIR, script)] + list(args),
+            cwd=self.resultdir,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+
+    def test_ping_shall_report_the_daemon(self):
+        reply = request_daemon(self.path, "ping")
+        self.assertEqual(reply["pid"], os.getpid())
+        self.assertEqual(reply["tools"], ["search", "verify"])
+
+    def test_search_shall_run_in_the_daemon(self):
+        settings = {
+            "codec": "video/avc",
+            "gop": 1,
+            "fps": 30,
+            "width": 1280,
+            "height": 720,
+            "bitrate": "500k",
+            "meanbitrate": 490000,
+        }
+        for num, height in enumerate([720, 1080]):
+            settings["height"] = height
+            with open(os.path.join(self.resultdir, f"encapp_{num}.json"), "w") as f:
+                json.dump({"encodedfile": f"encapp_{num}.mp4", "settings": settings}, f)
+
+        result = self._run("encapp_search.py", "-i", "-s", "1280x720")
+        self.assertEqual(result.returncode, 0, result.stderr)
+        # relative to the cwd of the client
+        self.assertEqual(result.stdout, f"{self.resultdir}/encapp_0.json\n")
+        result = self._run("encapp_search.py", "-v", "-s", "1080")
+        self.assertEqual(result.stdout, f"{self.resultdir}/encapp_1.mp4\n")
+        self.assertEqual(request_daemon(self.path, "ping")["requests"], 2)
+
+    def test_errors_shall_set_the_exit_code(self):
+        result = self._run("encapp_verify.py", "broken")
+        self.assertEqual(result.returncode, 1)
+        self.assertEqual(result.stderr, "error: broken\n")
+        result = self._run("encapp_search.py", "--no_such_option")
+        self.assertEqual(result.returncode, 2)
+        self.assertIn("encapp_search.py: error: unrecognized arguments", result.stderr)
+
+    def test_tools_shall_only_see_the_client_env(self):
+        seen = {}
+
+        def env_tool(argv):
+            seen.update((key, os.environ.get(key)) for key in ("ANDROID_SERIAL", "ENCAPP_BENCH_SCALE"))
+
+        daemon = EncappDaemon(os.path.join(self.workdir.name, "env.sock"), {"env": env_tool})
+        os.environ["ANDROID_SERIAL"] = "daemon"
+        client, server = socket.socketpair()
+        try:
+            request = {"tool": "env", "argv": ["env"], "env": {"ENCAPP_BENCH_SCALE": "small"}}
+            self.assertEqual(daemon.run_tool(request, server), 0)
+        finally:
+            del os.environ["ANDROID_SERIAL"]
+            client.close()
+            server.close()
+        self.assertEqual(seen, {"ANDROID_SERIAL": None, "ENCAPP_BENCH_SCALE": "small"})
+
+    def test_traces_shall_only_hold_their_own_request(self):
+        daemon = EncappDaemon(os.path.join(self.workdir.name, "trace.sock"), {"trace": traced})
+        client, server = socket.socketpair()
+        traces = []
+        try:
+            for name in ("first", "second"):
+                path = os.path.join(self.workdir.name, f"{name}.json")
+                self.assertEqual(daemon.run_tool({"tool": "trace", "argv": ["trace", name, path]}, server), 0)
+                with open(path) as fd:
+                    traces.append(json.load(fd)["traceEvents"])
+        finally:
+            client.close()
+            server.close()
+        args = [[event["args"] for event in events] for events in traces]
+        self.assertEqual(args, [[{"test": "first"}], [{"test": "second"}]])
+        self.assertEqual((TRACER.spans, TRACER.context), ([], {}))
+
+    def test_clients_shall_run_locally_without_daemon(self):
+        path = os.path.join(self.workdir.name, "stopped.sock")
+        result = self._run("encapp_search.py", "--help", path=path)
+        self.assertEqual(result.returncode, 0)
+        self.assertIn("usage", result.stdout)
+        self.assertEqual(request_daemon(self.path, "ping")["requests"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+import proto.tests_pb2 as tests_definitions
+from encapp_tool import adb_cmds, app_utils
+from encapp_tool.emulated_device import EmulatedDevice
+
+SERIAL = "emulated0001"
+ACTIVITY = app_utils.ACTIVITY
+
+
+class TestEmulatedDevice(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.device = EmulatedDevice(
+            os.path.join(self.tmpdir.name, "dev"), tests_definitions.Tests, seed=1
+        )
+        adb_cmds.set_adb_backend(self.device)
+
+    def tearDown(self):
+        adb_cmds.set_adb_backend(None)
+        self.tmpdir.cleanup()
+
+    def _host_file(self, name, size):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, "wb") as fd:
+            fd.write(b"\0" * size)
+        return path
+
+    def _push_test(self, frames=10):
+        tests = tests_definitions.Tests()
+        test = tests.test.add()
+        test.common.description = "emulated"
+        test.input.filepath = "/sdcard/source.yuv"
+        test.input.resolution = "176x144"
+        test.input.framerate = 30
+        test.input.playout_frames = frames
+        test.configure.codec = "OMX.google.h264.encoder"
+        test.configure.bitrate = "100 kbps"
+        path = os.path.join(self.tmpdir.name, "test.run.bin")
+        with open(path, "wb") as fd:
+            fd.write(tests.SerializeToString())
+        adb_cmds.run_cmd(f"adb -s {SERIAL} push {path} /sdcard/")
+
+    def test_device_shall_be_listed(self):
+        model, serial = adb_cmds.get_device_info(None)
+        self.assertEqual(serial, SERIAL)
+        self.assertEqual(model["model"], "emulator")
+        self.assertTrue(app_utils.install_ok(SERIAL))
+
+    def test_push_ls_pull_rm(self):
+        path = self._host_file("source.yuv", 38016)
+        ret, _, _ = adb_cmds.run_cmd(f"adb -s {SERIAL} push {path} /sdcard/")
+        self.assertTrue(ret)
+        _, stdout, _ = adb_cmds.run_cmd(f"adb -s {SERIAL} shell ls -l /sdcard/")
+        self.assertIn(" 38016 ", stdout)
+        pulled = os.path.join(self.tmpdir.name, "pulled")
+        os.mkdir(pulled)
+        adb_cmds.run_cmd(f"adb -s {SERIAL} pull /sdcard/source.yuv {pulled}")
+        self.assertEqual(os.path.getsize(os.path.join(pulled, "source.yuv")), 38016)
+        adb_cmds.run_cmd(f"adb -s {SERIAL} shell rm /sdcard/source.yuv")
+        _, stdout, _ = adb_cmds.run_cmd(f"adb -s {SERIAL} shell ls /sdcard/")
+        self.assertEqual(stdout, "")
+
+    def test_unknown_serial_shall_fail(self):
+        ret, _, stderr = adb_cmds.run_cmd("adb -s other shell ls /sdcard/")
+        self.assertFalse(ret)
+        self.assertIn("not found", stderr)
+
+    def test_test_run_shall_leave_results(self):
+        self._push_test(frames=10)
+        adb_cmds.run_cmd(
+            f"adb -s {SERIAL} shell am start -W -e test /sdcard/test.run.bin {ACTIVITY}"
+        )
+        _, stdout, _ = adb_cmds.run_cmd(f"adb -s {SERIAL} shell ls /sdcard/")
+        names = stdout.split()
+        json_names = [name for name in names if name.endswith(".json")]
+        self.assertEqual(len(json_names), 1)
+        with open(os.path.join(self.device.sdcard, json_names[0])) as fd:
+            result = json.load(fd)
+        self.assertEqual(result["framecount"], 10)
+        self.assertEqual(len(result["frames"]), 10)
+        self.assertEqual(result["frames"][0]["iframe"], 1)
+        self.assertIn(result["encodedfile"], names)
+        self.assertIn("OMX.google.h264.encoder", result["testdefinition"])
+
+    def test_app_shall_run_for_frame_time(self):
+        self.device.frame_time = 0.01
+        self._push_test(frames=10)
+        adb_cmds.run_cmd(
+            f"adb -s {SERIAL} shell am start -W -e test /sdcard/test.run.bin {ACTIVITY}"
+        )
+        self.assertGreater(adb_cmds.get_app_pid(SERIAL, app_utils.APPNAME_MAIN), 0)
+        time.sleep(0.15)
+        self.assertEqual(adb_cmds.get_app_pid(SERIAL, app_utils.APPNAME_MAIN), -1)
+
+    def test_list_codecs_shall_write_codecs_txt(self):
+        adb_cmds.run_cmd(
+            f"adb -s {SERIAL} shell am start -e ui_hold_sec 3 -e list_codecs a {ACTIVITY}"
+        )
+        adb_cmds.run_cmd(f"adb -s {SERIAL} shell pidof {app_utils.APPNAME_MAIN}")
+        with open(os.path.join(self.device.sdcard, "codecs.txt")) as fd:
+            codecs = fd.read()
+        self.assertTrue(codecs.startswith("encoders {"))
+        self.assertIn("name: c2.android.hevc.encoder", codecs)
+
+
+if __name__ == "__main__":
+    unittest.main()
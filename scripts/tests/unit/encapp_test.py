@@ -0,0 +1,98 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import encapp
+import proto.tests_pb2 as tests_definitions
+from encapp_tool import adb_cmds, codec_caps
+from encapp_tool.emulated_device import EmulatedDevice
+from encapp_tool.journal import RunJournal
+
+
+class BrokenDevice(EmulatedDevice):
+    # the app leaves no result for tests with id "broken"
+    def write_result(self, test, frame_count):
+        if test.common.id == "broken":
+            return {}
+        return super().write_result(test, frame_count)
+
+
+class TestRunCodecTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.device = BrokenDevice(os.path.join(self.tmpdir.name, "dev"), tests_definitions.Tests)
+        adb_cmds.set_adb_backend(self.device)
+        self.source = os.path.join(self.tmpdir.name, "source.yuv")
+        with open(self.source, "wb") as fd:
+            fd.write(b"\0" * (176 * 144 * 3 // 2 * 10))
+        self.workdir = os.path.join(self.tmpdir.name, "out")
+
+    def tearDown(self):
+        adb_cmds.set_adb_backend(None)
+        self.tmpdir.cleanup()
+
+    def _tests(self, *ids, resolution="176x144"):
+        tests = tests_definitions.Tests()
+        for test_id in ids:
+            test = tests.test.add()
+            test.common.id = test_id
+            test.input.filepath = self.source
+            test.input.resolution = resolution
+            test.input.framerate = 30
+            test.input.playout_frames = 10
+            test.configure.codec = "OMX.google.h264.encoder"
+        return tests
+
+    def _run(self, tests, **settings):
+        run_settings = dict(encapp.extra_settings)
+        run_settings.update(configfile="tests.pbtxt", output=self.workdir, preflight="off")
+        run_settings.update(settings)
+        self.output = io.StringIO()
+        with patch.object(encapp, "WAIT_POLL_INTERVAL", 0.01), patch.object(
+            codec_caps, "CACHE_DIR", self.tmpdir.name
+        ), contextlib.redirect_stdout(self.output):
+            return encapp.run_codec_tests(tests, self.device.model, self.device.serial, self.workdir, run_settings)
+
+    def test_missing_results_shall_fail_with_the_partial_results(self):
+        with self.assertRaises(encapp.RunFailed) as failure:
+            self._run(self._tests("good", "broken"), batch_size=1)
+        self.assertIn("tests_0001.run.bin", str(failure.exception))
+        self.assertEqual(len(failure.exception.results), 1)
+        self.assertTrue(os.path.exists(failure.exception.results[0]))
+        # the batch with results is kept for --resume
+        self.assertEqual(len(RunJournal(self.workdir).completed_tests()), 1)
+
+    def test_a_run_shall_fail_when_one_of_its_tests_has_no_result(self):
+        with self.assertRaises(encapp.RunFailed) as failure:
+            self._run(self._tests("good", "broken"))
+        self.assertIn("tests.run.bin", str(failure.exception))
+        self.assertEqual(len(failure.exception.results), 1)
+        self.assertEqual(RunJournal(self.workdir).completed_tests(), set())
+
+        results = self._run(self._tests("good", "good"))
+        self.assertEqual(len(results), 2)
+
+    def test_prune_shall_skip_and_list_the_tests_failing_the_preflight(self):
+        tests = self._tests("good")
+        tests.test.extend(self._tests("wrong_size", resolution="352x288").test)
+        results = self._run(tests, preflight="prune")
+        self.assertEqual(len(results), 1)
+        self.assertIn("Warning, skipping 1 of 2 tests: wrong_size", self.output.getvalue())
+
+    def test_the_preflight_shall_be_off_by_default(self):
+        results = self._run(self._tests("good", "good"), preflight=encapp.extra_settings["preflight"])
+        self.assertEqual(len(results), 2)
+        self.assertNotIn("codec capabilities", self.output.getvalue())
+
+    def test_completed_tests_shall_only_be_skipped_with_resume(self):
+        self.assertEqual(len(self._run(self._tests("first"))), 1)
+        self.assertEqual(len(self._run(self._tests("first"))), 1)
+        self.assertEqual(self._run(self._tests("first"), resume=True), [])
+        self.assertEqual(len(self._run(self._tests("first", "second"), resume=True)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,206 @@
+import json
+import os
+import tempfile
+import unittest
+from concurrent.futures import Future
+
+import numpy as np
+
+import encapp_verify
+
+# RESULT.txt of the dynamic_bitrate result below, as written by encapp_verify.py
+# before the checks were split into records and their formatting
+DYNAMIC_BITRATE_REPORT = """
+
+
+   ===  Verify bitrate accuracy ===
+
+
+----- test case: [dynamic] -----
+failed "Dynamic bitrate",  codec: hevc, 720p @ 30fps, result.json
+        0% error in    0:  30 ( 499kbps) for  500kbps
+      -50% error in   30:  59 ( 499kbps) for 1000kbps
+      (limit set to 5%)
+-----
+
+
+
+   ===  Verify framerate accuracy ===
+
+
+----- test case: [dynamic] -----
+passed "Framerate accuracy"   0 % error for 30.00 fps (30.00 fps), codec: hevc,  720p @ 30.00 fps, result.json
+      (limit set to 5%)
+-----
+
+
+
+   ===  Verify idr accuracy ===
+
+
+----- test case: [dynamic] -----
+failed "Even gop" at  1 frames, result.json
+passed "Runtime sync request" at 45 frames, result.json
+-----
+"""
+DYNAMIC_FRAMERATE_REPORT = """
+
+
+   ===  Verify bitrate accuracy ===
+
+
+----- test case: [framerate] -----
+passed "Bitrate accuracy"   0 % error for  500kbps ( 499kbps), codec: hevc,  720p @ 30.00 fps, result.json
+      (limit set to 5%)
+-----
+
+
+
+   ===  Verify framerate accuracy ===
+
+
+----- test case: [framerate] -----
+failed "Dynamic framerate",  codec: hevc, 720p @ 30fps, result.json
+        0% error in    0:  40 (30.00 fps) for 30.00 fps
+       50% error in   40:  59 (30.00 fps) for 15.00 fps
+      (limit set to 5%)
+-----
+
+
+
+   ===  Verify idr accuracy ===
+
+
+----- test case: [framerate] -----
+passed "Even gop" at  1 frames, result.json
+-----
+"""
+DYNAMIC_BITRATE = 'runtime {\n  video_bitrate {\n    framenum: 30\n    bitrate: "1M"\n  }\n  request_sync: 45\n}\n'
+DYNAMIC_FRAMERATE = "runtime {\n  dynamic_framerate {\n    framenum: 40\n    framerate: 15\n  }\n}\n"
+
+
+def _result(test_id, runtime="", bitrate=500000, frame_count=60, key_frames=(0, 30)):
+    # a 720p30 hevc result with frames sized for the bitrate
+    definition = (
+        f'common {{\n  id: "{test_id}"\n}}\n'
+        f'configure {{\n  codec: "hevc"\n  bitrate: "{bitrate // 1000}k"\n  framerate: 30\n  i_frame_interval: 1\n}}\n'
+        f"{runtime}"
+    )
+    frames = []
+    for num in range(frame_count):
+        start = 1000000000 + num * 33333333
+        frames.append(
+            {
+                "frame": num,
+                "original_frame": num,
+                "iframe": int(num in key_frames),
+                "size": bitrate // 8 // 30,
+                "pts": num * 33333,
+                "proctime": 8000000,
+                "starttime": start,
+                "stoptime": start + 8000000,
+            }
+        )
+    mean = sum(frame["size"] for frame in frames) * 8 * 30 // frame_count
+    return {
+        "test": test_id,
+        "testdefinition": definition,
+        "settings": {"codec": "hevc", "height": 720, "width": 1280, "fps": 30, "gop": 1, "bitrate": str(bitrate),
+                     "meanbitrate": mean},
+        "frames": frames,
+    }
+
+
+class TestEncappVerify(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _write(self, result, name="result.json"):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, "w") as fd:
+            json.dump(result, fd)
+        return path
+
+    def test_temporal_layers_shall_restart_at_key_frames(self):
+        # android.generic.3 at 5 fps, with a key frame in the middle of a period
+        iframes = [1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 0, 0]
+        layers = encapp_verify.temporal_layer_ids(iframes, 3)
+        self.assertEqual(list(layers), [0, 2, 1, 2, 0, 0, 2, 1, 2, 0, 2, 1])
+
+        sizes = {0: 1000, 1: 200, 2: 100}
+        frames = [
+            {"iframe": iframe, "size": sizes[layer], "pts": num * 200000, "starttime": 0,
+             "stoptime": 2000000 * (layer + 1)}
+            for num, (iframe, layer) in enumerate(zip(iframes, layers))
+        ]
+        stats = encapp_verify.temporal_layer_stats(frames, 3)
+        self.assertEqual(list(stats["bytes"]), [4000, 600, 500])
+        self.assertEqual(list(stats["frames"]), [4, 3, 5])
+        np.testing.assert_allclose(stats["bitrate"], np.array([4000, 600, 500]) * 8 / 2.2)
+        # bits per layer in each second
+        self.assertEqual(
+            stats["bitrate_per_second"].tolist(), [[16000, 1600, 1600], [16000, 1600, 1600], [0, 1600, 800]]
+        )
+        self.assertEqual(list(stats["latency_ms"]), [2, 4, 6])
+
+        # b-frames: the first frame does not have the lowest pts
+        frames[0]["pts"], frames[1]["pts"] = frames[1]["pts"], frames[0]["pts"]
+        stats = encapp_verify.temporal_layer_stats(frames, 3)
+        self.assertEqual(stats["bitrate_per_second"].shape, (3, 3))
+
+    def test_records_shall_format_like_the_text_report(self):
+        path = self._write(_result("dynamic", DYNAMIC_BITRATE, key_frames=(0, 30, 45)))
+        records = encapp_verify.run_checks([path])
+        self.assertTrue(all(list(record) == encapp_verify.RECORD_FIELDS for record in records))
+        segments = [record for record in records if record["check"] == "bitrate" and record["metric"] == "bitrate"]
+        self.assertEqual(
+            [(record["first_frame"], record["last_frame"], record["target"], record["error_perc"])
+             for record in segments],
+            [(0, 30, 500000, 0), (30, 59, 1000000, -50)],
+        )
+        self.assertEqual(segments[0]["codec"], "hevc")
+        self.assertEqual(encapp_verify.format_report(records), DYNAMIC_BITRATE_REPORT)
+
+        path = self._write(_result("framerate", DYNAMIC_FRAMERATE))
+        self.assertEqual(encapp_verify.format_report(encapp_verify.run_checks([path])), DYNAMIC_FRAMERATE_REPORT)
+
+        # the limit follows every test case of the accuracy tables
+        paths = [self._write(_result(name), f"{name}.json") for name in ("a", "b")]
+        text = encapp_verify.format_check(encapp_verify.run_checks(paths), "bitrate")
+        self.assertEqual(text.count("(limit set to 5%)"), 2)
+
+    def test_failed_runs_shall_be_reported(self):
+        record = encapp_verify.make_record("run", "lt2.pbtxt", "Missing results from lt2.run.bin", None, "results",
+                                           measured=0, passed=False)
+        self.assertIn("   ===  Failed test runs ===\n\nlt2.pbtxt: Missing results from lt2.run.bin\n-----",
+                      encapp_verify.format_report([record]))
+
+    def test_parallel_checks_shall_keep_the_file_order(self):
+        # the first files take longest to check
+        paths = [
+            self._write(_result(f"test{num}", frame_count=600 - num * 90), f"result_{num}.json")
+            for num in range(6)
+        ]
+        records = encapp_verify.run_checks(paths, jobs=3)
+        files = [record["file"] for record in records]
+        self.assertEqual(sorted(set(files), key=files.index), [os.path.basename(path) for path in paths])
+        self.assertEqual(records, encapp_verify.run_checks(paths, jobs=1))
+
+    def test_critical_failures_shall_only_stop_on_critical_checks(self):
+        failed = encapp_verify.make_record("bitrate", "t", "Bitrate accuracy", "r.json", "bitrate", passed=False)
+        passed = encapp_verify.make_record("idr", "t", "Even gop", "r.json", "gop", passed=True)
+        done = Future()
+        done.set_result([failed, passed])
+        running = Future()
+        self.assertEqual(encapp_verify.critical_failures([done, running], ["bitrate"]), [failed])
+        self.assertEqual(encapp_verify.critical_failures([done, running], ["idr", "framerate"]), [])
+        self.assertEqual(encapp_verify.critical_failures([done, running], []), [])
+        # results not checked yet do not count
+        self.assertEqual(encapp_verify.critical_failures([running], ["bitrate"]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
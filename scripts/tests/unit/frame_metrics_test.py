@@ -0,0 +1,55 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from encapp_tool import frame_metrics
+
+# 30 fps, the third frame failed (negative proctime)
+PTS = np.array([0, 33333, 66666, 100000, 133333, 166666])
+STARTTIME = 1000000000 + PTS * 1000
+PROCTIME = np.array([5000000, 6000000, -1, 5000000, 20000000, 5000000])
+STOPTIME = STARTTIME + PROCTIME
+SIZE = np.array([10000, 1000, 1000, 1000, 1000, 1000])
+
+
+class TestFrameMetrics(unittest.TestCase):
+    def test_rolling_mean_shall_match_pandas(self):
+        values = np.random.default_rng(1).uniform(0, 60, 100)
+        expected = pd.Series(values).rolling(7, min_periods=7).mean().values
+        np.testing.assert_allclose(frame_metrics.rolling_mean(values, 7), expected)
+        values[50] = np.inf
+        means = frame_metrics.rolling_mean(values, 7)
+        self.assertTrue(np.isnan(means[50:57]).all())
+        self.assertTrue(np.isfinite(means[57:]).all())
+
+    def test_inflight_shall_count_overlapping_frames(self):
+        rng = np.random.default_rng(1)
+        start = np.sort(rng.integers(0, 1000, 200))
+        stop = start + rng.integers(1, 100, 200)
+        expected = [np.sum((stop > begin) & (start < end)) for begin, end in zip(start, stop)]
+        np.testing.assert_array_equal(frame_metrics.inflight(start, stop), expected)
+
+    def test_frame_metrics_shall_mask_invalid_frames(self):
+        valid, metrics = frame_metrics.frame_metrics(PTS, STARTTIME, STOPTIME, PROCTIME, size=SIZE, window=2)
+        self.assertEqual(list(valid), [True, True, False, True, True, False])
+        self.assertEqual(list(metrics["duration_ms"]), [33.33, 33.33, 33.33, 33.33])
+        self.assertEqual(list(metrics["fps"]), [30.0] * 4)
+        self.assertEqual(list(metrics["rel_start_ms"]), [0, 33.33, 100, 133.33])
+        # the failed frame is not part of the averages
+        self.assertAlmostEqual(metrics["average_bitrate"][0], 13000 * 8 / 4 / 0.03333)
+        # to the next frame stop, failed or not
+        self.assertEqual(list(metrics["stop-stop_ms"]), [34.33, 27.33, 48.33, 18.33])
+        # the first window is not full yet
+        self.assertEqual(metrics["av_proc_fps"][0], metrics["proc_fps"][0])
+        self.assertAlmostEqual(metrics["av_proc_fps"][1], np.mean(metrics["proc_fps"][:2]))
+
+        # or nan for them
+        _, metrics = frame_metrics.frame_metrics(PTS, STARTTIME, STOPTIME, PROCTIME, window=2, drop_invalid=False)
+        self.assertEqual(len(metrics["fps"]), 6)
+        self.assertTrue(np.isnan(metrics["fps"][[2, 5]]).all())
+        self.assertNotIn("average_bitrate", metrics)
+
+
+if __name__ == "__main__":
+    unittest.main()
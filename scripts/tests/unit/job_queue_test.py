@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+
+from encapp_tool import job_queue
+from encapp_tool.job_queue import JobQueue, codec_matches
+
+CODECS = {"c2.android.avc.encoder", "video/avc", "c2.android.hevc.encoder", "video/hevc"}
+
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.queue = JobQueue(os.path.join(self.workdir.name, "jobs.sqlite"))
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def test_codec_matches_shall_accept_names_and_media_types(self):
+        self.assertTrue(codec_matches("video/hevc", CODECS))
+        self.assertTrue(codec_matches("C2.android.avc.encoder", CODECS))
+        self.assertFalse(codec_matches("video/av01", CODECS))
+
+    def test_claim_shall_honor_constraints_and_priority(self):
+        plain = self.queue.submit("plain.pbtxt", args=["-r", "1M"])
+        av1 = self.queue.submit("av1.pbtxt", codec="video/av01")
+        pixel = self.queue.submit("pixel.pbtxt", model="pixel")
+        urgent = self.queue.submit("urgent.pbtxt", codec="video/hevc", priority=1)
+
+        job = self.queue.claim("serial1", "emulator", CODECS)
+        self.assertEqual(job["id"], urgent)
+        job = self.queue.claim("serial1", "emulator", CODECS)
+        self.assertEqual(job["id"], plain)
+        self.assertEqual(job["args"], ["-r", "1M"])
+        self.assertEqual(job["state"], job_queue.RUNNING)
+        self.assertIsNone(self.queue.claim("serial1", "emulator", CODECS))
+        self.assertTrue(self.queue.has_runnable("pixel", CODECS))
+        self.assertEqual(self.queue.claim("serial2", "pixel", CODECS)["id"], pixel)
+        self.assertEqual(self.queue.jobs(job_queue.QUEUED)[0]["id"], av1)
+
+    def test_failed_attempts_shall_be_retried_elsewhere_first(self):
+        first = self.queue.submit("first.pbtxt", max_attempts=2)
+        second = self.queue.submit("second.pbtxt")
+        job = self.queue.claim("serial1", "emulator", CODECS)
+        self.assertEqual(self.queue.finish(job, 1, device_ok=False), job_queue.QUEUED)
+
+        # the device that failed the job gets other work first
+        self.assertEqual(self.queue.claim("serial1", "emulator", CODECS)["id"], second)
+        job = self.queue.claim("serial2", "emulator", CODECS)
+        self.assertEqual(job["id"], first)
+        self.assertEqual(self.queue.finish(job, 1, error="broken"), job_queue.FAILED)
+
+        failed = self.queue.job(first)
+        self.assertEqual(failed["attempts"], 2)
+        self.assertEqual(failed["error"], "broken")
+        attempts = self.queue.attempts(first)
+        self.assertEqual([attempt["serial"] for attempt in attempts], ["serial1", "serial2"])
+        self.assertTrue(all(attempt["finished"] >= attempt["started"] for attempt in attempts))
+
+        self.assertTrue(self.queue.retry(first))
+        job = self.queue.claim("serial2", "emulator", CODECS)
+        self.assertEqual(self.queue.finish(job, 0), job_queue.DONE)
+        self.assertFalse(self.queue.cancel(first))
+
+    def test_test_failures_shall_not_be_retried(self):
+        job_id = self.queue.submit("test.pbtxt", max_attempts=3)
+        job = self.queue.claim("serial1", "emulator", CODECS)
+        self.assertEqual(self.queue.finish(job, 1, device_ok=True, error="broken"), job_queue.FAILED)
+        self.assertEqual(self.queue.job(job_id)["attempts"], 1)
+
+    def test_recover_shall_queue_interrupted_jobs(self):
+        job_id = self.queue.submit("test.pbtxt")
+        self.queue.claim("serial1", "emulator", CODECS)
+        self.assertEqual(self.queue.recover(["serial2"]), 0)
+        self.assertEqual(self.queue.recover(["serial1"]), 1)
+        job = self.queue.job(job_id)
+        self.assertEqual(job["state"], job_queue.QUEUED)
+        self.assertEqual(job["attempts"], 0)
+
+    def test_canceled_jobs_shall_stay_canceled(self):
+        self.queue.submit("test.pbtxt")
+        job = self.queue.claim("serial1", "emulator", CODECS)
+        self.assertTrue(self.queue.cancel(job["id"]))
+        self.assertEqual(self.queue.finish(job, 0), job_queue.CANCELED)
+        self.assertIsNone(self.queue.job(job["id"] + 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+
+from encapp_tool.journal import JOURNAL_FILE_NAME, RunJournal
+
+
+class TestRunJournal(unittest.TestCase):
+    def test_new_journal_shall_be_empty(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            journal = RunJournal(workdir)
+            self.assertFalse(journal.exists())
+            self.assertEqual(journal.completed_tests(), set())
+            self.assertEqual(journal.collected_files(), [])
+
+    def test_records_shall_survive_reload(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            journal = RunJournal(workdir)
+            journal.record_file(f"{workdir}/encapp_1.mp4")
+            journal.record_file(f"{workdir}/encapp_1.json")
+            journal.record_test("test_a", [f"{workdir}/encapp_1.json"])
+            self.assertTrue(journal.exists())
+
+            resumed = RunJournal(workdir)
+            self.assertEqual(resumed.completed_tests(), {"test_a"})
+            self.assertEqual(
+                resumed.collected_files(),
+                [f"{workdir}/encapp_1.mp4", f"{workdir}/encapp_1.json"],
+            )
+            self.assertEqual(resumed.result_files(), [f"{workdir}/encapp_1.json"])
+
+    def test_load_shall_ignore_truncated_lines(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            journal = RunJournal(workdir)
+            journal.record_test("test_a", [])
+            with open(os.path.join(workdir, JOURNAL_FILE_NAME), "a") as fd:
+                fd.write('{"event": "test", "te')
+            resumed = RunJournal(workdir)
+            self.assertEqual(resumed.completed_tests(), {"test_a"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+import numpy as np
+
+from encapp_tool.latency import QuantileSketch, StreamLatency
+
+MS = 1000000
+
+
+class TestLatency(unittest.TestCase):
+    def test_quantile_shall_be_within_the_relative_accuracy(self):
+        values = np.random.default_rng(1).lognormal(3, 1, 10000)
+        sketch = QuantileSketch(0.01)
+        sketch.add(values)
+        ordered = np.sort(values)
+        for q in (0.0, 0.5, 0.9, 0.99, 0.999, 1.0):
+            rank = q * (len(values) - 1)
+            lower, higher = ordered[int(np.floor(rank))], ordered[int(np.ceil(rank))]
+            estimate = sketch.quantile(q)
+            self.assertGreaterEqual(estimate, lower * 0.99)
+            self.assertLessEqual(estimate, higher * 1.01)
+        self.assertAlmostEqual(sketch.mean, np.mean(values))
+        self.assertTrue(np.isnan(QuantileSketch().quantile(0.5)))
+
+    def test_merge_shall_equal_one_sketch_of_all_values(self):
+        values = np.random.default_rng(1).uniform(0, 100, 1000)
+        values[:10] = 0
+        sketch, first, second = QuantileSketch(), QuantileSketch(), QuantileSketch()
+        sketch.add(values)
+        first.add(values[:300])
+        second.add(values[300:])
+        first.merge(second)
+        for q in (0.01, 0.5, 0.99):
+            self.assertEqual(first.quantile(q), sketch.quantile(q))
+        self.assertEqual((first.count, first.zero_count, first.max), (1000, 10, values.max()))
+        with self.assertRaises(ValueError):
+            first.merge(QuantileSketch(0.02))
+
+    def test_stream_shall_count_late_runs_across_chunks(self):
+        # 20 ms deadline: late frames 1-3 and 5-8 (across chunks)
+        latency = np.array([10, 30, 30, 30, 10, 30, 30, 30, 30, 10])
+        start = np.arange(len(latency)) * 33 * MS
+        stream = StreamLatency(20, interval_ms=33)
+        for chunk in (slice(0, 4), slice(4, 6), slice(6, 10)):
+            stream.add(start[chunk], start[chunk] + latency[chunk] * MS, np.ones(len(latency[chunk]), dtype=int))
+        summary = stream.summary()
+        self.assertEqual(summary["late"], 7)
+        self.assertEqual(summary["max_consecutive_late"], 4)
+        self.assertEqual(summary["frames"], 10)
+        self.assertEqual(summary["inflight_1"], 10)
+        # outputs 20 ms off the interval when the latency changes
+        self.assertEqual(stream.jitter.count, 9)
+        self.assertAlmostEqual(summary["jitter_p50_ms"], 0)
+        self.assertAlmostEqual(stream.jitter.max, 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from encapp_tool import media_probe
+
+FFPROBE_OUTPUT = json.dumps(
+    {
+        "streams": [
+            {"index": 0, "codec_type": "audio", "codec_name": "aac"},
+            {
+                "index": 1,
+                "codec_type": "video",
+                "codec_name": "h264",
+                "width": 1280,
+                "height": 720,
+                "r_frame_rate": "30000/1001",
+                "duration": "10.010000",
+            },
+        ],
+        "format": {"format_name": "mov,mp4,m4a,3gp,3g2,mj2", "size": "4"},
+    }
+)
+
+
+@patch("encapp_tool.media_probe.run_cmd", return_value=(True, FFPROBE_OUTPUT, ""))
+class TestMediaProbe(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.patcher = patch("encapp_tool.media_probe.CACHE_DIR", os.path.join(self.tmpdir.name, "cache"))
+        self.patcher.start()
+        media_probe._CACHE.clear()
+        self.path = os.path.join(self.tmpdir.name, "video.mp4")
+        with open(self.path, "wb") as fd:
+            fd.write(b"mp4\n")
+
+    def tearDown(self):
+        self.patcher.stop()
+        media_probe._CACHE.clear()
+        self.tmpdir.cleanup()
+
+    def test_probe_shall_run_ffprobe_once_per_file_version(self, mock_run):
+        self.assertEqual(media_probe.get_resolution(self.path), "1280x720")
+        self.assertEqual(media_probe.video_stream(self.path)["codec_name"], "h264")
+        self.assertEqual(mock_run.call_count, 1)
+        self.assertIn("-of json", mock_run.call_args[0][0])
+
+        # the on-disk cache serves other processes
+        media_probe._CACHE.clear()
+        self.assertEqual(media_probe.probe(self.path)["format"]["size"], "4")
+        self.assertEqual(mock_run.call_count, 1)
+
+        with open(self.path, "ab") as fd:
+            fd.write(b"more")
+        media_probe.probe(self.path)
+        self.assertEqual(mock_run.call_count, 2)
+
+    def test_failed_probes_shall_not_be_cached(self, mock_run):
+        mock_run.return_value = (False, "", "")
+        self.assertIsNone(media_probe.get_resolution(self.path))
+        self.assertIsNone(media_probe.probe(os.path.join(self.tmpdir.name, "missing.mp4")))
+        mock_run.return_value = (True, FFPROBE_OUTPUT, "")
+        self.assertEqual(media_probe.get_resolution(self.path), "1280x720")
+        self.assertEqual(mock_run.call_count, 2)
+
+    def test_parse_rate(self, mock_run):
+        self.assertEqual(media_probe.parse_rate("30/1"), 30)
+        self.assertAlmostEqual(media_probe.parse_rate("30000/1001"), 29.97, places=2)
+        self.assertIsNone(media_probe.parse_rate("0/0"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+import os
+import struct
+import tempfile
+import unittest
+
+from encapp_tool import nal_parser
+
+
+class BitWriter:
+    def __init__(self):
+        self.bits = ""
+
+    def u(self, bits, val):
+        self.bits += format(val, f"0{bits}b") if bits else ""
+        return self
+
+    def ue(self, val):
+        code = format(val + 1, "b")
+        self.bits += "0" * (len(code) - 1) + code
+        return self
+
+    def se(self, val):
+        return self.ue(2 * val - 1 if val > 0 else -2 * val)
+
+    def data(self):
+        bits = self.bits + "1"
+        bits += "0" * (-len(bits) % 8)
+        return bytes(int(bits[i : i + 8], 2) for i in range(0, len(bits), 8))
+
+
+def _sps(max_num_ref_frames=3):
+    writer = BitWriter().u(8, 66).u(16, 30).ue(0)
+    # log2_max_frame_num_minus4, pic_order_cnt_type
+    writer.ue(0).ue(2).ue(max_num_ref_frames).u(1, 0).ue(10).ue(8).u(1, 1)
+    writer.u(1, 1).u(1, 0).u(1, 0)
+    return b"\x67" + writer.data()
+
+
+def _pps():
+    writer = BitWriter().ue(0).ue(0).u(1, 0).u(1, 0).ue(0).ue(0).ue(0)
+    writer.u(1, 0).u(2, 0).se(0).se(0).se(0).u(1, 1).u(1, 0).u(1, 0)
+    return b"\x68" + writer.data()
+
+
+def _idr():
+    # first_mb, slice_type I, pps, frame_num, idr_pic_id, marking, qp
+    writer = BitWriter().ue(0).ue(7).ue(0).u(4, 0).ue(0).u(1, 0).u(1, 0)
+    return b"\x65" + writer.data()
+
+
+def _p_slice(frame_num, first_mb=0, mark=-1, use=-1):
+    writer = BitWriter().ue(first_mb).ue(5).ue(0).u(4, frame_num).u(1, 0)
+    if use != -1:
+        writer.u(1, 1).ue(2).ue(use).ue(3)
+    else:
+        writer.u(1, 0)
+    if mark != -1:
+        writer.u(1, 1).ue(6).ue(mark).ue(0)
+    else:
+        writer.u(1, 0)
+    return b"\x41" + writer.data()
+
+
+def _nals():
+    return [
+        _sps(),
+        _pps(),
+        _idr(),
+        _p_slice(1, mark=1),
+        _p_slice(1, first_mb=40),
+        _p_slice(2),
+        _p_slice(3, use=1),
+    ]
+
+
+def _box(kind, payload):
+    return struct.pack(">I4s", 8 + len(payload), kind) + payload
+
+
+def _mp4(nals):
+    sps, pps, *slices = nals
+    avcc = b"\x01\x42\x00\x1e\xff\xe1" + struct.pack(">H", len(sps)) + sps
+    avcc += b"\x01" + struct.pack(">H", len(pps)) + pps
+    avc1 = bytes(78) + _box(b"avcC", avcc)
+    stsd = _box(b"stsd", struct.pack(">II", 0, 1) + _box(b"avc1", avc1))
+    # slices 1 and 2 make up one sample (two slices of a picture)
+    samples = [
+        slices[:1],
+        slices[1:3],
+        slices[3:4],
+        slices[4:],
+    ]
+    samples = [
+        b"".join(struct.pack(">I", len(nal)) + nal for nal in sample)
+        for sample in samples
+    ]
+    sizes = [len(sample) for sample in samples]
+    stsz = _box(
+        b"stsz",
+        struct.pack(f">III{len(sizes)}I", 0, 0, len(sizes), *sizes),
+    )
+    # two chunks of two samples
+    stsc = _box(b"stsc", struct.pack(">IIIII", 0, 1, 1, 2, 1))
+    ftyp = _box(b"ftyp", b"isom" + bytes(4))
+
+    def build(mdat_offset):
+        stco = _box(
+            b"stco",
+            struct.pack(
+                ">IIII", 0, 2, mdat_offset, mdat_offset + sizes[0] + sizes[1]
+            ),
+        )
+        stbl = _box(b"stbl", stsd + stsz + stsc + stco)
+        hdlr = _box(b"hdlr", bytes(8) + b"vide" + bytes(12))
+        mdia = _box(b"mdia", hdlr + _box(b"minf", stbl))
+        return ftyp + _box(b"moov", _box(b"trak", mdia))
+
+    header = build(0)
+    header = build(len(header) + 8)
+    return header + _box(b"mdat", b"".join(samples))
+
+
+class TestNalParser(unittest.TestCase):
+    def test_bit_reader(self):
+        reader = nal_parser.BitReader(BitWriter().ue(0).ue(5).se(-3).u(3, 5).data())
+        self.assertEqual(reader.ue(), 0)
+        self.assertEqual(reader.ue(), 5)
+        self.assertEqual(reader.se(), -3)
+        self.assertEqual(reader.u(3), 5)
+        self.assertEqual(
+            nal_parser.rbsp(b"\x00\x00\x03\x01\x00\x00\x03\x00\x00\x03"),
+            b"\x00\x00\x01\x00\x00\x00\x00\x03",
+        )
+
+    def test_codec_type(self):
+        self.assertEqual(nal_parser.codec_type("OMX.google.h264.encoder"), "h264")
+        self.assertEqual(nal_parser.codec_type("video/avc"), "h264")
+        self.assertEqual(nal_parser.codec_type("c2.android.hevc.encoder"), "h265")
+        self.assertEqual(nal_parser.codec_type("c2.android.vp8.encoder"), None)
+
+    def test_h264_slice_headers(self):
+        data = nal_parser.parse_nal_units(_nals(), nal_parser.H264)
+        self.assertEqual(data["max_num_ref_frames"], [3])
+        self.assertEqual(data["nal_type"], [5, 1, 1, 1, 1])
+        self.assertEqual(data["first_slice"], [1, 1, 0, 1, 1])
+        self.assertEqual(data["frame_num"], [0, 1, 1, 2, 3])
+        self.assertEqual(data["long_term_frame_idx"], [-1, 1, -1, -1, -1])
+        self.assertEqual(data["long_term_pic_num"], [-1, -1, -1, -1, 1])
+
+    def test_h265_temporal_id(self):
+        nals = [b"\x40\x01\x0c", b"\x26\x01\x80", b"\x02\x02\x80", b"\x02\x01\x80"]
+        data = nal_parser.parse_nal_units(nals, nal_parser.H265)
+        self.assertEqual(data["nal_type"], [19, 1, 1])
+        self.assertEqual(data["temporal_id"], [0, 1, 0])
+        self.assertEqual(data["frame_num"], [-1, -1, -1])
+
+    def test_files_shall_match_and_be_cached(self):
+        expected = nal_parser.parse_nal_units(_nals(), nal_parser.H264)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            annexb = os.path.join(tmpdir, "video.264")
+            with open(annexb, "wb") as fd:
+                fd.write(b"".join(b"\x00\x00\x00\x01" + nal for nal in _nals()))
+            mp4 = os.path.join(tmpdir, "video.mp4")
+            with open(mp4, "wb") as fd:
+                fd.write(_mp4(_nals()))
+            for path in (annexb, mp4):
+                data = nal_parser.get_nal_data(path, "video/avc")
+                self.assertEqual(data, expected)
+                self.assertTrue(os.path.exists(path + nal_parser.CACHE_SUFFIX))
+                nal_parser._CACHE.clear()
+                self.assertEqual(nal_parser.get_nal_data(path, "video/avc"), expected)
+        self.assertEqual(nal_parser.get_nal_data(mp4, "vp8"), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
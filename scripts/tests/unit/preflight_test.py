@@ -0,0 +1,54 @@
+import unittest
+
+import proto.tests_pb2 as tests_definitions
+from encapp_tool import codec_caps, preflight
+from encapp_tool.emulated_device import codecs_text
+
+CODECS = codec_caps.parse_codecs(codecs_text())
+# ten 320x240 frames
+MEDIA = {
+    "/sdcard/source.yuv": {"raw": True, "size": 320 * 240 * 3 // 2 * 10},
+    "/sdcard/source.mp4": {"raw": False, "size": 1000, "codec-name": "hevc"},
+    "/sdcard/source.ivf": {"raw": False, "size": 1000, "codec-name": "av1"},
+}
+
+
+def _test(test_id, filepath="/sdcard/source.yuv", resolution="320x240", bitrate="500k"):
+    test = tests_definitions.Test()
+    test.common.id = test_id
+    test.input.filepath = filepath
+    test.input.resolution = resolution
+    test.configure.codec = "c2.android.avc.encoder"
+    test.configure.bitrate = bitrate
+    return test
+
+
+class TestPreflight(unittest.TestCase):
+    def test_check_input_shall_verify_sources(self):
+        self.assertEqual(preflight.check_input(_test("ok"), MEDIA), [])
+        self.assertEqual(preflight.check_input(_test("camera", "camera"), MEDIA), [])
+        self.assertEqual(len(preflight.check_input(_test("size", resolution="640x480"), MEDIA)), 1)
+        self.assertEqual(len(preflight.check_input(_test("no_res", resolution=""), MEDIA)), 1)
+        self.assertEqual(len(preflight.check_input(_test("missing", "/sdcard/other.yuv"), MEDIA)), 1)
+        self.assertEqual(preflight.check_input(_test("hevc", "/sdcard/source.mp4"), MEDIA, CODECS), [])
+        problems = preflight.check_input(_test("av1", "/sdcard/source.ivf"), MEDIA, CODECS)
+        self.assertEqual(problems, ["no decoder for /sdcard/source.ivf (video/av01)"])
+
+    def test_check_tests_shall_split_the_tests(self):
+        tests = tests_definitions.Tests()
+        tests.test.extend([_test("ok"), _test("bitrate", bitrate="100M"), _test("size", resolution="640x480")])
+        parallel = _test("parallel")
+        parallel.parallel.test.append(_test("inner", "/sdcard/source.ivf"))
+        tests.test.append(parallel)
+
+        valid, rejected = preflight.check_tests(tests, MEDIA, CODECS)
+        self.assertEqual([test.common.id for test in valid.test], ["ok"])
+        self.assertEqual([test_id for test_id, _ in rejected], ["bitrate", "size", "parallel"])
+
+        # without capabilities only the sources are checked
+        valid, rejected = preflight.check_tests(tests, MEDIA)
+        self.assertEqual([test.common.id for test in valid.test], ["ok", "bitrate", "parallel"])
+
+
+if __name__ == "__main__":
+    unittest.main()
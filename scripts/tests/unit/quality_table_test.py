@@ -0,0 +1,84 @@
+import csv
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from encapp_tool import quality_table
+from encapp_tool.quality_table import QualityTable
+
+OPTIONS = quality_table.quality_options({"pix_fmt": "", "reference_resolution": "", "fr_fr": False})
+
+
+class TestQualityTable(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.media = os.path.join(self.tmpdir.name, "encoded.mp4")
+        with open(self.media, "wb") as fd:
+            fd.write(b"encoded")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _row(self, vmaf, media=None):
+        row = {column: "" for column in quality_table.CSV_COLUMNS}
+        row.update(media=media or self.media, codec="hevc", size=7, vmaf=vmaf, file="result.json")
+        return row
+
+    def test_upsert_shall_replace_the_row_of_a_comparison(self):
+        table = QualityTable(os.path.join(self.tmpdir.name, "quality.sqlite"))
+        key = table.upsert(self._row(90), "/media/ref.yuv", OPTIONS)
+        self.assertEqual(table.upsert(self._row(91), "/other/ref.yuv", OPTIONS), key)
+        self.assertEqual([row["vmaf"] for row in table.rows()], [91])
+        # other options are another comparison
+        table.upsert(self._row(80), "/media/ref.yuv", dict(OPTIONS, lr_fr=True))
+        self.assertEqual(len(table.rows()), 2)
+
+        # unchanged files are not hashed again
+        with patch("encapp_tool.quality_table.file_hash") as file_hash:
+            self.assertEqual(table.upsert(self._row(92), "ref.yuv", OPTIONS), key)
+            file_hash.assert_not_called()
+
+    def test_merge_shall_keep_the_latest_rows(self):
+        table = QualityTable(os.path.join(self.tmpdir.name, "a.sqlite"))
+        other = QualityTable(os.path.join(self.tmpdir.name, "b.sqlite"))
+        table.upsert(self._row(90), "ref.yuv", OPTIONS)
+        # the same encoded file on another host
+        copy = os.path.join(self.tmpdir.name, "copy.mp4")
+        with open(copy, "wb") as fd:
+            fd.write(b"encoded")
+        time.sleep(0.01)
+        key = other.upsert(self._row(95, copy), "ref.yuv", OPTIONS)
+        other.upsert(self._row(70), "ref.yuv", dict(OPTIONS, pix_fmt="nv12"))
+
+        self.assertEqual(table.merge(other.path), 2)
+        self.assertEqual(table.rows(key)[0]["vmaf"], 95)
+        self.assertEqual(len(table.rows()), 2)
+        # nothing newer the second time
+        self.assertEqual(table.merge(other.path), 0)
+
+    def test_merge_shall_compare_the_calculation_times(self):
+        table = QualityTable(os.path.join(self.tmpdir.name, "a.sqlite"))
+        other = QualityTable(os.path.join(self.tmpdir.name, "b.sqlite"))
+        key = table.upsert(self._row(90), "ref.yuv", OPTIONS, updated=200.0)
+        # stored later, but calculated before
+        other.upsert(self._row(85), "ref.yuv", OPTIONS, updated=100.0)
+        self.assertEqual(table.merge(other.path), 0)
+        self.assertEqual(table.rows(key)[0]["vmaf"], 90)
+        self.assertEqual(table.rows(key)[0]["updated"], 200.0)
+
+    def test_export_csv_shall_write_the_quality_columns(self):
+        table = QualityTable(os.path.join(self.tmpdir.name, "quality.sqlite"))
+        table.upsert(self._row(90), "ref.yuv", OPTIONS)
+        path = os.path.join(self.tmpdir.name, "quality.csv")
+        self.assertEqual(table.export_csv(path), 1)
+        with open(path) as fd:
+            rows = list(csv.reader(fd))
+        self.assertEqual(rows[0], quality_table.CSV_COLUMNS)
+        self.assertEqual(rows[1][1], "hevc")
+        self.assertEqual(float(rows[1][9]), 90)
+
+
+if __name__ == "__main__":
+    unittest.main()
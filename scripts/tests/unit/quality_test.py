@@ -0,0 +1,142 @@
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+import encapp_quality
+from encapp_tool import quality
+
+SSIM_STATS = """n:1 Y:0.900000 U:0.950000 V:0.950000 All:0.920000 (10.969100)
+n:2 Y:0.800000 U:0.850000 V:0.850000 All:0.820000 (7.447275)
+"""
+# 8 bit: psnr = 10 * log10(255^2 / mse)
+PSNR_STATS = """n:1 mse_avg:1.00 mse_y:1.00 mse_u:1.00 mse_v:1.00 psnr_avg:48.13 psnr_y:48.13 psnr_u:48.13 psnr_v:48.13
+n:2 mse_avg:3.00 mse_y:3.00 mse_u:3.00 mse_v:3.00 psnr_avg:43.36 psnr_y:43.36 psnr_u:43.36 psnr_v:43.36
+"""
+
+
+class TestQuality(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.tmpdir.name, "encoded.mp4")
+        with open(f"{self.base}.ssim.all", "w") as fd:
+            fd.write(SSIM_STATS)
+        with open(f"{self.base}.psnr.all", "w") as fd:
+            fd.write(PSNR_STATS)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_parse_stats_shall_average_like_ffmpeg(self):
+        ssim = quality.parse_ssim_stats(f"{self.base}.ssim.all")
+        self.assertAlmostEqual(ssim["Y"], 0.85)
+        self.assertAlmostEqual(ssim["All"], 0.87)
+        # psnr of the mean mse, not the mean psnr
+        psnr = quality.parse_psnr_stats(f"{self.base}.psnr.all")
+        self.assertAlmostEqual(psnr, 10 * math.log10(255 ** 2 / 2), places=2)
+
+        with open(f"{self.base}.psnr.all", "w") as fd:
+            fd.write("n:1 mse_avg:0.00 mse_y:0.00 psnr_avg:inf psnr_y:inf\n")
+        self.assertEqual(quality.parse_psnr_stats(f"{self.base}.psnr.all"), math.inf)
+
+    def test_write_summaries_shall_match_the_ffmpeg_log(self):
+        quality.write_summaries(f"{self.base}.ssim", f"{self.base}.psnr")
+        with open(f"{self.base}.ssim") as fd:
+            self.assertRegex(fd.read(), r"^SSIM Y:0.850000 \([0-9.]+\) U:.* All:0.870000")
+        with open(f"{self.base}.psnr") as fd:
+            self.assertRegex(fd.read(), r"^PSNR average:45.1[0-9]{5}\n$")
+
+    def test_shared_reference_filter_shall_split_the_reference(self):
+        outputs = [(f"{num}.vmaf", f"{num}.ssim.all", f"{num}.psnr.all") for num in range(2)]
+        graph, labels = quality.shared_reference_filter(outputs, ["", "scale=640:360"])
+        chains = graph.split(";")
+        self.assertEqual(chains[0], "[2:v]split=6[r0][r1][r2][r3][r4][r5]")
+        self.assertEqual(chains[1], "[0:v]split=3[d0v][d0s][d0p]")
+        self.assertIn("[d0v][r0]libvmaf=log_path=0.vmaf:", chains[2])
+        self.assertEqual(chains[5], "[1:v]scale=640:360,split=3[d1v][d1s][d1p]")
+        self.assertEqual(chains[8], "[d1p][r5]psnr=stats_file=1.psnr.all[p1]")
+        self.assertEqual(labels, ["[v0]", "[s0]", "[p0]", "[v1]", "[s1]", "[p1]"])
+
+
+def _has_libvmaf() -> bool:
+    if shutil.which("ffmpeg") is None:
+        return False
+    filters = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-filters"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        universal_newlines=True,
+    )
+    return "libvmaf" in filters.stdout
+
+
+@unittest.skipUnless(_has_libvmaf(), "needs ffmpeg with libvmaf")
+class TestSharedQuality(unittest.TestCase):
+    OPTIONALS = {"recalc": True, "fr_fr": False, "fr_lr": False, "lr_lr": False, "lr_fr": False}
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.reference = os.path.join(self.tmpdir.name, "ref.yuv")
+        self._ffmpeg(f"-f lavfi -i testsrc2=size=352x288:rate=30 -frames:v 30 -pix_fmt yuv420p {self.reference}")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _ffmpeg(self, args):
+        subprocess.run(f"ffmpeg -hide_banner -loglevel error -y {args}", shell=True, check=True)
+
+    def _job(self, name, bitrate, output_res):
+        encodedfile = os.path.join(self.tmpdir.name, f"{name}.mp4")
+        if not os.path.exists(encodedfile):
+            self._ffmpeg(
+                f"-f rawvideo -pix_fmt yuv420p -s 352x288 -r 30 -i {self.reference} "
+                f"-s {output_res} -c:v mpeg4 -b:v {bitrate} {encodedfile}"
+            )
+        return {
+            "encodedfile": encodedfile,
+            "vmaf_file": f"{encodedfile}.vmaf",
+            "ssim_file": f"{encodedfile}.ssim",
+            "psnr_file": f"{encodedfile}.psnr",
+            "fps": 30,
+            "reference": self.reference,
+            "raw": True,
+            "pix_fmt": "yuv420p",
+            "input_res": "352x288",
+            "output_res": output_res,
+        }
+
+    def _ladder(self, suffix):
+        return [
+            self._job(f"high_{suffix}", "400k", "352x288"),
+            self._job(f"low_{suffix}", "40k", "352x288"),
+            # scaled back to the reference resolution
+            self._job(f"small_{suffix}", "40k", "176x144"),
+        ]
+
+    def test_shared_quality_shall_match_calc_quality(self):
+        single = self._ladder("single")
+        for job in single:
+            encapp_quality.calc_quality(job, self.OPTIONALS)
+        shared = self._ladder("shared")
+        encapp_quality.calc_shared_quality(shared, self.OPTIONALS)
+
+        scores = []
+        for single_job, shared_job in zip(single, shared):
+            files = ("vmaf_file", "ssim_file", "psnr_file")
+            vmaf, ssim, psnr = encapp_quality.parse_quality(*(single_job[name] for name in files))
+            shared_vmaf, shared_ssim, shared_psnr = encapp_quality.parse_quality(*(shared_job[name] for name in files))
+            # -1 when a score is missing
+            self.assertGreater(min(vmaf, ssim, psnr), 0)
+            self.assertAlmostEqual(shared_vmaf, vmaf, delta=0.5)
+            self.assertAlmostEqual(shared_ssim, ssim, delta=0.01)
+            self.assertAlmostEqual(shared_psnr, psnr, delta=0.05)
+            scores.append(vmaf)
+        # a ladder, not the same encoding three times
+        self.assertGreater(scores[0], scores[1])
+        self.assertGreater(scores[1], scores[2])
+
+
+if __name__ == "__main__":
+    unittest.main()
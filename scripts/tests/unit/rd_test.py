@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from encapp_tool import rd
+
+RATES = np.array([250e3, 500e3, 1e6, 2e6, 4e6])
+VMAF = np.array([60.0, 72.0, 82.0, 89.0, 94.0])
+HEADER = "media,codec,gop,fps,width,height,bitrate,real_bitrate,size,vmaf,ssim,psnr,file\n"
+
+
+def _table(curves):
+    # curves: {(codec, height): (rates, vmaf)}
+    rows = []
+    for (codec, height), (rates, scores) in curves.items():
+        for rate, score in zip(rates, scores):
+            rows.append({"codec": codec, "height": height, "real_bitrate": rate, "vmaf": score, "psnr": score / 2})
+    return pd.DataFrame(rows)
+
+
+class TestRd(unittest.TestCase):
+    def test_read_quality_shall_skip_repeated_headers(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "pixel.csv")
+            row = "a.mp4, c2.android.avc.encoder, 30, 30, 1280, 720, 1000000, 990000, 1000, 90.5, 0.98, 40.1, a.json\n"
+            with open(path, "w") as fd:
+                fd.write(row + HEADER + row)
+            data = rd.read_quality([path])
+        self.assertEqual(len(data), 2)
+        self.assertEqual(data["codec"][0], "c2.android.avc.encoder")
+        self.assertEqual(data["real_bitrate"][1], 990000)
+        self.assertEqual(data["csv"][0], "pixel")
+
+    def test_convex_hull_shall_drop_inefficient_points(self):
+        # a dominated point (more bits, less quality) and one under the hull
+        rates = np.append(RATES, [3e6, 1.5e6])
+        scores = np.append(VMAF, [85.0, 82.5])
+        mask = rd.hull_mask(rates, scores)
+        self.assertEqual(list(mask), [True] * 5 + [False, False])
+
+        data = _table({("avc", 720): (rates, scores), ("avc", 360): (RATES / 2, VMAF - 5)})
+        hull = rd.convex_hull(data)
+        self.assertEqual(len(hull), 10)
+        # across resolutions 360p wins up to 1 Mbps
+        hull = rd.convex_hull(data, by=["codec"])
+        self.assertEqual(list(hull["height"]), [360, 360, 360, 360, 720, 720])
+
+    def test_bd_shall_measure_the_curve_distance(self):
+        # same quality at 80% of the rate
+        self.assertAlmostEqual(rd.bd_rate(RATES, VMAF, RATES * 0.8, VMAF), -20, places=6)
+        self.assertAlmostEqual(rd.bd_quality(RATES, VMAF, RATES, VMAF + 2), 2, places=6)
+        self.assertTrue(np.isnan(rd.bd_rate(RATES, VMAF, RATES, VMAF + 50)))
+
+        data = _table({
+            ("avc", 720): (RATES, VMAF),
+            ("hevc", 720): (RATES * 0.7, VMAF),
+            ("hevc", 360): (RATES, VMAF),
+        })
+        table = rd.compare(data, "avc", metrics=["vmaf", "psnr"])
+        self.assertEqual(len(table), 1)
+        self.assertEqual(table["codec"][0], "hevc")
+        self.assertAlmostEqual(table["bd_rate_vmaf"][0], -30, places=6)
+        self.assertAlmostEqual(table["bd_rate_psnr"][0], -30, places=6)
+        self.assertGreater(table["bd_vmaf"][0], 0)
+        self.assertEqual(table["points_vmaf"][0], 5)
+        # one comparison across all resolutions
+        table = rd.compare(data, "avc", metrics=["vmaf"], by=[])
+        self.assertEqual(list(table.columns), ["codec", "points_vmaf", "bd_rate_vmaf", "bd_vmaf"])
+        self.assertEqual(list(table["codec"]), ["hevc"])
+
+    def test_bitrate_at_quality_shall_interpolate_along_the_hull(self):
+        data = _table({("avc", 720): (RATES, VMAF)})
+        table = rd.bitrate_at_quality(data, [72, 77, 99])
+        self.assertAlmostEqual(table["bitrate_at_vmaf_72"][0], 500e3)
+        # halfway in the log domain
+        self.assertAlmostEqual(table["bitrate_at_vmaf_77"][0], np.sqrt(500e3 * 1e6))
+        self.assertTrue(np.isnan(table["bitrate_at_vmaf_99"][0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import call, patch
+
+from encapp_tool import storage
+
+ADB_DEVICE_VALID_ID = "1234567890abcde"
+
+ADB_DF_OUT = (
+    "Filesystem     1K-blocks     Used Available Use% Mounted on\n"
+    "/dev/fuse      112745376 40528468  1048576  98% /storage/emulated\n"
+)
+
+ADB_LS_L_OUT = (
+    "total 24\n"
+    "drwxrwx--x 2 root sdcard_rw 3452 2022-05-01 10:00 DCIM\n"
+    "-rw-rw---- 1 root sdcard_rw 38016 2022-05-01 10:00 akiyo_qcif.yuv\n"
+    "-rw-rw---- 1 root sdcard_rw 2048 2022-05-01 10:00 old.yuv\n"
+)
+
+
+class TestDeviceStorage(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.state_file = os.path.join(self.tmpdir.name, "storage.json")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _storage(self, margin=0):
+        return storage.DeviceStorage(
+            ADB_DEVICE_VALID_ID, margin=margin, state_file=self.state_file
+        )
+
+    @patch("encapp_tool.storage.run_cmd")
+    def test_get_free_space_shall_parse_df_available(self, mock_run):
+        mock_run.return_value = (True, ADB_DF_OUT, "")
+        free = storage.get_free_space(ADB_DEVICE_VALID_ID)
+        self.assertEqual(free, 1048576 * 1024)
+        mock_run.assert_called_once_with(
+            f"adb -s {ADB_DEVICE_VALID_ID} shell df -k /sdcard/", 0
+        )
+
+    def test_estimate_output_size_shall_use_bitrate_and_duration(self):
+        size = storage.estimate_output_size(8000000, 10)
+        self.assertEqual(size, 10000000 + storage.OUTPUT_OVERHEAD)
+
+    @patch("encapp_tool.storage.run_cmd")
+    def test_refresh_shall_forget_files_gone_from_device(self, mock_run):
+        mock_run.return_value = (True, ADB_LS_L_OUT, "")
+        dev = self._storage()
+        dev.record_push("akiyo_qcif.yuv", 38016, 1.0)
+        dev.record_push("gone.yuv", 1000, 1.0)
+        dev.record_push("old.yuv", 1000, 1.0)
+        dev.refresh()
+        self.assertTrue(dev.is_pushed("akiyo_qcif.yuv", 38016, 1.0))
+        self.assertFalse(dev.is_pushed("akiyo_qcif.yuv", 38016, 2.0))
+        self.assertFalse(dev.is_pushed("gone.yuv", 1000, 1.0))
+        self.assertFalse(dev.is_pushed("old.yuv", 1000, 1.0))
+        # the record is persisted
+        self.assertEqual(list(self._storage().pushed.keys()), ["akiyo_qcif.yuv"])
+
+    @patch("encapp_tool.storage.time.time")
+    @patch("encapp_tool.storage.run_cmd")
+    def test_reserve_shall_evict_least_recently_used(self, mock_run, mock_time):
+        mock_run.return_value = (True, ADB_DF_OUT, "")
+        free = 1048576 * 1024
+        dev = self._storage()
+        mock_time.side_effect = [1.0, 2.0, 3.0]
+        dev.record_push("a.yuv", 100, 0)
+        dev.record_push("b.yuv", 200, 0)
+        dev.record_push("c.yuv", 300, 0)
+        self.assertTrue(dev.reserve(free + 250, keep=["a.yuv"]))
+        mock_run.assert_has_calls(
+            [
+                call(f"adb -s {ADB_DEVICE_VALID_ID} shell rm /sdcard/b.yuv", 0),
+                call(f"adb -s {ADB_DEVICE_VALID_ID} shell rm /sdcard/c.yuv", 0),
+            ]
+        )
+        self.assertEqual(list(dev.pushed.keys()), ["a.yuv"])
+
+    @patch("encapp_tool.storage.run_cmd")
+    def test_reserve_shall_refuse_when_space_cannot_be_freed(self, mock_run):
+        mock_run.return_value = (True, ADB_DF_OUT, "")
+        dev = self._storage(margin=1024)
+        self.assertTrue(dev.reserve(1048576 * 1024 - 1024))
+        self.assertFalse(dev.reserve(1048576 * 1024))
+
+
+if __name__ == "__main__":
+    unittest.main()
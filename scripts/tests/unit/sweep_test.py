@@ -0,0 +1,109 @@
+import json
+import os
+import tempfile
+import unittest
+
+import proto.tests_pb2 as tests_definitions
+from encapp_tool import sweep
+from encapp_tool.journal import RunJournal
+
+
+def _make_tests():
+    tests = tests_definitions.Tests()
+    test = tests.test.add()
+    test.common.id = "sweep"
+    test.input.filepath = "/sdcard/akiyo_qcif.yuv"
+    test.input.resolution = "176x144"
+    test.configure.codec = "OMX.google.h264.encoder"
+    test.configure.bitrate = "100 kbps"
+    return tests
+
+
+class TestSweep(unittest.TestCase):
+    def test_resolve_field_shall_map_short_and_dotted_names(self):
+        self.assertEqual(sweep.resolve_field("bitrate"), ("configure", "bitrate"))
+        self.assertEqual(
+            sweep.resolve_field("input.resolution"), ("input", "resolution")
+        )
+        with self.assertRaises(AssertionError):
+            sweep.resolve_field("common.id")
+        with self.assertRaises(AssertionError):
+            sweep.resolve_field("not_a_field")
+
+    def test_set_field_shall_convert_values_to_field_type(self):
+        test = tests_definitions.Test()
+        sweep.set_field(test, "framerate", "15")
+        sweep.set_field(test, "i_frame_interval", "2")
+        sweep.set_field(test, "bitrate_mode", "cbr")
+        sweep.set_field(test, "input.realtime", "true")
+        self.assertEqual(test.configure.framerate, 15.0)
+        self.assertEqual(test.configure.i_frame_interval, 2)
+        self.assertEqual(
+            test.configure.bitrate_mode, tests_definitions.Configure.cbr
+        )
+        self.assertTrue(test.input.realtime)
+
+    def test_sweep_points_shall_support_product_and_zip(self):
+        dims = {"bitrate": ["1", "2"], "framerate": ["15", "30"]}
+        product = list(sweep.sweep_points(dims, "product"))
+        self.assertEqual(len(product), 4)
+        self.assertIn({"bitrate": "2", "framerate": "15"}, product)
+        zipped = list(sweep.sweep_points(dims, "zip"))
+        self.assertEqual(
+            zipped,
+            [
+                {"bitrate": "1", "framerate": "15"},
+                {"bitrate": "2", "framerate": "30"},
+            ],
+        )
+        with self.assertRaises(AssertionError):
+            list(sweep.sweep_points({"bitrate": ["1"], "codec": ["a", "b"]}, "zip"))
+
+    def test_build_tests_shall_expand_and_skip_completed(self):
+        tests = _make_tests()
+        dims = {
+            "bitrate": ["100000", "200000"],
+            "resolution": ["1280x720", "640x360"],
+        }
+        fresh = sweep.build_tests(tests, dims)
+        self.assertEqual(len(fresh.test), 4)
+        self.assertEqual(fresh.test[0].configure.bitrate, "100000")
+        self.assertEqual(fresh.test[0].configure.resolution, "1280x720")
+        # the source test is left untouched
+        self.assertEqual(tests.test[0].configure.bitrate, "100 kbps")
+
+        skip = {sweep.test_key(fresh.test[1])}
+        partial = sweep.build_tests(tests, dims, skip=skip)
+        self.assertEqual(len(partial.test), 3)
+        self.assertNotIn(fresh.test[1], partial.test)
+
+    def test_build_tests_without_sweep_shall_copy_tests(self):
+        tests = _make_tests()
+        fresh = sweep.build_tests(tests, {})
+        self.assertEqual(list(fresh.test), list(tests.test))
+
+    def test_completed_test_keys_shall_use_the_host_keys(self):
+        tests = sweep.build_tests(_make_tests(), {"bitrate": ["100 kbps", "200 kbps"]})
+        with tempfile.TemporaryDirectory() as workdir:
+            subdir = os.path.join(workdir, "test_files")
+            os.mkdir(subdir)
+            journal = RunJournal(workdir)
+            for num, test in enumerate(tests.test):
+                # the app reports the test with its defaults filled in
+                ran = tests_definitions.Test()
+                ran.CopyFrom(test)
+                ran.configure.framerate = 30
+                ran.configure.i_frame_interval = 10
+                ran.configure.resolution = "176x144"
+                path = os.path.join(subdir, f"encapp_{num}.json")
+                with open(path, "w") as fd:
+                    json.dump({"testdefinition": str(ran)}, fd)
+                journal.record_test(sweep.test_key(test), [path])
+            os.remove(path)
+            keys = sweep.completed_test_keys(workdir)
+        self.assertEqual(keys, {sweep.test_key(tests.test[0])})
+        fresh = sweep.build_tests(_make_tests(), {"bitrate": ["100 kbps", "200 kbps"]}, skip=keys)
+        self.assertEqual(list(fresh.test), [tests.test[1]])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import json
+import os
+import tempfile
+import unittest
+
+import proto.tests_pb2 as tests_definitions
+from encapp_tool import synthetic
+
+
+def _test(bitrate="1000 kbps"):
+    test = tests_definitions.Test()
+    test.common.description = "synthetic"
+    test.input.filepath = "/sdcard/akiyo_qcif.yuv"
+    test.input.resolution = "176x144"
+    test.input.framerate = 30
+    test.configure.codec = "OMX.google.h264.encoder"
+    test.configure.bitrate = bitrate
+    test.configure.i_frame_interval = 1
+    return test
+
+
+class TestSynthetic(unittest.TestCase):
+    def test_parse_bitrate(self):
+        self.assertEqual(synthetic.parse_bitrate("100 kbps"), 100000)
+        self.assertEqual(synthetic.parse_bitrate("2M"), 2000000)
+        self.assertEqual(synthetic.parse_bitrate("300"), 300)
+        self.assertEqual(synthetic.parse_bitrate(""), synthetic.DEFAULT_BITRATE)
+
+    def test_result_shall_follow_bitrate_and_gop(self):
+        result, size = synthetic.synthesize_result(_test(), 300, seed=1)
+        frames = result["frames"]
+        self.assertEqual(len(frames), 300)
+        self.assertEqual([frame["frame"] for frame in frames[:3]], [1, 2, 3])
+        self.assertEqual(
+            [frame["frame"] for frame in frames if frame["iframe"]],
+            [1, 31, 61, 91, 121, 151, 181, 211, 241, 271],
+        )
+        self.assertEqual(size, sum(frame["size"] for frame in frames))
+        self.assertAlmostEqual(result["settings"]["meanbitrate"] / 1000000, 1, 1)
+        self.assertEqual(result["settings"]["gop"], 1)
+        self.assertNotIn("width", result["settings"])
+
+    def test_runtime_changes_shall_be_applied(self):
+        test = _test()
+        param = test.runtime.video_bitrate.add()
+        param.framenum = 150
+        param.bitrate = "100k"
+        param = test.runtime.dynamic_framerate.add()
+        param.framenum = 150
+        param.framerate = 15
+        test.runtime.request_sync.append(100)
+        result, _ = synthetic.synthesize_result(test, 300, seed=1, gpu=True)
+        frames = result["frames"]
+        self.assertEqual(frames[100]["iframe"], 1)
+        first = sum(frame["size"] for frame in frames[:150])
+        second = sum(frame["size"] for frame in frames[150:])
+        self.assertLess(second, first / 4)
+        self.assertEqual(frames[151]["pts"] - frames[150]["pts"], 66666)
+        self.assertEqual(frames[151]["original_frame"], 152)
+        self.assertEqual(len(result["gpu_data"]["gpu_load_percentage"]), 150)
+
+    def test_corpus_shall_share_time_windows_of_parallel_results(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = synthetic.write_corpus(
+                tmpdir, [_test()], 4, frame_count=10, parallel=2, media=True
+            )
+            results = []
+            for path in paths:
+                with open(path) as fd:
+                    results.append(json.load(fd))
+            self.assertTrue(
+                os.path.exists(
+                    os.path.join(os.path.dirname(paths[0]), results[0]["encodedfile"])
+                )
+            )
+        starts = [result["frames"][0]["starttime"] for result in results]
+        self.assertEqual(starts[0], starts[1])
+        self.assertNotEqual(starts[1], starts[2])
+        self.assertEqual(results[1]["sourcefile"], "akiyo_qcif.yuv.1")
+
+
+if __name__ == "__main__":
+    unittest.main()
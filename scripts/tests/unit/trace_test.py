@@ -0,0 +1,70 @@
+import json
+import os
+import tempfile
+import unittest
+
+from encapp_tool import adb_cmds
+from encapp_tool.trace import Tracer, summarize
+
+
+class TestTracer(unittest.TestCase):
+    def test_disabled_tracer_shall_not_record(self):
+        tracer = Tracer()
+        with tracer.span("push", bytes=10) as record:
+            record["extra"] = 1
+        self.assertEqual(tracer.spans, [])
+
+    def test_span_shall_record_attributes_and_context(self):
+        tracer = Tracer()
+        tracer.enable()
+        tracer.set_context(serial="1234567890abcde")
+        with tracer.span("pull", file="encapp_1.mp4") as record:
+            record["bytes"] = 2048
+        self.assertEqual(len(tracer.spans), 1)
+        span = tracer.spans[0]
+        self.assertEqual(span["name"], "pull")
+        self.assertEqual(span["serial"], "1234567890abcde")
+        self.assertEqual(span["file"], "encapp_1.mp4")
+        self.assertEqual(span["bytes"], 2048)
+        self.assertGreaterEqual(span["end"], span["start"])
+
+    def test_span_shall_be_recorded_on_exception(self):
+        tracer = Tracer()
+        tracer.enable()
+        with self.assertRaises(RuntimeError):
+            with tracer.span("am_start"):
+                raise RuntimeError("failed")
+        self.assertEqual(tracer.spans[0]["name"], "am_start")
+
+    def test_trace_files_shall_be_written(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            jsonl = os.path.join(tmpdir, "trace.jsonl")
+            chrome = os.path.join(tmpdir, "trace.json")
+            tracer = Tracer()
+            tracer.enable(jsonl)
+            with tracer.span("push", bytes=100):
+                pass
+            with tracer.span("push", bytes=50):
+                pass
+            tracer.write_chrome_trace(chrome)
+            tracer.close()
+            with open(jsonl) as fd:
+                spans = [json.loads(line) for line in fd]
+            with open(chrome) as fd:
+                events = json.load(fd)["traceEvents"]
+        self.assertEqual(len(spans), 2)
+        self.assertEqual(summarize(spans)["push"]["bytes"], 150)
+        self.assertEqual(summarize(spans)["push"]["count"], 2)
+        self.assertEqual(events[0]["ph"], "X")
+        self.assertEqual(events[0]["args"], {"bytes": 100})
+
+    def test_cmd_span_name_shall_skip_serial(self):
+        self.assertEqual(
+            adb_cmds._cmd_span_name("adb -s 1234 shell am start -W"), "adb shell am"
+        )
+        self.assertEqual(adb_cmds._cmd_span_name("adb -s 1234 pull a b"), "adb pull")
+        self.assertEqual(adb_cmds._cmd_span_name("protoc -I / x"), "protoc")
+
+
+if __name__ == "__main__":
+    unittest.main()
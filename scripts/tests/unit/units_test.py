@@ -0,0 +1,24 @@
+import unittest
+
+from encapp_tool import units
+
+
+class TestUnits(unittest.TestCase):
+    def test_is_int(self):
+        self.assertTrue(units.is_int(3))
+        self.assertTrue(units.is_int("-30"))
+        self.assertFalse(units.is_int("2s"))
+
+    def test_convert_to_bps(self):
+        self.assertEqual(units.convert_to_bps("500k"), 500000)
+        self.assertEqual(units.convert_to_bps("2M"), 2000000)
+        self.assertEqual(units.convert_to_bps(100000), 100000)
+        self.assertEqual(units.convert_to_bps("100000"), 100000)
+
+    def test_convert_to_frames(self):
+        self.assertEqual(units.convert_to_frames("90"), 90)
+        self.assertEqual(units.convert_to_frames("2s", fps=30), 60)
+
+
+if __name__ == "__main__":
+    unittest.main()